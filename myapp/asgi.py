@@ -3,6 +3,19 @@ ASGI config for myapp project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Supported run mode: one event loop per process, several processes, e.g.
+
+    uvicorn myapp.asgi:application --workers 4
+
+This entry point turns on ASYNC_VIEWS, so search_api and get_suggestions are
+served by async views that only borrow a thread for each database call and
+are cancelled - their SQLite statement interrupted - when the client goes
+away (stream/aio.py). Every other view is still synchronous and runs in a
+thread per request, as under WSGI. The tuned SQLite settings (WAL,
+IMMEDIATE transactions) apply unchanged, except that connections are not
+persistent (settings.CONN_MAX_AGE). `manage.py bench_asgi_search` compares
+the two entry points.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -12,5 +25,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'myapp.settings')
+os.environ.setdefault('ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
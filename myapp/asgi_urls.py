@@ -0,0 +1,16 @@
+"""
+URL configuration for the ASGI run mode (see myapp/asgi.py).
+
+The project's routes, with the async versions of the per-keystroke search
+endpoints matched first.
+"""
+from django.urls import path
+
+from stream.views import get_suggestions_async, search_api_async
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/search/', search_api_async, name='search_api'),
+    path('api/suggestions/', get_suggestions_async, name='get_suggestions'),
+] + sync_urlpatterns
@@ -53,8 +53,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest of the stack.
+    'stream.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # Before sessions/auth: signed media URLs are verified without either.
+    'stream.playback.SignedMediaMiddleware',
+    # Before sessions: the session lookup is routed like any other read.
+    'stream.routers.StickyPrimaryMiddleware',
+    # Content-addressed images, cached as immutable (their variants briefly),
+    # with no session lookup.
+    'stream.media.ImmutableMediaMiddleware',
+    # WhiteNoise, async-capable so ASGI requests do not hold a thread.
+    'stream.aio.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -63,11 +73,15 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'myapp.urls'
+# myapp/asgi.py turns ASYNC_VIEWS on, which serves search_api and
+# get_suggestions from async views (see stream/aio.py).
+ASYNC_VIEWS = os.getenv("ASYNC_VIEWS", "0") == "1"
+ROOT_URLCONF = 'myapp.asgi_urls' if ASYNC_VIEWS else 'myapp.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing renders for ProfilingMiddleware.
+        'BACKEND': 'stream.profiling.ProfiledTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -75,6 +89,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'stream.context_processors.my_list',
             ],
         },
     },
@@ -86,13 +101,51 @@ WSGI_APPLICATION = 'myapp.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# SQLITE_TUNED=1 (the default) is the deployment mode for several gunicorn
+# workers sharing one file: WAL so readers and the writer stop blocking each
+# other, BEGIN IMMEDIATE so a read-then-write transaction queues on the busy
+# timeout instead of failing with "database is locked", and persistent
+# connections. The PRAGMAs are applied by stream/signals.py on every new
+# connection. Under ASGI every request runs its ORM calls in a thread of its
+# own, which cannot reuse a persistent connection, so they stay off there.
+SQLITE_TUNED = os.getenv("SQLITE_TUNED", "1") == "1"
+SQLITE_TUNED_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',          # fsync at checkpoints only; safe with WAL
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,         # negative is KiB: a 64 MiB page cache
+    'busy_timeout': 5000,             # ms
+    'temp_store': 'memory',
+}
+SQLITE_PRAGMAS = SQLITE_TUNED_PRAGMAS if SQLITE_TUNED else {}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.getenv("DB_CONN_MAX_AGE", "600" if SQLITE_TUNED and not ASYNC_VIEWS else "0")),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE'} if SQLITE_TUNED else {},
     }
 }
 
+# Read routing (stream/routers.py). DATABASE_READ_REPLICA is the path of a
+# replica file kept up to date by e.g. Litestream or LiteFS, or "primary" for
+# a second, query-only connection to the main file. Requests that write, and
+# the same browser for DATABASE_STICKY_SECONDS afterwards, read the primary.
+DATABASE_READ_REPLICA = os.getenv("DATABASE_READ_REPLICA") or None
+DATABASE_READ_ALIAS = None
+if DATABASE_READ_REPLICA:
+    DATABASE_READ_ALIAS = 'replica'
+    DATABASES[DATABASE_READ_ALIAS] = dict(
+        DATABASES['default'],
+        NAME=DATABASES['default']['NAME'] if DATABASE_READ_REPLICA == 'primary' else DATABASE_READ_REPLICA,
+        OPTIONS={},
+        TEST={'MIRROR': 'default'},
+    )
+DATABASE_ROUTERS = ['stream.routers.ReadReplicaRouter']
+DATABASE_STICKY_SECONDS = int(os.getenv("DATABASE_STICKY_SECONDS", "5"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -139,4 +192,130 @@ STATICFILES_DIRS = [
 ]
 
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Uploaded images are stored by content hash under MEDIA_ROOT/content/ and
+# served as immutable (see stream/media.py). "default" and "staticfiles" are
+# Django's defaults; Django 5.1+ no longer reads STATICFILES_STORAGE.
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+    'images': {'BACKEND': 'stream.media.ContentAddressedStorage'},
+}
+
+# Video streaming
+# Set to 'X-Accel-Redirect' (nginx) or 'X-Sendfile' (Apache/lighttpd) to let
+# the front-end server deliver video bytes instead of a Django worker.
+STREAM_SENDFILE_HEADER = os.getenv("STREAM_SENDFILE_HEADER") or None
+# nginx `internal` location that aliases MEDIA_ROOT, used with X-Accel-Redirect.
+STREAM_ACCEL_PREFIX = os.getenv("STREAM_ACCEL_PREFIX", "/protected-media/")
+
+# Adaptive-bitrate (HLS) packaging of uploaded videos
+PACKAGING_BACKEND = os.getenv("PACKAGING_BACKEND", "stream.packaging.FFmpegTranscoder")
+PACKAGING_ON_UPLOAD = True
+PACKAGING_SEGMENT_SECONDS = 6
+PACKAGING_RENDITIONS = [
+    {'name': '1080p', 'width': 1920, 'height': 1080, 'bitrate': 5000},
+    {'name': '720p', 'width': 1280, 'height': 720, 'bitrate': 2800},
+    {'name': '480p', 'width': 854, 'height': 480, 'bitrate': 1400},
+    {'name': '360p', 'width': 640, 'height': 360, 'bitrate': 800},
+]
+
+# Search backend for search_api. None picks SQLite FTS5 when available and
+# falls back to unindexed icontains lookups on other databases.
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND") or None
+
+# Cache backend for shelves, anonymous pages and the catalog version counter.
+# CACHE_BACKEND is one of locmem (per process), file or redis (shared). With
+# locmem, a catalog change only reaches the other worker processes when their
+# entries expire after CATALOG_CACHE_TTL; use redis with several workers
+# (`manage.py check` warns when WEB_CONCURRENCY says there are).
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'streamingweb'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', str(BASE_DIR / '.cache')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+}
+_cache_backend, _cache_location = CACHE_BACKENDS[os.getenv("CACHE_BACKEND", "locmem")]
+CACHES = {
+    'default': {
+        'BACKEND': _cache_backend,
+        'LOCATION': os.getenv("CACHE_LOCATION", _cache_location),
+        'TIMEOUT': 60 * 15,
+    }
+}
+if _cache_backend != CACHE_BACKENDS['redis'][0]:
+    # locmem and file cull a third of the entries past MAX_ENTRIES (300 by
+    # default), which would drop buffered watch progress under load.
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv("CACHE_MAX_ENTRIES", 50_000))}
+CATALOG_CACHE_TTL = int(os.getenv("CATALOG_CACHE_TTL", 60 * 5))
+
+# Responsive image variants generated next to uploaded posters, cast and
+# genre images. WEBP or AVIF; falls back to JPEG if Pillow lacks the codec.
+IMAGE_DERIVATIVE_FORMAT = os.getenv("IMAGE_DERIVATIVE_FORMAT", "WEBP")
+IMAGE_DERIVATIVE_WIDTHS = [160, 320, 640]
+IMAGE_DERIVATIVE_QUALITY = 80
+
+# Subscription entitlement cache used by playback authorization.
+ENTITLEMENT_LOCAL_SIZE = 10_000
+ENTITLEMENT_LOCAL_TTL = 30
+ENTITLEMENT_CACHE_TTL = 60 * 60
+
+# Similar titles on movie_detail (stream/recommendations.py): neighbours kept
+# per title, whether saving a title refreshes the affected lists, and how
+# long the background refresh waits to batch a burst of saves (seconds).
+RECOMMENDATIONS_K = 12
+RECOMMENDATIONS_ON_SAVE = os.getenv("RECOMMENDATIONS_ON_SAVE", "1") == "1"
+RECOMMENDATIONS_REFRESH_DELAY = 2.0
+
+# Signed, expiring playback URLs issued by play_movie (see stream/playback.py).
+PLAYBACK_SIGNING_KEY = os.getenv("PLAYBACK_SIGNING_KEY") or None  # defaults to SECRET_KEY
+PLAYBACK_TOKEN_TTL = 60 * 60 * 4
+PLAYBACK_URL_PREFIX = '/vod/'
+
+# Shared Razorpay client (see stream/payments.py). RAZORPAY_BASE_URL can point
+# at a local stub for tests and load testing.
+RAZORPAY_BASE_URL = os.getenv("RAZORPAY_BASE_URL", "https://api.razorpay.com")
+RAZORPAY_CONNECT_TIMEOUT = 3.05
+RAZORPAY_READ_TIMEOUT = 10
+RAZORPAY_POOL_SIZE = 10
+RAZORPAY_RETRIES = 2  # extra attempts for idempotent calls only
+RAZORPAY_RETRY_BACKOFF = 0.2
+RAZORPAY_BREAKER_THRESHOLD = 5
+RAZORPAY_BREAKER_COOLDOWN = 30
+
+# Webhook-driven payment confirmation (see stream/payment_events.py). With
+# PAYMENT_EVENTS_INLINE the web process drains new events in a background
+# thread; turn it off when `manage.py process_payment_events` runs as a worker.
+RAZORPAY_WEBHOOK_SECRET = os.getenv("RAZORPAY_WEBHOOK_SECRET")
+PAYMENT_EVENTS_INLINE = os.getenv("PAYMENT_EVENTS_INLINE", "1") == "1"
+PAYMENT_EVENTS_BATCH_SIZE = 500
+
+# Expired subscriptions are deactivated by `manage.py sweep_subscriptions`
+# (stream/expiry.py), run from cron or with --loop; entitlement checks only
+# compare expiry dates, so the sweep never gates playback.
+SUBSCRIPTION_SWEEP_BATCH_SIZE = 500
+
+# Watch progress (see stream/progress.py). Player heartbeats are buffered in
+# the cache and upserted every PROGRESS_FLUSH_SECONDS. With
+# PROGRESS_FLUSH_INLINE the web process flushes from a background thread when
+# a new slot opens; turn it off when `manage.py flush_watch_progress --loop`
+# runs as a worker. Use a shared cache (redis) with several processes.
+PROGRESS_HEARTBEAT_SECONDS = 10
+PROGRESS_FLUSH_SECONDS = 60
+PROGRESS_CACHE_TTL = 60 * 60 * 24
+PROGRESS_FLUSH_INLINE = os.getenv("PROGRESS_FLUSH_INLINE", "1") == "1"
+
+# Per-user My List membership sets (see stream/mylist.py).
+MYLIST_CACHE_TTL = 60 * 60 * 24
+MYLIST_BULK_LIMIT = 500
+
+# Request profiling (see stream/profiling.py). Every request feeds per-route
+# latency histograms at /metrics; PROFILING_SAMPLE_RATE of them also get a
+# SQL/template/cache breakdown, a Server-Timing header (staff only, or
+# everyone with DEBUG), and a log entry with their slowest statements when
+# they take PROFILING_SLOW_MS or longer. /metrics wants
+# "Authorization: Bearer <METRICS_TOKEN>" and is disabled while it is unset.
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "1") == "1"
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0.1"))
+PROFILING_SLOW_MS = float(os.getenv("PROFILING_SLOW_MS", "500"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") or None
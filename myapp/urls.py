@@ -19,9 +19,13 @@ from django.urls import path,include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from stream.views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('',include("stream.urls")),
+    # Scraped by Prometheus; not part of the site, so not in stream.urls.
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
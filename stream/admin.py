@@ -10,8 +10,9 @@ class CastAdmin(admin.ModelAdmin):
     
 @admin.register(Genre)
 class GenreAdmin(admin.ModelAdmin):
-    list_display = ('name', 'icon_class')
+    list_display = ('name', 'slug', 'icon_class')
     search_fields = ('name',)
+    prepopulated_fields = {'slug': ('name',)}
 
 
 class MovieCastInline(admin.TabularInline):
@@ -0,0 +1,78 @@
+"""Support for the ASGI run mode (myapp/asgi.py).
+
+Under ASGI, search_api and get_suggestions are served by the async views
+``search_api_async`` and ``get_suggestions_async`` (see myapp/asgi_urls.py),
+so a keystroke's request waits on the event loop instead of holding a worker
+thread. Django still runs every ORM call of an async view in a thread, one
+per request, but only for the duration of the call.
+
+When a client disconnects, Django cancels the view's task. An ORM call that
+is already running would still be waited out; ``interruptible()`` interrupts
+the SQLite statement instead, so a request superseded by the next keystroke
+stops using the database straight away.
+
+Every middleware in the stack has to be async-capable, or the request gets
+pinned to a thread for its whole life; ``StaticFilesMiddleware`` is the
+async-capable stand-in for WhiteNoise's.
+"""
+import asyncio
+import threading
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.db import connection
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+async def interruptible(func, *args, **kwargs):
+    """Await ``func(*args, **kwargs)`` in the request's database thread; if
+    the awaiting task is cancelled, interrupt its running SQLite statement."""
+    lock = threading.Lock()
+    running = []
+
+    def call():
+        with lock:
+            if connection.vendor == 'sqlite':
+                connection.ensure_connection()
+                running.append(connection.connection)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with lock:
+                running.clear()
+
+    task = asyncio.ensure_future(sync_to_async(call)())
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        with lock:
+            for raw in running:
+                raw.interrupt()
+        # The interrupted statement fails with OperationalError in the thread.
+        await asyncio.gather(task, return_exceptions=True)
+        raise
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise, without a thread hop for requests that are not static files."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
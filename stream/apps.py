@@ -6,4 +6,5 @@ class StreamConfig(AppConfig):
     name = 'stream'
 
     def ready(self):
+        import stream.checks  # noqa: F401
         import stream.signals
\ No newline at end of file
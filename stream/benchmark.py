@@ -0,0 +1,120 @@
+"""Helpers shared by the ``bench_*`` management commands and view tests."""
+import datetime
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from .search import get_backend as get_search_backend
+from .synthetic import CatalogGenerator
+
+
+@contextmanager
+def temporary_database(verbosity=0, name=None):
+    """Run the block against a freshly migrated throwaway database.
+
+    SQLite test databases live in memory unless ``name`` gives a file path.
+    """
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    if name:
+        test_settings['NAME'] = name
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
+        test_settings['NAME'] = old_test_name
+
+
+def seed_catalog(movies, genres=20, cast=None, cast_per_movie=4, users=0, seed=0, batch_size=5000):
+    generator = CatalogGenerator(seed=seed, batch_size=batch_size)
+    genre_ids = generator.genres(genres)
+    cast_ids = generator.cast(cast or max(movies // 5, 10))
+    movie_range = generator.movies(movies, genre_ids, cast_ids, cast_per_movie=cast_per_movie)
+    if users:
+        generator.users(users, movie_range)
+    # bulk_create skips the signals that maintain the search index.
+    get_search_backend().rebuild()
+    return movie_range
+
+
+def seed_view_fixtures(movies, seed=0):
+    """Catalog plus one subscribed user with a list and a paid order.
+
+    Returns ``(movie, user)`` for ``view_scenarios``.
+    """
+    from .models import Movie, MyList, PaymentOrder, Subscription
+
+    from .recommendations import rebuild as rebuild_recommendations
+
+    seed_catalog(movies, seed=seed)
+    rebuild_recommendations()
+    movie = Movie.objects.order_by('id').first()
+    user = User.objects.create_user('viewer@example.com', password='secret-pass-123')
+    Subscription.objects.create(
+        user=user, plan_name='standard', order_id='order_1', payment_id='pay_1',
+        active=True, expiry_date=timezone.now() + datetime.timedelta(days=30),
+    )
+    PaymentOrder.objects.create(user=user, order_id='order_1', plan_name='standard', amount=159900, status='paid')
+    MyList.objects.bulk_create([
+        MyList(user=user, movie=other) for other in Movie.objects.order_by('id')[1:51]
+    ])
+    return movie, user
+
+
+def view_scenarios(movie):
+    """One request per route in stream/urls.py: (route name, method, url, data, logged in)."""
+    from .views import SHELF_SIZE
+
+    movie, genre_id = movie.id, movie.genre_id
+    return [
+        ('home', 'get', reverse('home'), None, True),
+        ('home_shelf', 'get', reverse('home_shelf', args=['tv']), None, False),
+        ('my_list_shelf', 'get', reverse('my_list_shelf'), None, True),
+        ('movies', 'get', reverse('movies'), None, True),
+        ('movie_detail', 'get', reverse('movie_detail', args=[movie]), None, True),
+        ('genre_shelf', 'get', reverse('genre_shelf', args=[genre_id]), {'offset': SHELF_SIZE}, False),
+        ('category_list', 'get', reverse('category_list', args=['movies']), None, False),
+        ('tv_shows', 'get', reverse('tv_shows'), None, False),
+        ('search_api', 'get', reverse('search_api'), {'q': 'dark'}, False),
+        ('get_suggestions', 'get', reverse('get_suggestions'), {'q': 'ar'}, False),
+        ('api_movies', 'get', reverse('api_movies'), {'category': 'movie'}, False),
+        ('api_movie', 'get', reverse('api_movie', args=[movie]), None, False),
+        ('api_genres', 'get', reverse('api_genres'), None, False),
+        ('api_cast', 'get', reverse('api_cast'), None, False),
+        ('play_movie', 'get', reverse('play_movie', args=[movie]), None, True),
+        ('stream_video', 'get', reverse('stream_video', args=[movie]), None, True),
+        ('hls_file', 'get', reverse('hls_file', args=[movie, 'master.m3u8']), None, True),
+        ('genres', 'get', reverse('genres'), None, False),
+        ('my_list', 'get', reverse('my_list'), None, True),
+        ('toggle_my_list', 'post', reverse('toggle_my_list', args=[movie]), None, True),
+        ('my_list_api', 'get', reverse('my_list_api'), None, True),
+        ('watch_progress', 'post', reverse('watch_progress', args=[movie]), {'position': 600, 'duration': 5400}, True),
+        ('register', 'get', reverse('register'), None, False),
+        ('login', 'get', reverse('login'), None, False),
+        ('logout', 'get', reverse('logout'), None, True),
+        ('profile', 'get', reverse('profile'), None, True),
+        ('subscription', 'get', reverse('subscription'), None, False),
+        ('payment_page', 'get', reverse('payment_page', args=['standard']), None, True),
+        ('create_subscription_order', 'get', reverse('create_subscription_order'), None, True),
+        ('payment_verify', 'get', reverse('payment_verify'),
+         {'order_id': 'order_1', 'payment_id': 'pay_1', 'signature': 'bad'}, True),
+        ('payment_status', 'get', reverse('payment_status', args=['order_1']), None, True),
+        ('payment_webhook', 'post', reverse('payment_webhook'), {'event': 'payment.captured'}, False),
+    ]
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def timed(func, *args, **kwargs):
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
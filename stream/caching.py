@@ -0,0 +1,174 @@
+"""Catalog-versioned caching for shelf data and anonymous pages.
+
+Every key embeds the current catalog version, which model signals bump on any
+Movie/Genre/Cast change, so stale entries are never read and simply expire.
+
+The version lives in the cache itself, so a bump reaches every process only
+with a shared backend (CACHE_BACKEND=redis or file). With locmem each worker
+has its own counter and only sees its own bumps; entries therefore expire
+after CATALOG_CACHE_TTL, which bounds how long another worker can serve a
+stale shelf, and stream/checks.py warns about such deployments. A lost or
+evicted counter is re-seeded from the clock, never from a fixed value, so
+keys and ETags from before can not become valid again.
+"""
+import functools
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+
+from . import profiling
+
+VERSION_KEY = 'catalog:version'
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def increment(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+    profiling.count_cache(key)
+
+
+def record(name, hit):
+    increment(f'{name}:{"hit" if hit else "miss"}')
+
+
+def cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def version_seed():
+    # Later than any counter seeded before, plus the bumps it has had since.
+    return time.time_ns()
+
+
+def catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        seed = version_seed()
+        cache.add(VERSION_KEY, seed, timeout=None)
+        version = cache.get(VERSION_KEY, seed)
+    return version
+
+
+async def acatalog_version():
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        seed = version_seed()
+        await cache.aadd(VERSION_KEY, seed, timeout=None)
+        version = await cache.aget(VERSION_KEY, seed)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        seed = version_seed()
+        cache.add(VERSION_KEY, seed, timeout=None)
+        return cache.get(VERSION_KEY, seed)
+
+
+def cached_shelf(name, builder, timeout=None):
+    """Return ``builder()``'s result, cached until the catalog changes or for
+    ``timeout`` (default CATALOG_CACHE_TTL) seconds."""
+    key = f'shelf:{name}:v{catalog_version()}'
+    data = cache.get(key)
+    if data is not None:
+        record('shelf', True)
+        return data
+    record('shelf', False)
+    data = builder()
+    cache.set(key, data, settings.CATALOG_CACHE_TTL if timeout is None else timeout)
+    return data
+
+
+def cache_anonymous_page(view):
+    """Serve whole rendered pages from cache to anonymous GET requests."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        key = f'page:{request.get_host()}:{request.get_full_path()}:v{catalog_version()}'
+        cached = cache.get(key)
+        if cached is not None:
+            record('page', True)
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        record('page', False)
+        response = view(request, *args, **kwargs)
+        if response.status_code == 200 and not response.streaming and not response.cookies:
+            if hasattr(response, 'render'):
+                response.render()
+            cache.set(key, (response.content, response['Content-Type']), settings.CATALOG_CACHE_TTL)
+            response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
+
+
+def catalog_etag(request):
+    """Strong ETag for a catalog-only response: same version + URL, same bytes.
+
+    The version never repeats (see ``version_seed()``), so neither does a tag.
+    """
+    digest = hashlib.blake2b(request.get_full_path().encode(), digest_size=8).hexdigest()
+    return f'"c{catalog_version()}-{digest}"'
+
+
+def conditional_catalog_get(max_age=60, params=()):
+    """ETag, 304 and shared caching for views whose output depends only on
+    the catalog and the URL.
+
+    A matching ``If-None-Match`` is answered from the version counter alone,
+    without touching the database; other repeats are served from the cache.
+    Only URLs whose query string holds nothing but single ``params`` values
+    are cached, so made-up parameters can not fill the cache with copies.
+    """
+    params = frozenset(params)
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            etag = catalog_etag(request)
+            if_none_match = request.headers.get('If-None-Match', '')
+            matched = bool(if_none_match) and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match))
+            record('etag', matched)
+            if matched:
+                response = HttpResponseNotModified()
+            elif not all(name in params and len(values) == 1 for name, values in request.GET.lists()):
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            else:
+                key = f'api:{etag}'
+                cached = cache.get(key)
+                record('api', cached is not None)
+                if cached is not None:
+                    content, content_type = cached
+                    response = HttpResponse(content, content_type=content_type)
+                else:
+                    response = view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    cache.set(key, (response.content, response['Content-Type']), settings.CATALOG_CACHE_TTL)
+            response['ETag'] = etag
+            patch_cache_control(response, public=True, max_age=max_age, stale_while_revalidate=max_age)
+            return response
+
+        return wrapper
+
+    return decorator
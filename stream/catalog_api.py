@@ -0,0 +1,119 @@
+"""Serialization for the read-only catalog JSON API.
+
+Rows come straight from ``.values()`` - no model instances - and file fields
+become URLs by prefixing MEDIA_URL rather than going through the storage for
+every row. ``?fields=a,b`` narrows both the SELECT and the output.
+"""
+from django.conf import settings
+from django.utils.encoding import filepath_to_uri
+
+from .models import Cast, Genre, Movie, MovieCast
+from .pagination import keyset_page
+
+# Output name -> ORM path, per resource.
+MOVIE_FIELDS = {
+    'id': 'id',
+    'title': 'title',
+    'year': 'year',
+    'rating': 'rating',
+    'category': 'category',
+    'genre': 'genre_id',
+    'genre_name': 'genre__name',
+    'genre_slug': 'genre__slug',
+    'poster': 'poster',
+    'image': 'image',
+    'director': 'director',
+    'duration': 'duration',
+    'description': 'description',
+    'is_featured': 'is_featured',
+}
+MOVIE_LIST_DEFAULT = ('id', 'title', 'year', 'rating', 'category', 'genre', 'poster')
+MOVIE_DETAIL_DEFAULT = tuple(MOVIE_FIELDS) + ('cast',)
+GENRE_FIELDS = {'id': 'id', 'name': 'name', 'slug': 'slug', 'icon_class': 'icon_class', 'image': 'image'}
+CAST_FIELDS = {'id': 'id', 'name': 'real_name', 'image': 'image'}
+MEDIA_FIELDS = {'poster', 'image'}
+
+MOVIE_ORDER = ('-rating', '-id')
+CAST_ORDER = ('id',)
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+class FieldError(ValueError):
+    pass
+
+
+def parse_fields(value, allowed, default):
+    if not value:
+        return default
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in allowed]
+    if unknown or not fields:
+        raise FieldError(f"Unknown field(s): {', '.join(unknown) or '(none)'}")
+    return fields
+
+
+def parse_limit(value):
+    try:
+        return min(max(int(value), 1), MAX_LIMIT)
+    except (TypeError, ValueError):
+        return DEFAULT_LIMIT
+
+
+def media_url(name):
+    return f'{settings.MEDIA_URL}{filepath_to_uri(name)}' if name else None
+
+
+def shape(rows, fields, mapping):
+    """Rename ``.values()`` rows to output names, keeping only ``fields``."""
+    return [
+        {
+            name: media_url(row[mapping[name]]) if name in MEDIA_FIELDS else row[mapping[name]]
+            for name in fields
+        }
+        for row in rows
+    ]
+
+
+def page(queryset, fields, mapping, ordering, cursor, limit):
+    """One keyset page as ``(items, next_cursor)``."""
+    # The sort key has to be selected even when the client did not ask for it.
+    columns = {mapping[name] for name in fields} | {key.lstrip('-') for key in ordering}
+    rows, next_cursor = keyset_page(queryset.values(*columns), ordering, cursor, limit)
+    return shape(rows, fields, mapping), next_cursor
+
+
+def movies_page(fields, category=None, genre=None, cursor=None, limit=DEFAULT_LIMIT):
+    """``genre`` is a genre id or slug."""
+    movies = Movie.objects.all()
+    if category:
+        movies = movies.filter(category=category)
+    if genre:
+        movies = movies.filter(genre_id=genre) if genre.isdigit() else movies.filter(genre__slug=genre)
+    return page(movies, fields, MOVIE_FIELDS, MOVIE_ORDER, cursor, limit)
+
+
+def cast_page(fields, cursor=None, limit=DEFAULT_LIMIT):
+    return page(Cast.objects.all(), fields, CAST_FIELDS, CAST_ORDER, cursor, limit)
+
+
+def genre_list(fields):
+    rows = Genre.objects.order_by('name').values(*{GENRE_FIELDS[name] for name in fields})
+    return shape(rows, fields, GENRE_FIELDS)
+
+
+def movie_detail(pk, fields):
+    """A movie as a dict, with ``cast`` nested when asked for; None if missing."""
+    movie_fields = [name for name in fields if name != 'cast']
+    columns = {MOVIE_FIELDS[name] for name in movie_fields} or {'id'}
+    row = Movie.objects.filter(pk=pk).values(*columns).first()
+    if row is None:
+        return None
+    data = shape([row], movie_fields, MOVIE_FIELDS)[0]
+    if 'cast' in fields:
+        data['cast'] = [
+            {'id': cast_id, 'name': name, 'character': character, 'image': media_url(image)}
+            for cast_id, name, character, image in MovieCast.objects.filter(movie_id=pk)
+            .order_by('id').values_list('cast_id', 'cast__real_name', 'character_name', 'cast__image')
+        ]
+    return data
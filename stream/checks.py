@@ -0,0 +1,31 @@
+"""System checks for deployment settings the app depends on."""
+import os
+
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PER_PROCESS_CACHES = ('django.core.cache.backends.locmem.LocMemCache',)
+
+
+def per_process_cache_warning():
+    return Warning(
+        "The default cache is per process, so each worker keeps its own catalog version and a catalog "
+        f"change only reaches the others when their entries expire (CATALOG_CACHE_TTL={settings.CATALOG_CACHE_TTL}s).",
+        hint="Set CACHE_BACKEND=redis (or file) when running more than one worker process.",
+        id='stream.W001',
+    )
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    workers = int(os.getenv('WEB_CONCURRENCY') or 1)
+    if workers > 1 and settings.CACHES['default']['BACKEND'] in PER_PROCESS_CACHES:
+        return [per_process_cache_warning()]
+    return []
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache_deploy(app_configs, **kwargs):
+    if settings.CACHES['default']['BACKEND'] in PER_PROCESS_CACHES:
+        return [per_process_cache_warning()]
+    return []
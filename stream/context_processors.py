@@ -0,0 +1,8 @@
+from django.utils.functional import SimpleLazyObject
+
+from . import mylist
+
+
+def my_list(request):
+    """``my_list_ids``: ids in the user's My List, loaded only if a template asks."""
+    return {'my_list_ids': SimpleLazyObject(lambda: mylist.movie_ids(request.user))}
@@ -0,0 +1,108 @@
+"""Cached answer to "may this user watch right now?".
+
+Lookups go through a small per-process LRU, then the shared cache, then the
+database. Subscription signals drop both cached copies; other processes'
+LRU entries age out after ENTITLEMENT_LOCAL_TTL seconds.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .caching import increment
+
+CACHE_PREFIX = 'entitlement:'
+NONE = 'none'  # Cached marker for "no active subscription".
+
+
+class Entitlement(namedtuple('Entitlement', ['plan_name', 'expiry_date'])):
+    __slots__ = ()
+
+    @property
+    def is_active(self):
+        return self.expiry_date > timezone.now()
+
+
+class LocalLRU:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, stored = entry
+            if time.monotonic() - stored > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local = LocalLRU(settings.ENTITLEMENT_LOCAL_SIZE, settings.ENTITLEMENT_LOCAL_TTL)
+
+
+def load(user_id):
+    from .models import Subscription
+
+    row = (
+        Subscription.objects.filter(user_id=user_id, active=True)
+        .values_list('plan_name', 'expiry_date').first()
+    )
+    return Entitlement(*row) if row else NONE
+
+
+def get_entitlement(user):
+    """Return the user's ``Entitlement`` (possibly expired) or ``None``."""
+    user_id = user.pk
+    value = local.get(user_id)
+    if value is not None:
+        increment('entitlement:local_hit')
+    else:
+        value = cache.get(CACHE_PREFIX + str(user_id))
+        if value is not None:
+            increment('entitlement:shared_hit')
+        else:
+            increment('entitlement:miss')
+            value = load(user_id)
+            cache.set(CACHE_PREFIX + str(user_id), value, settings.ENTITLEMENT_CACHE_TTL)
+        local.set(user_id, value)
+    return None if value == NONE else value
+
+
+def has_active_subscription(user):
+    entitlement = get_entitlement(user)
+    return entitlement is not None and entitlement.is_active
+
+
+def invalidate(user_id):
+    local.delete(user_id)
+    cache.delete(CACHE_PREFIX + str(user_id))
+
+
+def invalidate_many(user_ids):
+    for user_id in user_ids:
+        local.delete(user_id)
+    cache.delete_many([CACHE_PREFIX + str(user_id) for user_id in user_ids])
@@ -0,0 +1,49 @@
+"""Bulk deactivation of expired subscriptions.
+
+Entitlement checks compare ``expiry_date`` with the clock, so nothing on the
+request path writes when a plan runs out. ``sweep()`` brings the stored
+flags in line afterwards: it walks the partial (expiry_date) index on active
+subscriptions and clears ``Subscription.active`` and
+``Profile.is_subscribed`` with two UPDATE statements per batch of
+SUBSCRIPTION_SWEEP_BATCH_SIZE.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import entitlements
+from .models import Profile, Subscription
+
+
+def sweep_batch(now, batch_size):
+    """Deactivate up to ``batch_size`` subscriptions that expired by ``now``;
+    returns ``(subscriptions, profiles)`` updated."""
+    with transaction.atomic():
+        rows = list(
+            Subscription.objects.filter(active=True, expiry_date__lte=now)
+            .select_for_update(skip_locked=True)
+            .order_by('expiry_date').values_list('id', 'user_id')[:batch_size]
+        )
+        if not rows:
+            return 0, 0
+        ids, user_ids = zip(*rows)
+        subscriptions = Subscription.objects.filter(pk__in=ids).update(active=False)
+        profiles = Profile.objects.filter(user_id__in=user_ids, is_subscribed=True).update(is_subscribed=False)
+        # update() sends no post_save, so drop cached entitlements here.
+        transaction.on_commit(lambda: entitlements.invalidate_many(user_ids))
+    return subscriptions, profiles
+
+
+def sweep(now=None, batch_size=None):
+    """Deactivate everything that expired by ``now``; returns
+    ``{'subscriptions': ..., 'profiles': ..., 'batches': ...}``."""
+    now = now or timezone.now()
+    batch_size = batch_size or settings.SUBSCRIPTION_SWEEP_BATCH_SIZE
+    counts = {'subscriptions': 0, 'profiles': 0, 'batches': 0}
+    while True:
+        subscriptions, profiles = sweep_batch(now, batch_size)
+        if not subscriptions:
+            return counts
+        counts['subscriptions'] += subscriptions
+        counts['profiles'] += profiles
+        counts['batches'] += 1
@@ -0,0 +1,113 @@
+"""Resized, re-encoded variants of uploaded images for ``srcset``.
+
+``posters/foo.png`` gets ``posters/foo.w320.webp`` and friends next to it in
+the same storage. Variants are created on upload, by the
+``generate_image_derivatives`` command, or lazily the first time a template
+asks for them; which widths exist is remembered in the cache.
+"""
+import io
+import os
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from PIL import Image, features
+
+FORMAT_EXTENSIONS = {'WEBP': 'webp', 'AVIF': 'avif', 'JPEG': 'jpg'}
+CACHE_PREFIX = 'img:v1:'
+# Originals that are missing are re-checked after this many seconds.
+MISSING_TIMEOUT = 60 * 5
+
+
+def output_format():
+    fmt = settings.IMAGE_DERIVATIVE_FORMAT.upper()
+    if fmt in ('WEBP', 'AVIF') and not features.check(fmt.lower()):
+        return 'JPEG'
+    return fmt
+
+
+def derivative_name(name, width, fmt=None):
+    root, _ = os.path.splitext(name)
+    return f'{root}.w{width}.{FORMAT_EXTENSIONS[fmt or output_format()]}'
+
+
+def is_derivative(name):
+    root, _ = os.path.splitext(name)
+    suffix = os.path.splitext(root)[1]
+    return suffix.startswith('.w') and suffix[2:].isdigit()
+
+
+def encode(image, fmt, width):
+    height = round(image.height * width / image.width)
+    resized = image.resize((width, height), Image.Resampling.LANCZOS)
+    if fmt == 'JPEG' and resized.mode not in ('RGB', 'L'):
+        resized = resized.convert('RGB')
+    buffer = io.BytesIO()
+    resized.save(buffer, fmt, quality=settings.IMAGE_DERIVATIVE_QUALITY)
+    return buffer.getvalue()
+
+
+def generate_derivatives(fieldfile, force=False):
+    """Write any missing variants of ``fieldfile``; returns ``[(width, name), ...]``."""
+    storage, name = fieldfile.storage, fieldfile.name
+    if not name or not storage.exists(name):
+        cache.set(CACHE_PREFIX + name, ([], None), MISSING_TIMEOUT)
+        return []
+    fmt = output_format()
+    with storage.open(name, 'rb') as fh:
+        # Only the header is read until load(), which is skipped when every
+        # variant already exists.
+        image = Image.open(fh)
+        # Never upscale; the original already covers anything wider.
+        widths = [width for width in settings.IMAGE_DERIVATIVE_WIDTHS if width < image.width]
+        targets = {width: derivative_name(name, width, fmt) for width in widths}
+        missing = [width for width in widths if force or not storage.exists(targets[width])]
+        if missing:
+            image.load()
+    if missing and image.mode == 'P':
+        image = image.convert('RGBA')
+    for width in missing:
+        if force and storage.exists(targets[width]):
+            storage.delete(targets[width])
+        # The storage may pick another name if the target appeared meanwhile.
+        targets[width] = storage.save(targets[width], ContentFile(encode(image, fmt, width)))
+    variants = [(width, targets[width]) for width in widths]
+    cache.set(CACHE_PREFIX + name, (variants, image.width), None)
+    return variants
+
+
+def get_variants(fieldfile):
+    """Return ``(variants, original_width)``, generating variants on a cache miss."""
+    cached = cache.get(CACHE_PREFIX + fieldfile.name)
+    if cached is not None:
+        return cached
+    try:
+        generate_derivatives(fieldfile)
+    except (OSError, ValueError):
+        # Unreadable originals just get a plain src.
+        cache.set(CACHE_PREFIX + fieldfile.name, ([], None), MISSING_TIMEOUT)
+        return [], None
+    return cache.get(CACHE_PREFIX + fieldfile.name, ([], None))
+
+
+def srcset(fieldfile):
+    """``srcset`` value for an image field, or ``''`` when there are no variants."""
+    if not fieldfile:
+        return ''
+    variants, original_width = get_variants(fieldfile)
+    if not variants:
+        return ''
+    candidates = [f'{fieldfile.storage.url(name)} {width}w' for width, name in variants]
+    if original_width:
+        candidates.append(f'{fieldfile.url} {original_width}w')
+    return ', '.join(candidates)
+
+
+def image_fields(instance, names=None):
+    """The non-empty image fields of ``instance``, or only those in ``names``."""
+    from django.db.models import ImageField
+    for field in instance._meta.get_fields():
+        if isinstance(field, ImageField) and (names is None or field.name in names):
+            fieldfile = getattr(instance, field.name)
+            if fieldfile:
+                yield fieldfile
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+
+from stream import entitlements
+from stream.benchmark import seed_view_fixtures, temporary_database, view_scenarios
+from stream.query_audit import ALLOWED_VIEWS, audit_call
+from stream.razorpay_stub import RazorpayStub
+
+
+class Command(BaseCommand):
+    help = (
+        "Request every view against a synthetic catalog in a throwaway database, run EXPLAIN QUERY PLAN "
+        "on each query it issues and flag full scans and temp B-trees."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=2000)
+        parser.add_argument('--view', action='append', help="Only audit these route names.")
+        parser.add_argument('--verbose', action='store_true', help="Print every plan, not only flagged ones.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("EXPLAIN QUERY PLAN output is only understood for SQLite.")
+
+        flagged = 0
+        with temporary_database(), RazorpayStub(secret='secret') as gateway, override_settings(
+            ALLOWED_HOSTS=['*'], RAZORPAY_BASE_URL=gateway.url,
+            RAZORPAY_KEY_ID='rzp_audit', RAZORPAY_KEY_SECRET='secret',
+        ):
+            movie, user = seed_view_fixtures(options['titles'])
+            client = Client()
+            for name, method, url, data, logged_in in view_scenarios(movie):
+                if options['view'] and name not in options['view']:
+                    continue
+                # Cold caches, so the queries a cache miss costs are audited too.
+                cache.clear()
+                entitlements.local.clear()
+                client.logout()
+                if logged_in:
+                    client.force_login(user)
+                results = audit_call(getattr(client, method), url, data)
+                bad = [result for result in results if result[2]]
+                if bad and name in ALLOWED_VIEWS:
+                    status = self.style.WARNING(f"{len(bad)} allowed ({ALLOWED_VIEWS[name]})")
+                else:
+                    flagged += len(bad)
+                    status = self.style.ERROR(f"{len(bad)} flagged") if bad else self.style.SUCCESS("ok")
+                self.stdout.write(f"{name}: {len(results)} queries, {status}")
+                for sql, plan, problems in (results if options['verbose'] else bad):
+                    self.stdout.write(f"    {sql[:300]}")
+                    for detail in plan:
+                        marker = '!!' if detail in problems else '  '
+                        self.stdout.write(f"      {marker} {detail}")
+
+        if flagged:
+            raise CommandError(f"{flagged} query plan(s) need an index.")
+        self.stdout.write(self.style.SUCCESS("No full scans or temp B-trees."))
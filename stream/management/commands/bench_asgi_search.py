@@ -0,0 +1,215 @@
+import asyncio
+import io
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.backends.signals import connection_created
+from django.test import override_settings
+from django.urls import reverse
+
+from stream import search
+from stream.benchmark import percentile, seed_catalog, temporary_database
+from stream.synthetic import make_word
+
+# (label, URLconf). The WSGI entry point routes to the sync views, the ASGI
+# one to their async versions.
+MODES = (
+    ('wsgi', 'myapp.urls'),
+    ('asgi', 'myapp.asgi_urls'),
+)
+
+
+class Stats:
+    """Statement counts and database time across every connection."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statements = self.interrupted = 0
+        self.db_seconds = 0.0
+        self.threads = threading.active_count()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        except OperationalError:
+            with self.lock:
+                self.interrupted += 1
+            raise
+        finally:
+            with self.lock:
+                self.statements += 1
+                self.db_seconds += time.perf_counter() - started
+                self.threads = max(self.threads, threading.active_count())
+
+    def watch(self, sender, connection, **kwargs):
+        connection.execute_wrappers.append(self)
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay clients typing into the navbar search - one request per keystroke, the previous one "
+        "aborted - against the WSGI (sync views, worker threads) and ASGI (async views) entry points "
+        "in-process, and report latency of the last keystroke and the database time spent."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=50_000)
+        parser.add_argument('--clients', type=int, default=16)
+        parser.add_argument('--words', type=int, default=5, help="Words typed per client.")
+        parser.add_argument('--keystroke-ms', type=float, default=80)
+        parser.add_argument('--workers', type=int, default=4, help="WSGI worker threads.")
+        parser.add_argument('--endpoint', choices=('search_api', 'get_suggestions'), default='search_api')
+        parser.add_argument('--orm', action='store_true', help="Use the unindexed icontains search backend.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("Cancellation interrupts SQLite statements.")
+
+        rng = random.Random(options['seed'])
+        sessions = [[make_word(rng) for _ in range(options['words'])] for _ in range(options['clients'])]
+        backend = 'stream.search.ORMSearchBackend' if options['orm'] else None
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(SEARCH_BACKEND=backend), \
+                temporary_database(name=os.path.join(directory, 'bench.sqlite3')):
+            search.get_backend.cache_clear()
+            self.stdout.write(f"Seeding {options['titles']} titles...")
+            seed_catalog(options['titles'], seed=options['seed'])
+            db_settings = connection.settings_dict
+            saved_max_age = db_settings['CONN_MAX_AGE']
+            try:
+                for label, urlconf in MODES:
+                    # As in settings: no persistent connections under ASGI.
+                    db_settings['CONN_MAX_AGE'] = 0 if label == 'asgi' else saved_max_age
+                    connections.close_all()
+                    with override_settings(ROOT_URLCONF=urlconf):
+                        path = reverse(options['endpoint'])
+                        stats = Stats()
+                        connection_created.connect(stats.watch)
+                        try:
+                            started = time.perf_counter()
+                            latencies, sent = asyncio.run(self.replay(label, path, sessions, options))
+                            elapsed = time.perf_counter() - started
+                        finally:
+                            connection_created.disconnect(stats.watch)
+                    self.report(label, latencies, sent, stats, elapsed)
+            finally:
+                db_settings['CONN_MAX_AGE'] = saved_max_age
+                connections.close_all()
+                search.get_backend.cache_clear()
+
+    async def replay(self, label, path, sessions, options):
+        keystroke = options['keystroke_ms'] / 1000
+        if label == 'wsgi':
+            send = WsgiServer(options['workers']).send
+        else:
+            send = AsgiServer().send
+        latencies, requests = [], []
+
+        async def client(words):
+            for word in words:
+                pending = None
+                for end in range(2, len(word) + 1):
+                    if pending is not None:
+                        pending.abort()
+                    pending = send(path, word[:end])
+                    requests.append(pending)
+                    await asyncio.sleep(keystroke)
+                if pending is not None:
+                    latencies.append(await pending.finished())
+                await asyncio.sleep(keystroke * 5)  # Reading the results.
+
+        await asyncio.gather(*(client(words) for words in sessions))
+        # Aborted requests still run under WSGI; let them drain.
+        await asyncio.gather(*(request.task for request in requests), return_exceptions=True)
+        return latencies, len(requests)
+
+    def report(self, label, latencies, sent, stats, elapsed):
+        latencies = latencies or [0.0]
+        self.stdout.write(
+            f"{label}: last keystroke p50={percentile(latencies, 0.5):.1f}ms p99={percentile(latencies, 0.99):.1f}ms "
+            f"| {sent} requests, {stats.statements} statements ({stats.interrupted} interrupted), "
+            f"{stats.db_seconds:.2f}s in the database | peak threads {stats.threads} | {elapsed:.1f}s"
+        )
+
+
+class Request:
+    def __init__(self, task, disconnect=None):
+        self.task = task
+        self.disconnect = disconnect
+        self.sent = time.perf_counter()
+
+    def abort(self):
+        if self.disconnect is not None:
+            self.disconnect.set()
+
+    async def finished(self):
+        await self.task
+        return (time.perf_counter() - self.sent) * 1000
+
+
+class WsgiServer:
+    """A threaded WSGI server: a client going away goes unnoticed."""
+
+    def __init__(self, workers):
+        self.handler = WSGIHandler()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+
+    def call(self, path, query):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': urlencode({'q': query}),
+            'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'wsgi.url_scheme': 'http', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+        }
+        response = self.handler(environ, lambda status, headers: None)
+        try:
+            return b''.join(response)
+        finally:
+            response.close()
+
+    def send(self, path, query):
+        loop = asyncio.get_running_loop()
+        return Request(loop.run_in_executor(self.pool, self.call, path, query))
+
+
+class AsgiServer:
+    """An ASGI server that reports a disconnect as soon as the client aborts."""
+
+    def __init__(self):
+        self.handler = ASGIHandler()
+
+    async def call(self, path, query, disconnect):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '',
+            'query_string': urlencode({'q': query}).encode(), 'headers': [(b'host', b'testserver')],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        body_sent = [False]
+
+        async def receive():
+            if not body_sent[0]:
+                body_sent[0] = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            pass
+
+        await self.handler(scope, receive, send)
+
+    def send(self, path, query):
+        disconnect = asyncio.Event()
+        return Request(asyncio.create_task(self.call(path, query, disconnect)), disconnect)
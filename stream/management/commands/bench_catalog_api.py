@@ -0,0 +1,72 @@
+import json
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from stream import catalog_api
+from stream.benchmark import percentile, seed_catalog, temporary_database, timed
+from stream.models import Movie
+from stream.views import api_movies
+
+
+def naive_movies(limit):
+    """What search_api used to do: model instances and storage.url per row."""
+    movies = Movie.objects.filter(category='movie').order_by('-rating', '-id')[:limit]
+    return json.dumps({'results': [
+        {
+            'id': movie.id, 'title': movie.title, 'year': movie.year, 'rating': movie.rating,
+            'category': movie.category, 'genre': movie.genre_id,
+            'poster': movie.poster.url if movie.poster else None,
+        }
+        for movie in movies
+    ]})
+
+
+class Command(BaseCommand):
+    help = "Measure catalog API response sizes and serialization/conditional-GET times in a throwaway database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=20_000)
+        parser.add_argument('--limit', type=int, default=catalog_api.MAX_LIMIT)
+        parser.add_argument('--runs', type=int, default=50)
+
+    def handle(self, *args, **options):
+        limit, runs = options['limit'], options['runs']
+        factory = RequestFactory()
+        with temporary_database():
+            self.stdout.write(f"Seeding {options['titles']} titles...")
+            seed_catalog(options['titles'])
+
+            self.stdout.write(f"Response size for {limit} movies:")
+            compact = catalog_api.movies_page(catalog_api.MOVIE_LIST_DEFAULT, category='movie', limit=limit)[0]
+            narrow = catalog_api.movies_page(('id', 'title'), category='movie', limit=limit)[0]
+            sizes = {
+                'naive (default json)': len(naive_movies(limit)),
+                'compact separators': len(json.dumps({'results': compact}, separators=(',', ':'))),
+                'fields=id,title': len(json.dumps({'results': narrow}, separators=(',', ':'))),
+            }
+            for label, size in sizes.items():
+                self.stdout.write(f"  {label:>22}: {size:>8} bytes")
+
+            self.stdout.write("Time per request:")
+
+            def api(cold=False, if_none_match=None):
+                if cold:
+                    cache.clear()
+                headers = {'HTTP_IF_NONE_MATCH': if_none_match} if if_none_match else {}
+                request = factory.get('/api/v1/movies/', {'category': 'movie', 'limit': limit}, **headers)
+                return api_movies(request)
+
+            etag = api(cold=True)['ETag']
+            cases = [
+                ('naive', lambda: naive_movies(limit)),
+                ('api, uncached', lambda: api(cold=True)),
+                ('api, cached body', api),
+                ('api, 304', lambda: api(if_none_match=etag)),
+            ]
+            for label, func in cases:
+                samples = [timed(func)[1] * 1000 for _ in range(runs)]
+                self.stdout.write(
+                    f"  {label:>22}: p50={percentile(samples, 0.5):.2f}ms p99={percentile(samples, 0.99):.2f}ms"
+                )
@@ -0,0 +1,54 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import NoReverseMatch, reverse
+
+from stream import entitlements
+from stream.benchmark import seed_view_fixtures, temporary_database
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a large catalog in a throwaway database and measure the home page for a logged-in viewer: "
+        "time to first byte and HTML size with cold and warm caches, and the same for each lazily loaded shelf."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=20_000)
+        parser.add_argument('--runs', type=int, default=15)
+
+    def handle(self, *args, **options):
+        with temporary_database(), override_settings(ALLOWED_HOSTS=['*'], PROFILING_ENABLED=False):
+            self.stdout.write(f"Seeding {options['titles']} titles...")
+            movie, user = seed_view_fixtures(options['titles'])
+            client = Client()
+            client.force_login(user)
+            urls = [('home', reverse('home'))]
+            for name, args in (('home_shelf', ['tv']), ('home_shelf', ['genres']), ('my_list_shelf', [])):
+                try:
+                    urls.append((f"{name} {' '.join(args)}".strip(), reverse(name, args=args)))
+                except NoReverseMatch:
+                    pass  # Before shelves were loaded lazily.
+
+            self.stdout.write(f"{'':18}{'cold TTFB':>12}{'warm TTFB':>12}{'bytes':>12}")
+            for label, url in urls:
+                cold = [self.fetch(client, url, clear=True) for _ in range(options['runs'])]
+                warm = [self.fetch(client, url, clear=False) for _ in range(options['runs'])]
+                self.stdout.write(
+                    f"{label:18}{statistics.median(t for t, _ in cold):10.1f}ms"
+                    f"{statistics.median(t for t, _ in warm):10.1f}ms{cold[-1][1]:12,}"
+                )
+
+    def fetch(self, client, url, clear):
+        if clear:
+            cache.clear()
+            entitlements.local.clear()
+        started = time.perf_counter()
+        response = client.get(url)
+        # Not streamed: the first byte leaves once the whole body is rendered.
+        elapsed = (time.perf_counter() - started) * 1000
+        assert response.status_code == 200, (url, response.status_code)
+        return elapsed, len(response.content)
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from stream.benchmark import percentile, seed_catalog, temporary_database, timed
+from stream.models import Genre, Movie
+from stream.pagination import after, encode_cursor, keyset_page
+from stream.views import CARD_FIELDS, LIST_ORDER, LIST_PAGE_SIZE
+
+
+class Command(BaseCommand):
+    help = "Compare OFFSET and keyset pagination of category_list at a deep page in a throwaway database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=100_000)
+        parser.add_argument('--page', type=int, default=1000)
+        parser.add_argument('--runs', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        size, page = LIST_PAGE_SIZE, options['page']
+        offset = (page - 1) * size
+        with temporary_database():
+            self.stdout.write(f"Seeding {options['titles']} titles...")
+            seed_catalog(options['titles'], seed=options['seed'])
+            items = Movie.objects.filter(category='movie').only(*CARD_FIELDS)
+            total = items.count()
+            if offset >= total:
+                self.stderr.write(f"Only {total} movies; page {page} is empty. Use more --titles.")
+                return
+
+            # The cursor a client would hold after reading pages 1..page-1.
+            boundary = items.order_by(*LIST_ORDER)[offset - 1:offset].get() if offset else None
+            cursor = encode_cursor([boundary.rating, boundary.id]) if boundary else None
+
+            def by_offset():
+                return list(items.order_by(*LIST_ORDER)[offset:offset + size])
+
+            def by_keyset():
+                return keyset_page(items, LIST_ORDER, cursor, size)[0]
+
+            def first_page():
+                return keyset_page(items, LIST_ORDER, None, size)[0]
+
+            self.stdout.write(f"{total} movies, page {page} ({size} per page, offset {offset})")
+            self.check_same(by_offset(), by_keyset())
+            for label, func in (('page 1', first_page), ('OFFSET', by_offset), ('keyset', by_keyset)):
+                samples = [timed(func)[1] * 1000 for _ in range(options['runs'])]
+                self.stdout.write(
+                    f"{label:>8}: p50={percentile(samples, 0.5):.2f}ms p99={percentile(samples, 0.99):.2f}ms"
+                )
+            self.explain('OFFSET', items.order_by(*LIST_ORDER)[offset:offset + size])
+            if boundary:
+                self.explain('keyset', items.filter(after(LIST_ORDER, [boundary.rating, boundary.id]))
+                             .order_by(*LIST_ORDER)[:size + 1])
+
+            genre = Genre.objects.order_by('id').first()
+            genre_items = items.filter(genre=genre)
+            _, elapsed = timed(lambda: keyset_page(genre_items, LIST_ORDER, None, size))
+            self.stdout.write(f"genre {genre.slug!r} page 1 (keyset): {elapsed * 1000:.2f}ms")
+
+    def check_same(self, expected, actual):
+        if [m.pk for m in expected] != [m.pk for m in actual]:
+            self.stderr.write("OFFSET and keyset pages differ!")
+
+    def explain(self, label, queryset):
+        if connection.vendor != 'sqlite':
+            return
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = '; '.join(row[-1] for row in cursor.fetchall())
+        self.stdout.write(f"{label} plan: {plan}")
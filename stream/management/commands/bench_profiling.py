@@ -0,0 +1,58 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from stream import profiling
+from stream.benchmark import seed_view_fixtures, temporary_database, view_scenarios
+
+# (label, PROFILING_ENABLED, PROFILING_SAMPLE_RATE)
+MODES = (
+    ('off', False, 0),
+    ('histograms only', True, 0),
+    ('sampled 10%', True, 0.1),
+    ('every request', True, 1),
+)
+VIEWS = ('home', 'movies', 'movie_detail', 'search_api', 'api_movies', 'play_movie')
+
+
+class Command(BaseCommand):
+    help = (
+        "Time warm-cache requests to a few views in a throwaway database with ProfilingMiddleware off, "
+        "recording histograms only, and breaking down sampled or all requests."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=2000)
+        parser.add_argument('--rounds', type=int, default=200)
+        parser.add_argument('--view', action='append', help="Only time these route names.")
+
+    def handle(self, *args, **options):
+        names = options['view'] or VIEWS
+        with temporary_database(), override_settings(ALLOWED_HOSTS=['*'], PROFILING_SLOW_MS=float('inf')):
+            movie, user = seed_view_fixtures(options['titles'])
+            scenarios = [scenario for scenario in view_scenarios(movie) if scenario[0] in names]
+            anonymous, logged_in = Client(), Client()
+            logged_in.force_login(user)
+            samples = {(name, label): [] for name, *_ in scenarios for label, *_ in MODES}
+            for _ in range(options['rounds']):
+                # Modes interleaved, so drift affects them alike.
+                for label, enabled, rate in MODES:
+                    with override_settings(PROFILING_ENABLED=enabled, PROFILING_SAMPLE_RATE=rate):
+                        for name, method, url, data, login in scenarios:
+                            client = logged_in if login else anonymous
+                            started = time.perf_counter()
+                            getattr(client, method)(url, data)
+                            samples[name, label].append((time.perf_counter() - started) * 1e6)
+            profiling.reset()
+
+        header = ''.join(f'{label:>18}' for label, *_ in MODES)
+        self.stdout.write(f"median µs per request (overhead vs off)\n{'':14}{header}")
+        for name, *_ in scenarios:
+            base = statistics.median(samples[name, 'off'])
+            cells = []
+            for label, *_ in MODES:
+                median = statistics.median(samples[name, label])
+                cells.append(f'{median:8.0f} ({median - base:+5.0f})')
+            self.stdout.write(f"{name:14}" + ''.join(f'{cell:>18}' for cell in cells))
@@ -0,0 +1,67 @@
+import time
+import tracemalloc
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from stream import recommendations
+from stream.benchmark import percentile, seed_catalog, temporary_database, timed
+from stream.models import Movie, SimilarMovie
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the similar-titles build in a throwaway database: feature loading, NumPy scoring, "
+        "peak memory, writing the table, an incremental refresh and the detail-page lookup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=100_000)
+        parser.add_argument('--k', type=int, default=settings.RECOMMENDATIONS_K)
+        parser.add_argument('--runs', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        k = options['k']
+        with temporary_database():
+            self.stdout.write(f"Seeding {options['titles']} titles...")
+            seed_catalog(options['titles'], seed=options['seed'])
+
+            features, load_time = timed(recommendations.load_features)
+            self.stdout.write(
+                f"features: {len(features)} titles, {len(features.movie_cast)} cast links, "
+                f"{features.director.max() + 1} directors, loaded in {load_time:.2f}s"
+            )
+
+            # NumPy reports its allocations to tracemalloc.
+            tracemalloc.start()
+            rows = np.arange(len(features))
+            arrays, score_time = timed(recommendations.neighbours, features, rows, k)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.stdout.write(
+                f"scoring: {score_time:.2f}s ({len(features) / score_time:,.0f} titles/s), "
+                f"peak {peak / 2 ** 20:.0f} MiB for {len(arrays[0])} neighbours, "
+                f"block of {max(1, recommendations.BLOCK_CELLS // len(features))} rows"
+            )
+
+            count, build_time = timed(recommendations.rebuild, k)
+            self.stdout.write(f"full rebuild (load + score + write {count} rows): {build_time:.2f}s")
+
+            movie = Movie.objects.order_by('?').first()
+            affected, refresh_time = timed(recommendations.refresh, [movie.pk], k)
+            self.stdout.write(f"refresh after one title changed: {len(affected)} lists in {refresh_time:.2f}s")
+
+            ids = list(Movie.objects.values_list('id', flat=True)[:options['runs']])
+            samples = []
+            for pk in ids:
+                with CaptureQueriesContext(connection) as captured:
+                    _, elapsed = timed(lambda: list(recommendations.similar_to(pk, 6)))
+                samples.append(elapsed * 1000)
+            self.stdout.write(
+                f"detail lookup: {len(captured)} query, p50={percentile(samples, 0.5):.2f}ms "
+                f"p99={percentile(samples, 0.99):.2f}ms; table holds {SimilarMovie.objects.count()} rows"
+            )
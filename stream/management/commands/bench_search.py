@@ -0,0 +1,42 @@
+import random
+
+from django.core.management.base import BaseCommand
+
+from stream.benchmark import percentile, seed_catalog, temporary_database, timed
+from stream.synthetic import make_word
+from stream.search import ORMSearchBackend, get_backend
+
+
+class Command(BaseCommand):
+    help = "Benchmark search latency (p50/p99) on a synthetic catalog in a throwaway database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=100_000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--skip-orm', action='store_true', help="Skip the unindexed icontains baseline.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        # Mix of whole words and the 2-4 character prefixes the navbar sends while typing.
+        queries = [
+            word[:rng.randint(2, len(word))] if rng.random() < 0.5 else word
+            for word in (make_word(rng) for _ in range(options['queries']))
+        ]
+
+        with temporary_database():
+            self.stdout.write(f"Seeding {options['titles']} titles...")
+            seed_catalog(options['titles'], seed=options['seed'])
+            backend = get_backend()
+            _, elapsed = timed(backend.rebuild)
+            self.stdout.write(f"Index rebuild: {elapsed:.2f}s")
+
+            backends = [backend]
+            if not options['skip_orm'] and type(backend) is not ORMSearchBackend:
+                backends.append(ORMSearchBackend())
+            for candidate in backends:
+                samples = [timed(candidate.search, query, 15)[1] * 1000 for query in queries]
+                self.stdout.write(
+                    f"{type(candidate).__name__:>18}: p50={percentile(samples, 0.5):.2f}ms "
+                    f"p99={percentile(samples, 0.99):.2f}ms"
+                )
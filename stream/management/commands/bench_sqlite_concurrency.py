@@ -0,0 +1,127 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.test import override_settings
+
+from stream.benchmark import percentile, seed_catalog, temporary_database
+from stream.models import Movie, MyList
+from stream.views import LIST_ORDER, LIST_PAGE_SIZE
+
+# (label, PRAGMAs, connection OPTIONS). "stock" is Django's default SQLite
+# setup: rollback journal, deferred transactions, Python's 5 s busy timeout.
+MODES = (
+    ('stock', {'journal_mode': 'delete'}, {}),
+    ('tuned', settings.SQLITE_TUNED_PRAGMAS, {'transaction_mode': 'IMMEDIATE'}),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run reader and writer threads against a file-backed throwaway SQLite database, once with Django's "
+        "stock settings and once in the tuned deployment mode, and report throughput and lock errors."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--titles', type=int, default=20_000)
+        parser.add_argument('--readers', type=int, default=6)
+        parser.add_argument('--writers', type=int, default=3)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("This benchmark compares SQLite journal and transaction modes.")
+
+        with tempfile.TemporaryDirectory() as directory, temporary_database(
+            name=os.path.join(directory, 'bench.sqlite3'),
+        ):
+            self.stdout.write(f"Seeding {options['titles']} titles...")
+            first, last = seed_catalog(options['titles'], users=options['writers'], seed=options['seed'])
+            user_ids = list(User.objects.order_by('id').values_list('id', flat=True)[:options['writers']])
+            movie_ids = range(first, last + 1)
+
+            db_options = connection.settings_dict['OPTIONS']
+            saved = dict(db_options)
+            try:
+                for label, pragmas, mode_options in MODES:
+                    db_options.clear()
+                    db_options.update(mode_options)
+                    with override_settings(SQLITE_PRAGMAS=pragmas):
+                        # Reconnect so the journal mode switches before the threads start.
+                        connections.close_all()
+                        connection.ensure_connection()
+                        self.report(label, self.run(user_ids, movie_ids, options))
+            finally:
+                db_options.clear()
+                db_options.update(saved)
+                connections.close_all()
+
+    def run(self, user_ids, movie_ids, options):
+        deadline = time.perf_counter() + options['seconds']
+        stats = {'read': [], 'write': [], 'locked': 0}
+        lock = threading.Lock()
+
+        def read(rng, user_id):
+            list(Movie.objects.filter(category='movie').order_by(*LIST_ORDER)
+                 .values_list('id', 'title', 'poster')[:LIST_PAGE_SIZE])
+
+        def write(rng, user_id):
+            # toggle_my_list's read-then-write, in one transaction.
+            movie_id = rng.choice(movie_ids)
+            with transaction.atomic():
+                rows = MyList.objects.filter(user_id=user_id, movie_id=movie_id)
+                if rows.exists():
+                    rows.delete()
+                else:
+                    MyList.objects.create(user_id=user_id, movie_id=movie_id)
+
+        def worker(kind, func, user_id, seed):
+            rng = random.Random(seed)
+            samples, locked = [], 0
+            try:
+                while time.perf_counter() < deadline:
+                    started = time.perf_counter()
+                    try:
+                        func(rng, user_id)
+                    except OperationalError:
+                        locked += 1
+                        continue
+                    samples.append((time.perf_counter() - started) * 1000)
+            finally:
+                connection.close()
+            with lock:
+                stats[kind].extend(samples)
+                stats['locked'] += locked
+
+        threads = [
+            threading.Thread(target=worker, args=('read', read, user_ids[0], n))
+            for n in range(options['readers'])
+        ] + [
+            threading.Thread(target=worker, args=('write', write, user_id, 1000 + n))
+            for n, user_id in enumerate(user_ids)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats['elapsed'] = time.perf_counter() - started
+        return stats
+
+    def report(self, label, stats):
+        elapsed = stats['elapsed']
+        parts = []
+        for kind in ('read', 'write'):
+            samples = stats[kind] or [0.0]
+            parts.append(
+                f"{kind}s {len(stats[kind]) / elapsed:8.1f}/s "
+                f"p50={percentile(samples, 0.5):.2f}ms p99={percentile(samples, 0.99):.2f}ms"
+            )
+        self.stdout.write(f"{label:>6}: {' | '.join(parts)} | locked errors {stats['locked']}")
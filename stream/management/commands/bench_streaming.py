@@ -0,0 +1,66 @@
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+
+from stream.streaming import serve_file
+
+
+class Command(BaseCommand):
+    help = "Benchmark seek latency and bytes transferred for ranged vs. full-file video delivery."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-mb', type=int, default=256, help="Size of the synthetic video file.")
+        parser.add_argument('--seeks', type=int, default=20, help="Number of random seeks to simulate.")
+        parser.add_argument('--window-kb', type=int, default=1024, help="Bytes the player needs after each seek.")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        size = options['size_mb'] * 1024 * 1024
+        window = options['window_kb'] * 1024
+        rng = random.Random(options['seed'])
+        factory = RequestFactory()
+
+        with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as tmp:
+            chunk = os.urandom(1024 * 1024)
+            for _ in range(options['size_mb']):
+                tmp.write(chunk)
+            path = tmp.name
+
+        try:
+            offsets = [rng.randrange(0, size - window) for _ in range(options['seeks'])]
+            results = {}
+            for mode in ('full', 'range'):
+                latencies, transferred = [], 0
+                for offset in offsets:
+                    headers = {}
+                    if mode == 'range':
+                        headers['HTTP_RANGE'] = f'bytes={offset}-'
+                    request = factory.get('/stream/1/', **headers)
+                    started = time.perf_counter()
+                    response = serve_file(request, path)
+                    # Without Range support the player must read up to the seek point.
+                    needed = window if mode == 'range' else offset + window
+                    received = 0
+                    for part in response.streaming_content:
+                        received += len(part)
+                        if received >= needed:
+                            break
+                    latencies.append(time.perf_counter() - started)
+                    transferred += received
+                    response.close()
+                latencies.sort()
+                results[mode] = (latencies, transferred)
+        finally:
+            os.remove(path)
+
+        self.stdout.write(f"file={options['size_mb']}MiB seeks={options['seeks']} window={options['window_kb']}KiB")
+        for mode, (latencies, transferred) in results.items():
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            self.stdout.write(
+                f"{mode:>6}: p50={p50:.2f}ms p99={p99:.2f}ms bytes={transferred / 1024 / 1024:.1f}MiB"
+            )
@@ -0,0 +1,66 @@
+import random
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from stream.benchmark import percentile, timed
+from stream.synthetic import FIRST_NAMES, LAST_NAMES, SYLLABLES
+from stream.suggestions import SuggestionIndex
+
+
+class Command(BaseCommand):
+    help = "Benchmark build time, memory per entry and lookup latency of the suggestion index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--names', type=int, default=300_000)
+        parser.add_argument('--queries', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        def name():
+            surname = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+            return f'{rng.choice(FIRST_NAMES).title()} {rng.choice(LAST_NAMES).title()} {surname.title()}'
+
+        entries = [(name(), rng.choice(('director', 'cast')), rng.paretovariate(1.2)) for _ in range(options['names'])]
+        # Whole-word prefixes, mid-name prefixes and single-character typos.
+        queries = []
+        for _ in range(options['queries']):
+            target = rng.choice(entries)[0].lower()
+            words = target.split()
+            kind = rng.random()
+            if kind < 0.4:
+                queries.append(target[:rng.randint(2, len(target))])
+            elif kind < 0.7:
+                word = rng.choice(words)
+                queries.append(word[:rng.randint(2, len(word))])
+            else:
+                position = rng.randrange(len(target))
+                queries.append(target[:position] + 'x' + target[position + 1:])
+
+        _, elapsed_build = timed(SuggestionIndex, entries)
+        # Measured on a second build: tracemalloc slows construction several-fold.
+        tracemalloc.start()
+        index = SuggestionIndex(entries)
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        prefix_samples, fuzzy_samples, hits = [], [], 0
+        for query in queries:
+            result, elapsed = timed(index.suggest, query)
+            hits += bool(result)
+            if index.prefix_matches(' '.join(query.split())):
+                prefix_samples.append(elapsed * 1_000_000)
+            else:
+                fuzzy_samples.append(elapsed * 1_000_000)
+
+        self.stdout.write(f"entries={len(index)} build={elapsed_build:.2f}s")
+        self.stdout.write(f"memory={current / 1024 / 1024:.1f}MiB ({current / len(index):.0f} bytes/entry)")
+        for label, samples in (('prefix', prefix_samples), ('fuzzy', fuzzy_samples)):
+            if samples:
+                self.stdout.write(
+                    f"{label:>6}: n={len(samples)} p50={percentile(samples, 0.5):.1f}us "
+                    f"p99={percentile(samples, 0.99):.1f}us"
+                )
+        self.stdout.write(f"hit rate={hits / len(queries):.1%}")
@@ -0,0 +1,113 @@
+import os
+import random
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from stream import progress
+from stream.benchmark import seed_catalog, temporary_database
+from stream.models import WatchProgress
+
+HOUR = 3600
+TITLE_LENGTH = 2 * HOUR
+WRITES = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate an hour of player heartbeats against a file-backed throwaway SQLite database and compare "
+        "writing every heartbeat with the cache-coalesced flush: write statements, rows and WAL bytes per "
+        "viewer-hour."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--viewers', type=int, default=100)
+        parser.add_argument('--titles', type=int, default=1000)
+        parser.add_argument('--heartbeat', type=int, default=10, help="Seconds between heartbeats.")
+        parser.add_argument('--flush', type=int, default=60, help="Seconds per flush slot.")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("WAL bytes are measured on SQLite.")
+
+        # WAL without automatic checkpoints, so the -wal file holds every page written.
+        pragmas = {'journal_mode': 'wal', 'synchronous': 'normal', 'wal_autocheckpoint': 0}
+        caches = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-progress',
+            # Simulated slots pass faster than the real-time expiry of their keys.
+            'OPTIONS': {'MAX_ENTRIES': 3 * options['viewers'] * (HOUR // options['flush']) + 1000},
+        }}
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            SQLITE_PRAGMAS=pragmas, CACHES=caches, PROGRESS_FLUSH_SECONDS=options['flush'],
+        ), temporary_database(name=os.path.join(directory, 'bench.sqlite3')):
+            self.stdout.write(f"Seeding {options['titles']} titles and {options['viewers']} viewers...")
+            first, last = seed_catalog(options['titles'], users=options['viewers'], seed=options['seed'])
+            heartbeats = self.heartbeats(
+                list(User.objects.order_by('id').values_list('id', flat=True)),
+                range(first, last + 1), options,
+            )
+            wal = connection.settings_dict['NAME'] + '-wal'
+            self.stdout.write(f"{len(heartbeats)} heartbeats over one hour\n")
+            for label, func in (('naive', self.naive), ('coalesced', self.coalesced)):
+                self.report(label, self.measure(func, heartbeats, wal), options['viewers'])
+
+    def heartbeats(self, user_ids, movie_ids, options):
+        """``(time, user_id, movie_id, position)`` for every viewer, in time order."""
+        rng = random.Random(options['seed'])
+        start = 1_000_000 * options['flush']  # Aligned with a flush slot.
+        events = []
+        for user_id in user_ids:
+            movie_id = rng.choice(movie_ids)
+            phase, position = rng.uniform(0, options['heartbeat']), rng.uniform(0, TITLE_LENGTH - HOUR)
+            for tick in range(HOUR // options['heartbeat']):
+                offset = phase + tick * options['heartbeat']
+                events.append((start + offset, user_id, movie_id, position + offset))
+        events.sort()
+        return events
+
+    def naive(self, heartbeats):
+        return sum(
+            progress.upsert([(user_id, movie_id, position, TITLE_LENGTH, now)])
+            for now, user_id, movie_id, position in heartbeats
+        )
+
+    def coalesced(self, heartbeats):
+        written = 0
+        for now, user_id, movie_id, position in heartbeats:
+            if progress.record(user_id, movie_id, position, TITLE_LENGTH, now=now):
+                written += progress.flush(now=now)
+        return written + progress.flush(now=heartbeats[-1][0] + 2 * settings.PROGRESS_FLUSH_SECONDS)
+
+    def measure(self, func, heartbeats, wal):
+        WatchProgress.objects.all().delete()
+        cache.clear()
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        counts = {'statements': 0}
+
+        def count(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith(WRITES):
+                counts['statements'] += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with connection.execute_wrapper(count):
+            counts['row_writes'] = func(heartbeats)
+        counts['seconds'] = time.perf_counter() - started
+        counts['wal'] = os.path.getsize(wal) if os.path.exists(wal) else 0
+        counts['rows'] = WatchProgress.objects.count()
+        return counts
+
+    def report(self, label, counts, viewers):
+        self.stdout.write(
+            f"{label:>9} per viewer-hour: {counts['row_writes'] / viewers:6.1f} row writes, "
+            f"{counts['statements'] / viewers:6.1f} write statements, {counts['wal'] / viewers / 1024:7.1f} KiB WAL "
+            f"| {counts['rows']} rows | {counts['seconds']:.2f}s"
+        )
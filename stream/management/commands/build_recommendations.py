@@ -0,0 +1,20 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stream.recommendations import rebuild
+
+
+class Command(BaseCommand):
+    help = "Recompute the similar-titles table shown on movie detail pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=settings.RECOMMENDATIONS_K, help="Neighbours per title.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = rebuild(options['k'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {count} neighbours in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stream.progress import flush
+
+
+class Command(BaseCommand):
+    help = "Upsert buffered player heartbeats into WatchProgress."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep flushing every interval instead of exiting.")
+        parser.add_argument('--interval', type=float, default=settings.PROGRESS_FLUSH_SECONDS,
+                            help="Seconds between flushes with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            written = flush()
+            if written or not options['loop']:
+                self.stdout.write(f"Wrote {written} watch position(s).")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from stream.caching import bump_catalog_version
+from stream.recommendations import rebuild as rebuild_recommendations
+from stream.search import get_backend as get_search_backend
+from stream.synthetic import CatalogGenerator
+
+
+class Command(BaseCommand):
+    help = "Bulk-insert a deterministic synthetic catalog, audience and subscriptions for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=10_000)
+        parser.add_argument('--genres', type=int, default=20)
+        parser.add_argument('--cast', type=int, help="Cast members (default: movies / 5).")
+        parser.add_argument('--cast-per-movie', type=int, default=4)
+        parser.add_argument('--users', type=int, default=1_000)
+        parser.add_argument('--list-size', type=int, default=12, help="Mean My List length per user.")
+        parser.add_argument('--subscribed', type=float, default=0.4, help="Fraction of users with a subscription.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--skip-index', action='store_true', help="Don't rebuild the search index afterwards.")
+        parser.add_argument(
+            '--skip-recommendations', action='store_true', help="Don't rebuild the similar-titles table afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        for name in ('movies', 'genres', 'cast_per_movie', 'batch_size'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be at least 1.")
+        for name in ('cast', 'users', 'list_size'):
+            if options[name] is not None and options[name] < 0:
+                raise CommandError(f"--{name.replace('_', '-')} cannot be negative.")
+        if not 0 <= options['subscribed'] <= 1:
+            raise CommandError("--subscribed must be between 0 and 1.")
+        started = time.perf_counter()
+
+        def log(message):
+            if options['verbosity']:
+                self.stdout.write(f'[{time.perf_counter() - started:7.1f}s] {message}')
+
+        generator = CatalogGenerator(seed=options['seed'], batch_size=options['batch_size'], log=log)
+        genre_ids = generator.genres(options['genres'])
+        cast_ids = generator.cast(options['cast'] if options['cast'] is not None else max(options['movies'] // 5, 1))
+        movie_range = generator.movies(
+            options['movies'], genre_ids, cast_ids, cast_per_movie=options['cast_per_movie'],
+        )
+        if options['users']:
+            generator.users(
+                options['users'], movie_range,
+                list_size=options['list_size'], subscribed=options['subscribed'],
+            )
+
+        if not options['skip_index']:
+            count = get_search_backend().rebuild()
+            log(f'search index: {count}')
+        if not options['skip_recommendations']:
+            count = rebuild_recommendations()
+            log(f'similar titles: {count}')
+        # Signals were bypassed, so cached shelves/pages must be invalidated by hand.
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s.'))
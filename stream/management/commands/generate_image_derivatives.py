@@ -0,0 +1,52 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stream.images import generate_derivatives
+from stream.models import Cast, Genre, Movie
+
+IMAGE_FIELDS = [(Movie, 'poster'), (Movie, 'image'), (Cast, 'image'), (Genre, 'image')]
+
+
+class Command(BaseCommand):
+    help = "Backfill responsive image variants for existing uploads and report byte savings."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Re-encode variants that already exist.")
+
+    def handle(self, *args, **options):
+        seen = set()
+        originals = 0
+        variant_bytes = defaultdict(int)
+        processed = missing = 0
+        for model, field_name in IMAGE_FIELDS:
+            queryset = model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+            for instance in queryset.only('pk', field_name).iterator():
+                fieldfile = getattr(instance, field_name)
+                # The same upload is often shared between fields and rows.
+                if fieldfile.name in seen:
+                    continue
+                seen.add(fieldfile.name)
+                try:
+                    variants = generate_derivatives(fieldfile, force=options['force'])
+                except (OSError, ValueError) as exc:
+                    self.stderr.write(f"  {fieldfile.name}: {exc}")
+                    continue
+                if not fieldfile.storage.exists(fieldfile.name):
+                    missing += 1
+                    continue
+                processed += 1
+                size = fieldfile.storage.size(fieldfile.name)
+                originals += size
+                by_width = dict(variants)
+                for width in settings.IMAGE_DERIVATIVE_WIDTHS:
+                    # Widths skipped to avoid upscaling are served the original.
+                    name = by_width.get(width)
+                    variant_bytes[width] += fieldfile.storage.size(name) if name else size
+
+        self.stdout.write(f"images={processed} missing={missing} originals={originals / 1024:.0f}KiB")
+        for width in settings.IMAGE_DERIVATIVE_WIDTHS:
+            total = variant_bytes[width]
+            saved = 1 - total / originals if originals else 0
+            self.stdout.write(f"  w{width}: {total / 1024:.0f}KiB ({saved:.1%} smaller than originals)")
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+from stream.models import Movie
+from stream.packaging import TranscodeError, package_movie
+
+
+class Command(BaseCommand):
+    help = "Package uploaded videos into HLS renditions, resuming unfinished or failed runs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('movie_ids', nargs='*', type=int, help="Only package these movies.")
+        parser.add_argument('--all', action='store_true', help="Re-check every movie with a video, including ready ones.")
+        parser.add_argument('--backend', help="Dotted path to a transcoder class, overriding PACKAGING_BACKEND.")
+
+    def handle(self, *args, **options):
+        movies = Movie.objects.exclude(video='').exclude(video__isnull=True)
+        if options['movie_ids']:
+            movies = movies.filter(pk__in=options['movie_ids'])
+        elif not options['all']:
+            movies = movies.exclude(packaging_status='ready')
+
+        transcoder = import_string(options['backend'])() if options['backend'] else None
+        failed = 0
+        for movie in movies.iterator():
+            self.stdout.write(f"Packaging {movie.pk} {movie.title} ({movie.packaging_progress}% done)")
+            try:
+                package_movie(movie, transcoder=transcoder)
+            except TranscodeError as exc:
+                failed += 1
+                self.stderr.write(f"  failed: {exc}")
+        if failed:
+            raise CommandError(f"{failed} movie(s) failed to package.")
+        self.stdout.write(self.style.SUCCESS("Done."))
@@ -0,0 +1,24 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stream.payment_events import process_pending
+
+
+class Command(BaseCommand):
+    help = "Apply pending payment webhook events to subscriptions, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.PAYMENT_EVENTS_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Keep polling for new events instead of exiting.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            consumed = process_pending(options['batch_size'])
+            if consumed or not options['loop']:
+                self.stdout.write(f"Applied {consumed} payment event(s).")
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from stream.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the movie search index from the catalog tables."
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        count = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} movies with {type(backend).__name__}."))
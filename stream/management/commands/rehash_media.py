@@ -0,0 +1,100 @@
+import posixpath
+
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from stream.caching import bump_catalog_version
+from stream.images import is_derivative
+from stream.media import content_digest, content_name, image_storage, is_content_addressed
+
+from .generate_image_derivatives import IMAGE_FIELDS
+
+
+class Command(BaseCommand):
+    help = (
+        "Move uploaded images to content-addressed names (stream/media.py), point every row at them, "
+        "delete the old files and their variants, and report the disk space saved by deduplication."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would change.")
+        parser.add_argument('--keep-originals', action='store_true', help="Leave the old files in place.")
+
+    def handle(self, *args, **options):
+        storage = image_storage()
+        renames, missing = self.plan(storage)
+        if not renames:
+            self.stdout.write(f"Nothing to rehash ({len(missing)} missing).")
+            return
+
+        # Bytes under the old names, and those newly stored once per content.
+        before = after = 0
+        sources = {}
+        for old, new in renames.items():
+            size = storage.size(old)
+            before += size
+            if new not in sources:
+                sources[new] = old
+                if not storage.exists(new):
+                    after += size
+        variants = {old: self.variants(storage, old) for old in renames}
+        variant_bytes = sum(storage.size(name) for names in variants.values() for name in names)
+
+        if not options['dry_run']:
+            for new, old in sources.items():
+                if not storage.exists(new):
+                    with storage.open(old, 'rb') as fh:
+                        if storage.save(old, File(fh, old)) != new:
+                            raise CommandError(f"{old} changed while being rehashed.")
+            with transaction.atomic():
+                for model, field_name in IMAGE_FIELDS:
+                    for old, new in renames.items():
+                        model.objects.filter(**{field_name: old}).update(**{field_name: new})
+                # Cached shelves and pages hold the old URLs.
+                transaction.on_commit(bump_catalog_version)
+            if not options['keep_originals']:
+                for old in renames:
+                    for name in [old, *variants[old]]:
+                        storage.delete(name)
+
+        prefix = "Would rehash" if options['dry_run'] else "Rehashed"
+        saved = before - after
+        self.stdout.write(
+            f"{prefix} {len(renames)} files ({before / 1024:.0f}KiB) into {len(sources)} content-addressed "
+            f"files ({after / 1024:.0f}KiB): {saved / 1024:.0f}KiB saved "
+            f"({saved / before if before else 0:.1%}) | missing={len(missing)}"
+        )
+        if variant_bytes and not options['keep_originals']:
+            self.stdout.write(
+                f"{sum(map(len, variants.values()))} variants of the old names ({variant_bytes / 1024:.0f}KiB) "
+                f"{'would be ' if options['dry_run'] else ''}removed; `manage.py generate_image_derivatives` "
+                f"rebuilds them once per distinct image."
+            )
+
+    def plan(self, storage):
+        """``({old name: content-addressed name}, {missing names})``."""
+        renames, missing = {}, set()
+        for model, field_name in IMAGE_FIELDS:
+            names = (
+                model.objects.exclude(**{field_name: ''}).exclude(**{f'{field_name}__isnull': True})
+                .values_list(field_name, flat=True).distinct()
+            )
+            for name in names:
+                if name in renames or name in missing or is_content_addressed(name):
+                    continue
+                if not storage.exists(name):
+                    missing.add(name)
+                    continue
+                with storage.open(name, 'rb') as fh:
+                    renames[name] = content_name(content_digest(File(fh, name)), name)
+        return renames, missing
+
+    def variants(self, storage, name):
+        directory, filename = posixpath.split(name)
+        root = posixpath.splitext(filename)[0]
+        _, files = storage.listdir(directory)
+        return [
+            posixpath.join(directory, other) for other in files
+            if is_derivative(other) and posixpath.splitext(posixpath.splitext(other)[0])[0] == root
+        ]
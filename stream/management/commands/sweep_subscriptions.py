@@ -0,0 +1,27 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from stream.expiry import sweep
+
+
+class Command(BaseCommand):
+    help = "Deactivate expired subscriptions and their profiles' subscribed flag, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.SUBSCRIPTION_SWEEP_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help="Keep sweeping every interval instead of exiting.")
+        parser.add_argument('--interval', type=float, default=60.0, help="Seconds between sweeps with --loop.")
+
+    def handle(self, *args, **options):
+        while True:
+            counts = sweep(batch_size=options['batch_size'])
+            if counts['subscriptions'] or not options['loop']:
+                self.stdout.write(
+                    f"Deactivated {counts['subscriptions']} subscription(s) and {counts['profiles']} "
+                    f"profile(s) in {counts['batches']} batch(es)."
+                )
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,140 @@
+"""Content-addressed storage for uploaded images.
+
+The image fields of Movie, Cast and Genre use the ``images`` storage
+(settings.STORAGES), which names every file after its content::
+
+    content/3f/3fa2c4...e91b.png
+
+so the same screenshot uploaded as a poster and as a genre image is stored
+once, and a name never points at different bytes. That makes the URLs safe
+to cache forever: ``ImmutableMediaMiddleware`` serves them with
+``Cache-Control: public, max-age=31536000, immutable``; a front-end server
+serving MEDIA_ROOT itself should do the same for ``content/``.
+
+The ``upload_to`` directories of the fields no longer matter. Responsive
+variants (stream/images.py) keep their names derived from the original's,
+next to it. Those names do not cover the encoder settings, and
+``generate_image_derivatives --force`` rewrites them in place, so variants
+are only cached for DERIVATIVE_MAX_AGE and then revalidated. Uploads stored
+before this are moved over, and duplicates dropped, by
+``manage.py rehash_media``.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, storages
+from django.http import HttpResponseNotFound
+from django.utils.cache import patch_cache_control
+
+from .images import is_derivative
+from .streaming import serve_file
+
+CONTENT_PREFIX = 'content/'
+DIGEST_LENGTH = 32  # Hex characters: 128 bits.
+IMMUTABLE_MAX_AGE = 60 * 60 * 24 * 365
+DERIVATIVE_MAX_AGE = 60 * 60
+
+
+def content_digest(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()[:DIGEST_LENGTH]
+
+
+def content_name(digest, original_name):
+    extension = os.path.splitext(original_name)[1].lower()
+    return f'{CONTENT_PREFIX}{digest[:2]}/{digest}{extension}'
+
+
+def is_content_addressed(name):
+    return bool(name) and name.startswith(CONTENT_PREFIX)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """A FileSystemStorage that saves each file under the hash of its bytes
+    and keeps one copy of identical files."""
+
+    def save(self, name, content, max_length=None):
+        if is_content_addressed(name) and is_derivative(name):
+            return super().save(name, content, max_length)
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = content_name(content_digest(content), name)
+        if not self.exists(name):
+            self._save(name, content)
+        return name
+
+    def _save(self, name, content):
+        if not is_content_addressed(name) or is_derivative(name):
+            return super()._save(name, content)
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Written aside and renamed, so concurrent uploads of the same bytes
+        # never expose a partial file under the final name.
+        fd, temporary = tempfile.mkstemp(dir=directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                for chunk in content.chunks():
+                    fh.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            os.replace(temporary, path)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.unlink(temporary)
+            raise
+        return name
+
+
+def image_storage():
+    """The storage of the models' image fields; a callable so migrations
+    refer to it, not to the storage configured when they were made."""
+    return storages['images']
+
+
+class ImmutableMediaMiddleware:
+    """Serve content-addressed media with a year-long immutable Cache-Control,
+    and their variants with a short one."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.prefix = settings.MEDIA_URL + CONTENT_PREFIX
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not request.path.startswith(self.prefix):
+            return self.get_response(request)
+        return self.serve(request)
+
+    async def __acall__(self, request):
+        if not request.path.startswith(self.prefix):
+            return await self.get_response(request)
+        return await sync_to_async(self.serve)(request)
+
+    def serve(self, request):
+        name = posixpath.normpath(request.path[len(settings.MEDIA_URL):])
+        if not is_content_addressed(name) or '/.' in name:
+            return HttpResponseNotFound("Unknown media file.")
+        path = os.path.join(settings.MEDIA_ROOT, *name.split('/'))
+        if not os.path.isfile(path):
+            return HttpResponseNotFound("Unknown media file.")
+        response = serve_file(request, path)
+        if is_derivative(name):
+            patch_cache_control(response, public=True, max_age=DERIVATIVE_MAX_AGE)
+        else:
+            patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+        return response
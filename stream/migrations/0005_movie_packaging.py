@@ -0,0 +1,28 @@
+# Packaging state on Movie, kept up to date by stream/packaging.py.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stream', '0004_subscription'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='packaging_error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='packaging_progress',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Percent of HLS segments written'),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='packaging_status',
+            field=models.CharField(choices=[('none', 'Not packaged'), ('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', max_length=20),
+        ),
+    ]
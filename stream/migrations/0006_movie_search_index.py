@@ -0,0 +1,36 @@
+# Hand-written: creates the FTS5 table behind the SQLite search backend
+# (stream/search.py). Other databases skip it.
+
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS stream_movie_fts USING fts5("
+        "title, director, cast_names, genre, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    schema_editor.execute(
+        "INSERT INTO stream_movie_fts (rowid, title, director, cast_names, genre) "
+        "SELECT m.id, m.title, COALESCE(m.director, ''), "
+        "COALESCE((SELECT group_concat(c.real_name, ' ') FROM stream_moviecast mc "
+        "JOIN stream_cast c ON c.id = mc.cast_id WHERE mc.movie_id = m.id), ''), g.name "
+        "FROM stream_movie m JOIN stream_genre g ON g.id = m.genre_id"
+    )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS stream_movie_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stream', '0005_movie_packaging'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
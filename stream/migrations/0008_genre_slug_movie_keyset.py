@@ -0,0 +1,50 @@
+# Adds a unique Genre.slug, filled in for existing genres by fill_genre_slugs
+# (clashing names get -2, -3, ...), and the (category, rating, id) indexes
+# used by keyset pagination. Unapplying it simply drops the slugs.
+
+from django.db import migrations, models
+from django.utils.text import slugify
+
+
+def fill_genre_slugs(apps, schema_editor):
+    Genre = apps.get_model('stream', 'Genre')
+    seen = set()
+    genres = list(Genre.objects.order_by('id'))
+    for genre in genres:
+        base = slugify(genre.name)[:100] or 'genre'
+        slug, n = base, 2
+        while slug in seen:
+            slug, n = f'{base}-{n}', n + 1
+        seen.add(slug)
+        genre.slug = slug
+    Genre.objects.bulk_update(genres, ['slug'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stream', '0007_payment_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='genre',
+            name='slug',
+            field=models.SlugField(blank=True, default='', max_length=120),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_genre_slugs, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='genre',
+            name='slug',
+            field=models.SlugField(blank=True, max_length=120, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['category', 'rating', 'id'], name='stream_movie_cat_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['genre', 'category', 'rating', 'id'], name='stream_movie_genre_cat_rating'),
+        ),
+    ]
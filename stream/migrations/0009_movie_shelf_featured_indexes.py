@@ -0,0 +1,22 @@
+# Indexes for the per-genre shelves, (genre, rating, id), and the partial
+# index on featured titles used by the home page lookup.
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stream', '0008_genre_slug_movie_keyset'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(fields=['genre', 'rating', 'id'], name='stream_movie_genre_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='movie',
+            index=models.Index(condition=models.Q(('is_featured', True)), fields=['id'], name='stream_movie_featured'),
+        ),
+    ]
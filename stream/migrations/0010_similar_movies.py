@@ -0,0 +1,28 @@
+# The precomputed neighbour table read by movie_detail, filled by
+# stream/recommendations.py.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stream', '0009_movie_shelf_featured_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarMovie',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('movie', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='similar_titles', to='stream.movie')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='stream.movie')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('movie', 'rank'), name='stream_similarmovie_movie_rank')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Per-user playback positions, flushed from player heartbeats by
+# stream/progress.py. The partial index serves the resume shelf.
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stream', '0010_similar_movies'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WatchProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.FloatField(help_text='Seconds')),
+                ('duration', models.FloatField(blank=True, help_text='Seconds, as reported by the player', null=True)),
+                ('completed', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='stream.movie')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='watch_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('completed', False)), fields=['user', '-updated_at'], name='stream_watchprogress_resume')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'movie'), name='stream_watchprogress_user_movie')],
+            },
+        ),
+    ]
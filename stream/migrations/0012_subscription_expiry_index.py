@@ -0,0 +1,20 @@
+# Partial index on the expiry date of active subscriptions, scanned by the
+# sweep in stream/expiry.py.
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stream', '0011_watch_progress'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscription',
+            index=models.Index(condition=models.Q(('active', True)), fields=['expiry_date'], name='stream_subscription_expiry'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Points the image fields at the content-addressed images storage
+# (stream/media.py). Only the storage changes, so no rows are touched: files
+# already uploaded are moved by `manage.py rehash_media`, not here.
+
+import stream.media
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stream', '0012_subscription_expiry_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cast',
+            name='image',
+            field=models.ImageField(storage=stream.media.image_storage, upload_to='cast/'),
+        ),
+        migrations.AlterField(
+            model_name='genre',
+            name='image',
+            field=models.ImageField(storage=stream.media.image_storage, upload_to='genres/'),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='image',
+            field=models.ImageField(blank=True, null=True, storage=stream.media.image_storage, upload_to='genres/'),
+        ),
+        migrations.AlterField(
+            model_name='movie',
+            name='poster',
+            field=models.ImageField(storage=stream.media.image_storage, upload_to='posters/'),
+        ),
+    ]
@@ -2,10 +2,21 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.conf import settings
 from django.utils import timezone
+from django.utils.text import slugify
 import datetime
 
+from .media import image_storage
+
 # Create your models here.
 
+def unique_slug(model, value, exclude_pk=None):
+    base = slugify(value)[:100] or model._meta.model_name
+    slug, n = base, 2
+    while model.objects.filter(slug=slug).exclude(pk=exclude_pk).exists():
+        slug, n = f'{base}-{n}', n + 1
+    return slug
+
+
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     mobile = models.CharField(max_length=15, blank=True, null=True)
@@ -16,7 +27,7 @@ class Profile(models.Model):
 
 class Cast(models.Model):
     real_name = models.CharField(max_length=255)
-    image = models.ImageField(upload_to='cast/')
+    image = models.ImageField(storage=image_storage, upload_to='cast/')
 
     def __str__(self):
         return self.real_name
@@ -24,40 +35,122 @@ class Cast(models.Model):
 
 class Genre(models.Model):
     name = models.CharField(max_length=100)
-    image = models.ImageField(upload_to='genres/')
+    slug = models.SlugField(max_length=120, unique=True, blank=True)
+    image = models.ImageField(storage=image_storage, upload_to='genres/')
     icon_class = models.CharField(max_length=50, default='bx-film', help_text="Boxicon class name (e.g., bx-run)")
 
     def __str__(self):
         return self.name
+
+    def save(self, *args, **kwargs):
+        if not self.slug:
+            self.slug = unique_slug(Genre, self.name, exclude_pk=self.pk)
+        super().save(*args, **kwargs)
     
 class Movie(models.Model):
     CATEGORY_CHOICES = [
         ('movie', 'Movie'),
         ('tv', 'TV Show'),
     ]
+    PACKAGING_CHOICES = [
+        ('none', 'Not packaged'),
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
     title = models.CharField(max_length=255)
-    poster = models.ImageField(upload_to='posters/')
+    poster = models.ImageField(storage=image_storage, upload_to='posters/')
     video = models.FileField(upload_to='videos/', null=True, blank=True)
     genre = models.ForeignKey(Genre, on_delete=models.CASCADE)
     director = models.CharField(max_length=255, null=True, blank=True)
     year = models.IntegerField(null=True, blank=True)
     duration = models.CharField(max_length=50, null=True, blank=True)
-    image = models.ImageField(upload_to='genres/', null=True, blank=True)
+    image = models.ImageField(storage=image_storage, upload_to='genres/', null=True, blank=True)
     rating = models.FloatField(default=0.0)
     description = models.TextField(null=True, blank=True)
     cast_members = models.ManyToManyField(Cast, through='MovieCast')
     category = models.CharField(max_length=10, choices=CATEGORY_CHOICES, default='movie')
     is_featured = models.BooleanField(default=False)
+    packaging_status = models.CharField(max_length=20, choices=PACKAGING_CHOICES, default='none')
+    packaging_progress = models.PositiveSmallIntegerField(default=0, help_text="Percent of HLS segments written")
+    packaging_error = models.TextField(blank=True, default='')
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of category_list, optionally within a genre.
+            models.Index(fields=['category', 'rating', 'id'], name='stream_movie_cat_rating'),
+            models.Index(fields=['genre', 'category', 'rating', 'id'], name='stream_movie_genre_cat_rating'),
+            # Genre shelves on the movies page and genre_shelf.
+            models.Index(fields=['genre', 'rating', 'id'], name='stream_movie_genre_rating'),
+            # The home page hero; only a handful of rows are ever featured.
+            models.Index(fields=['id'], condition=models.Q(is_featured=True), name='stream_movie_featured'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @property
+    def has_hls(self):
+        return self.packaging_status == 'ready'
+
 class MovieCast(models.Model):
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
     cast = models.ForeignKey(Cast, on_delete=models.CASCADE)
     character_name = models.CharField(max_length=255, null=True, blank=True) 
     
 
+class SimilarMovie(models.Model):
+    """Precomputed neighbours of a title, written by stream/recommendations.py."""
+    # Indexed by the (movie, rank) constraint below.
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='similar_titles', db_index=False)
+    similar = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='similar_to')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            # Also the index movie_detail reads a title's neighbours in order from.
+            models.UniqueConstraint(fields=['movie', 'rank'], name='stream_similarmovie_movie_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.movie_id} -> {self.similar_id} (#{self.rank})"
+
+
+class WatchProgress(models.Model):
+    """Resume position per viewer and title, flushed from player heartbeats by
+    stream/progress.py; ``updated_at`` is the time of the last heartbeat."""
+    # Indexed by the (user, movie) constraint below.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='watch_progress', db_index=False)
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
+    position = models.FloatField(help_text="Seconds")
+    duration = models.FloatField(null=True, blank=True, help_text="Seconds, as reported by the player")
+    completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'movie'], name='stream_watchprogress_user_movie'),
+        ]
+        indexes = [
+            # The home page's "continue watching" shelf.
+            models.Index(
+                fields=['user', '-updated_at'], condition=models.Q(completed=False),
+                name='stream_watchprogress_resume',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.movie_id} @ {self.position:.0f}s"
+
+    @property
+    def percent(self):
+        if not self.duration:
+            return 0
+        return min(100, round(self.position * 100 / self.duration))
+
+
 class MyList(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
@@ -88,6 +181,54 @@ class Subscription(models.Model):
     def __str__(self):
         return f"{self.user.email} - {self.plan_name}"
 
+    class Meta:
+        indexes = [
+            # The expiry sweeper's scan (stream/expiry.py).
+            models.Index(fields=['expiry_date'], condition=models.Q(active=True), name='stream_subscription_expiry'),
+        ]
+
     @property
     def is_expired(self):
-        return timezone.now() > self.expiry_date
\ No newline at end of file
+        return timezone.now() > self.expiry_date
+
+class PaymentOrder(models.Model):
+    """A Razorpay order we created, so webhooks can be tied back to a user and plan."""
+    STATUS_CHOICES = [
+        ('created', 'Created'),
+        ('paid', 'Paid'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='payment_orders')
+    order_id = models.CharField(max_length=100, unique=True)
+    plan_name = models.CharField(max_length=20, choices=Subscription.PLAN_CHOICES)
+    amount = models.PositiveIntegerField(help_text='In paise')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='created')
+    payment_id = models.CharField(max_length=100, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.order_id} ({self.status})"
+
+
+class PaymentEvent(models.Model):
+    """Append-only log of gateway events; ``event_id`` makes replays no-ops."""
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=50)
+    order_id = models.CharField(max_length=100, blank=True, default='')
+    payment_id = models.CharField(max_length=100, blank=True, default='')
+    payload = models.JSONField(default=dict)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['id'], condition=models.Q(processed_at__isnull=True),
+                name='stream_paymentevent_pending',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event} {self.event_id}"
@@ -0,0 +1,83 @@
+"""Per-user My List membership, cached as a packed integer set.
+
+``movie_ids(user)`` answers "is this title in the user's list?" for every card
+on a page from one cache read. The set is stored as a sorted ``array('q')``
+byte string - 8 bytes per title - and dropped, once the transaction
+commits, whenever a row is saved or deleted (including cascades). The set
+is only ever read for display; writes decide from the database.
+"""
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .caching import record
+from .models import Movie, MyList
+
+CACHE_PREFIX = 'mylist:v1:'
+
+
+def pack(ids):
+    return array('q', sorted(ids)).tobytes()
+
+
+def unpack(data):
+    ids = array('q')
+    ids.frombytes(data)
+    return frozenset(ids)
+
+
+def load(user_id):
+    return frozenset(MyList.objects.filter(user_id=user_id).values_list('movie_id', flat=True))
+
+
+def movie_ids(user):
+    """Frozenset of the movie ids in ``user``'s list; empty for anonymous users."""
+    if not user.is_authenticated:
+        return frozenset()
+    # Memoised on the user object, which lives for one request.
+    ids = getattr(user, '_mylist_ids', None)
+    if ids is not None:
+        return ids
+    key = CACHE_PREFIX + str(user.pk)
+    data = cache.get(key)
+    record('mylist', data is not None)
+    if data is None:
+        ids = load(user.pk)
+        cache.set(key, pack(ids), settings.MYLIST_CACHE_TTL)
+    else:
+        ids = unpack(data)
+    user._mylist_ids = ids
+    return ids
+
+
+def invalidate(user_id):
+    cache.delete(CACHE_PREFIX + str(user_id))
+
+
+def forget(user):
+    """Drop the per-request copy after this request changed the list."""
+    user.__dict__.pop('_mylist_ids', None)
+    invalidate(user.pk)
+
+
+def bulk_update(user, add=(), remove=()):
+    """Add and remove titles in one transaction.
+
+    Returns ``(added, removed, unknown)``: ids now in the list, ids no longer
+    in it, and requested additions that are not movies.
+    """
+    add, remove = set(add), set(remove) - set(add)
+    with transaction.atomic():
+        known = set(Movie.objects.filter(id__in=add).values_list('id', flat=True)) if add else set()
+        if known:
+            MyList.objects.bulk_create(
+                [MyList(user_id=user.pk, movie_id=movie_id) for movie_id in known],
+                ignore_conflicts=True,
+            )
+        if remove:
+            MyList.objects.filter(user_id=user.pk, movie_id__in=remove).delete()
+        # bulk_create sends no post_save.
+        transaction.on_commit(lambda: forget(user))
+    return sorted(known), sorted(remove), sorted(add - known)
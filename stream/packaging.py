@@ -0,0 +1,193 @@
+import json
+import logging
+import math
+import os
+import shutil
+import subprocess
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+PLAYLIST_CONTENT_TYPE = 'application/vnd.apple.mpegurl'
+SEGMENT_CONTENT_TYPE = 'video/mp2t'
+# Segment URLs are not versioned: repackaging a re-upload rewrites the same
+# names, so clients keep them briefly and then revalidate (ETag/Last-Modified).
+SEGMENT_MAX_AGE = 60 * 10
+
+
+class TranscodeError(Exception):
+    pass
+
+
+class BaseTranscoder:
+    """Interface for packaging backends.
+
+    A backend only has to report the source duration and write one segment of
+    one rendition at a time; ``package_movie`` handles ordering, resuming and
+    playlists.
+    """
+
+    def probe_duration(self, source):
+        raise NotImplementedError
+
+    def write_segment(self, source, rendition, start, duration, dest):
+        raise NotImplementedError
+
+
+class FFmpegTranscoder(BaseTranscoder):
+    def __init__(self, ffmpeg='ffmpeg', ffprobe='ffprobe'):
+        self.ffmpeg = getattr(settings, 'FFMPEG_BINARY', ffmpeg)
+        self.ffprobe = getattr(settings, 'FFPROBE_BINARY', ffprobe)
+
+    def _run(self, args):
+        try:
+            return subprocess.run(args, check=True, capture_output=True, text=True).stdout
+        except (OSError, subprocess.CalledProcessError) as exc:
+            raise TranscodeError(getattr(exc, 'stderr', None) or str(exc)) from exc
+
+    def probe_duration(self, source):
+        output = self._run([
+            self.ffprobe, '-v', 'error', '-show_entries', 'format=duration',
+            '-of', 'json', source,
+        ])
+        return float(json.loads(output)['format']['duration'])
+
+    def write_segment(self, source, rendition, start, duration, dest):
+        self._run([
+            self.ffmpeg, '-y', '-v', 'error',
+            '-ss', f'{start:.3f}', '-t', f'{duration:.3f}', '-i', source,
+            '-vf', f"scale=-2:{rendition['height']}",
+            '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', f"{rendition['bitrate']}k",
+            '-c:a', 'aac', '-b:a', '128k',
+            '-output_ts_offset', f'{start:.3f}',
+            '-f', 'mpegts', dest,
+        ])
+
+
+class PassthroughTranscoder(BaseTranscoder):
+    """Splits the source bytes evenly without re-encoding. For tests and local dev."""
+
+    bytes_per_second = 1024 * 1024
+
+    def probe_duration(self, source):
+        return max(os.path.getsize(source) / self.bytes_per_second, 1.0)
+
+    def write_segment(self, source, rendition, start, duration, dest):
+        offset = int(start * self.bytes_per_second)
+        with open(source, 'rb') as src, open(dest, 'wb') as out:
+            src.seek(offset)
+            out.write(src.read(int(duration * self.bytes_per_second)))
+
+
+def get_transcoder():
+    return import_string(settings.PACKAGING_BACKEND)()
+
+
+def package_root(movie):
+    return os.path.join(settings.MEDIA_ROOT, 'hls', str(movie.pk))
+
+
+def segment_name(index):
+    return f'seg_{index:05d}.ts'
+
+
+def write_atomic(path, content):
+    tmp = path + '.part'
+    with open(tmp, 'w') as fh:
+        fh.write(content)
+    os.replace(tmp, path)
+
+
+def media_playlist(durations):
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        f'#EXT-X-TARGETDURATION:{math.ceil(max(durations))}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+    ]
+    for index, duration in enumerate(durations):
+        lines.append(f'#EXTINF:{duration:.3f},')
+        lines.append(segment_name(index))
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def master_playlist(renditions):
+    lines = ['#EXTM3U']
+    for rendition in renditions:
+        lines.append(
+            f"#EXT-X-STREAM-INF:BANDWIDTH={rendition['bitrate'] * 1000},"
+            f"RESOLUTION={rendition['width']}x{rendition['height']}"
+        )
+        lines.append(f"{rendition['name']}/index.m3u8")
+    return '\n'.join(lines) + '\n'
+
+
+def _set_status(movie, **fields):
+    # update() keeps packaging progress off the Movie post_save signals.
+    type(movie).objects.filter(pk=movie.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(movie, name, value)
+
+
+def package_movie(movie, transcoder=None):
+    """Split ``movie.video`` into HLS segments for every configured rendition.
+
+    Segments are written to a temporary name and renamed when complete, so an
+    interrupted run picks up at the first missing segment.
+    """
+    if not movie.video:
+        return
+    transcoder = transcoder or get_transcoder()
+    renditions = settings.PACKAGING_RENDITIONS
+    segment_seconds = settings.PACKAGING_SEGMENT_SECONDS
+    root = package_root(movie)
+    source = movie.video.path
+
+    _set_status(movie, packaging_status='processing', packaging_error='')
+    try:
+        total = transcoder.probe_duration(source)
+        count = max(math.ceil(total / segment_seconds), 1)
+        durations = [min(segment_seconds, total - i * segment_seconds) for i in range(count)]
+        done = 0
+        for rendition in renditions:
+            directory = os.path.join(root, rendition['name'])
+            os.makedirs(directory, exist_ok=True)
+            for index, duration in enumerate(durations):
+                dest = os.path.join(directory, segment_name(index))
+                if not os.path.exists(dest):
+                    tmp = dest + '.part'
+                    transcoder.write_segment(source, rendition, index * segment_seconds, duration, tmp)
+                    os.replace(tmp, dest)
+                done += 1
+                progress = done * 100 // (count * len(renditions))
+                if progress != movie.packaging_progress:
+                    _set_status(movie, packaging_progress=progress)
+            write_atomic(os.path.join(directory, 'index.m3u8'), media_playlist(durations))
+        write_atomic(os.path.join(root, 'master.m3u8'), master_playlist(renditions))
+    except Exception as exc:
+        _set_status(movie, packaging_status='failed', packaging_error=str(exc)[:2000])
+        raise
+    _set_status(movie, packaging_status='ready', packaging_progress=100)
+
+
+def clear_package(movie):
+    shutil.rmtree(package_root(movie), ignore_errors=True)
+
+
+def package_in_background(movie):
+    def run():
+        from django.db import close_old_connections
+        try:
+            package_movie(movie)
+        except Exception:
+            # Recorded on the row; `manage.py package_videos` resumes it.
+            logger.exception("Packaging movie %s failed", movie.pk)
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=run, daemon=True).start()
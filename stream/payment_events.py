@@ -0,0 +1,171 @@
+"""Webhook-driven payment confirmation.
+
+Gateway webhooks and signed checkout redirects are only recorded here, one
+``PaymentEvent`` row each; a duplicate ``event_id`` is silently dropped, so
+replayed or retried deliveries cost a single no-op INSERT. A consumer then
+applies pending events in batches - subscriptions, profiles and order
+statuses for a whole batch in a handful of queries - either in a background
+thread right after events arrive (PAYMENT_EVENTS_INLINE) or from
+``manage.py process_payment_events``.
+"""
+import datetime
+import hashlib
+import hmac
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from . import entitlements
+from .models import PaymentEvent, PaymentOrder, Profile, Subscription
+
+logger = logging.getLogger(__name__)
+
+# Order status each handled event type leads to; everything else is logged only.
+EVENT_STATUS = {
+    'payment.captured': 'paid',
+    'order.paid': 'paid',
+    'checkout.completed': 'paid',
+    'payment.failed': 'failed',
+}
+BILLING_DAYS = {'pro': 365}
+DEFAULT_BILLING_DAYS = 30
+
+
+def webhook_signature_valid(body, signature):
+    secret = settings.RAZORPAY_WEBHOOK_SECRET
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def parse_webhook(body, event_id=None):
+    """An unsaved ``PaymentEvent`` for a raw Razorpay webhook body."""
+    data = json.loads(body)
+    payment = data.get('payload', {}).get('payment', {}).get('entity', {})
+    order = data.get('payload', {}).get('order', {}).get('entity', {})
+    event = data.get('event', '')
+    payment_id = payment.get('id', '')
+    return PaymentEvent(
+        # Razorpay sends X-Razorpay-Event-Id; without it the same event for
+        # the same payment is still only recorded once.
+        event_id=event_id or f'{event}:{payment_id or order.get("id", "")}',
+        event=event,
+        order_id=payment.get('order_id') or order.get('id', ''),
+        payment_id=payment_id,
+        payload=data,
+    )
+
+
+def checkout_event(order_id, payment_id):
+    """Event for a signature-verified Checkout redirect."""
+    return PaymentEvent(
+        event_id=f'checkout:{payment_id}', event='checkout.completed',
+        order_id=order_id, payment_id=payment_id,
+    )
+
+
+def record(event):
+    """Append ``event`` unless its ``event_id`` is already there; one query."""
+    PaymentEvent.objects.bulk_create([event], ignore_conflicts=True)
+    if settings.PAYMENT_EVENTS_INLINE:
+        transaction.on_commit(consume_in_background)
+
+
+def billing_days(plan_name):
+    return BILLING_DAYS.get(plan_name, DEFAULT_BILLING_DAYS)
+
+
+def apply_batch(batch_size=None):
+    """Apply up to ``batch_size`` pending events; returns how many were consumed."""
+    batch_size = batch_size or settings.PAYMENT_EVENTS_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            PaymentEvent.objects.filter(processed_at__isnull=True)
+            .select_for_update(skip_locked=True)
+            .only('id', 'event', 'order_id', 'payment_id')
+            .order_by('id')[:batch_size]
+        )
+        if not events:
+            return 0
+
+        # Final outcome per order within this batch; a capture beats a failure.
+        outcomes = {}
+        for event in events:
+            status = EVENT_STATUS.get(event.event)
+            if status and event.order_id and outcomes.get(event.order_id, ('',))[0] != 'paid':
+                outcomes[event.order_id] = (status, event.payment_id)
+
+        orders = list(PaymentOrder.objects.filter(order_id__in=outcomes).exclude(status='paid'))
+        subscriptions = {}
+        for order in orders:
+            order.status, order.payment_id = outcomes[order.order_id]
+            if order.status == 'paid':
+                order.paid_at = now
+                subscriptions[order.user_id] = Subscription(
+                    user_id=order.user_id, plan_name=order.plan_name,
+                    order_id=order.order_id, payment_id=order.payment_id, active=True,
+                    expiry_date=now + datetime.timedelta(days=billing_days(order.plan_name)),
+                )
+
+        if orders:
+            PaymentOrder.objects.bulk_update(orders, ['status', 'payment_id', 'paid_at'])
+        if subscriptions:
+            Subscription.objects.bulk_create(
+                subscriptions.values(), update_conflicts=True, unique_fields=['user'],
+                update_fields=['plan_name', 'order_id', 'payment_id', 'active', 'expiry_date'],
+            )
+            Profile.objects.filter(user_id__in=subscriptions).update(is_subscribed=True)
+            # bulk_create sends no post_save, so drop cached entitlements here.
+            transaction.on_commit(lambda: [entitlements.invalidate(user_id) for user_id in subscriptions])
+        PaymentEvent.objects.filter(pk__in=[event.pk for event in events]).update(processed_at=now)
+    return len(events)
+
+
+def process_pending(batch_size=None):
+    """Drain the queue; returns the number of events consumed."""
+    total = 0
+    while consumed := apply_batch(batch_size):
+        total += consumed
+    return total
+
+
+_lock = threading.Lock()
+_wanted = False
+_running = False
+
+
+def consume_in_background():
+    """Start (or re-arm) a single background thread that drains the queue."""
+    global _wanted, _running
+    with _lock:
+        _wanted = True
+        if _running:
+            return
+        _running = True
+
+    def run():
+        global _wanted, _running
+        try:
+            while True:
+                with _lock:
+                    if not _wanted:
+                        _running = False
+                        return
+                    _wanted = False
+                try:
+                    process_pending()
+                except Exception:
+                    # Events stay pending; the next delivery or the command retries them.
+                    logger.exception("Processing pending payment events failed")
+        finally:
+            with _lock:
+                _running = False
+            close_old_connections()
+
+    threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,249 @@
+"""Shared Razorpay gateway client.
+
+One ``razorpay.Client`` per process, backed by a pooled ``requests`` session
+with connect/read timeouts, so views reuse TLS connections instead of opening
+a new one per call and a slow gateway cannot hold a worker indefinitely.
+
+Calls go through a circuit breaker: after RAZORPAY_BREAKER_THRESHOLD
+consecutive failures every call fails fast with ``GatewayUnavailable`` for
+RAZORPAY_BREAKER_COOLDOWN seconds, then a single trial call decides whether
+it closes again. Only idempotent calls (fetches) are retried, with
+exponential backoff; creating an order is never repeated automatically.
+Latencies are kept in per-operation histograms, see ``latency_histograms()``.
+"""
+import bisect
+import random
+import threading
+import time
+
+import razorpay
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from .caching import increment
+
+# Upper bounds in milliseconds; the last bucket is +Inf.
+LATENCY_BUCKETS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class GatewayError(Exception):
+    """The payment gateway could not complete the call."""
+
+
+class GatewayUnavailable(GatewayError):
+    """The circuit is open; the gateway was not contacted."""
+
+
+class TimeoutSession(requests.Session):
+    """A session that applies a default ``(connect, read)`` timeout."""
+
+    def __init__(self, timeout, pool_size):
+        super().__init__()
+        self.timeout = timeout
+        # Retries are done by ``call()``, which knows what is idempotent.
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        response = super().request(method, url, **kwargs)
+        if response.status_code >= 500:
+            # razorpay.Client decodes every error body as JSON; a proxy's
+            # HTML error page would surface as a ValueError instead.
+            try:
+                response.json()
+            except ValueError:
+                raise razorpay.errors.ServerError(f'HTTP {response.status_code} with a non-JSON body') from None
+        return response
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        with self.lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.total += value
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'buckets': dict(zip([*self.buckets, '+Inf'], self.counts)),
+                'count': sum(self.counts),
+                'sum': round(self.total, 3),
+            }
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, threshold, cooldown, clock=time.monotonic):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at >= self.cooldown:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self):
+        """Whether a call may go out now; lets one trial through when half-open."""
+        with self.lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial_running or self.failures >= self.threshold:
+                self.opened_at = self.clock()
+            self.trial_running = False
+
+
+_lock = threading.Lock()
+_client = None
+_breaker = None
+_histograms = {}
+
+# Errors that say nothing about whether the gateway is healthy.
+CLIENT_ERRORS = (razorpay.errors.BadRequestError, razorpay.errors.SignatureVerificationError)
+# A body that does not decode is the gateway's (or its proxy's) fault too.
+TRANSIENT_ERRORS = (requests.ConnectionError, requests.Timeout, requests.JSONDecodeError, razorpay.errors.ServerError)
+
+
+def get_client():
+    global _client
+    with _lock:
+        if _client is None:
+            session = TimeoutSession(
+                (settings.RAZORPAY_CONNECT_TIMEOUT, settings.RAZORPAY_READ_TIMEOUT),
+                settings.RAZORPAY_POOL_SIZE,
+            )
+            _client = razorpay.Client(
+                session=session,
+                auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+                base_url=settings.RAZORPAY_BASE_URL,
+            )
+        return _client
+
+
+def get_breaker():
+    global _breaker
+    with _lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(settings.RAZORPAY_BREAKER_THRESHOLD, settings.RAZORPAY_BREAKER_COOLDOWN)
+        return _breaker
+
+
+def reset():
+    """Drop the client, breaker and histograms, e.g. after settings change."""
+    global _client, _breaker
+    with _lock:
+        if _client is not None:
+            _client.session.close()
+        _client = _breaker = None
+        _histograms.clear()
+
+
+def observe(operation, ms):
+    histogram = _histograms.get(operation)
+    if histogram is None:
+        with _lock:
+            histogram = _histograms.setdefault(operation, Histogram())
+    histogram.observe(ms)
+
+
+def latency_histograms():
+    return {operation: histogram.snapshot() for operation, histogram in list(_histograms.items())}
+
+
+def backoff(attempt):
+    delay = settings.RAZORPAY_RETRY_BACKOFF * (2 ** attempt)
+    return delay * random.uniform(0.5, 1.0)
+
+
+def call(operation, func, *args, idempotent=False, **kwargs):
+    """Run ``func(*args, **kwargs)`` against the gateway under the breaker."""
+    breaker = get_breaker()
+    attempts = 1 + (settings.RAZORPAY_RETRIES if idempotent else 0)
+    for attempt in range(attempts):
+        if not breaker.allow():
+            increment(f'gateway:{operation}:rejected')
+            raise GatewayUnavailable(f'{operation}: payment gateway circuit is open')
+        started = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except CLIENT_ERRORS:
+            breaker.success()
+            raise
+        except TRANSIENT_ERRORS as exc:
+            breaker.failure()
+            increment(f'gateway:{operation}:error')
+            if attempt + 1 == attempts:
+                raise GatewayError(f'{operation}: {exc}') from exc
+            time.sleep(backoff(attempt))
+        except Exception as exc:
+            # E.g. razorpay's GATEWAY_ERROR: not worth a retry, but it still
+            # has to settle the breaker, or a half-open trial never ends.
+            breaker.failure()
+            increment(f'gateway:{operation}:error')
+            raise GatewayError(f'{operation}: {exc}') from exc
+        else:
+            breaker.success()
+            return result
+        finally:
+            observe(operation, (time.perf_counter() - started) * 1000)
+
+
+def create_order(amount, receipt, currency='INR', **extra):
+    client = get_client()
+    data = dict(extra, amount=amount, currency=currency, receipt=receipt)
+    return call('order.create', client.order.create, data=data)
+
+
+def fetch_order(order_id):
+    client = get_client()
+    return call('order.fetch', client.order.fetch, order_id, idempotent=True)
+
+
+def fetch_payment(payment_id):
+    client = get_client()
+    return call('payment.fetch', client.payment.fetch, payment_id, idempotent=True)
+
+
+def verify_payment_signature(order_id, payment_id, signature):
+    """True if Razorpay signed ``order_id|payment_id``; checked locally, no request."""
+    try:
+        get_client().utility.verify_payment_signature({
+            'razorpay_order_id': order_id or '',
+            'razorpay_payment_id': payment_id or '',
+            'razorpay_signature': signature or '',
+        })
+    except razorpay.errors.SignatureVerificationError:
+        return False
+    return True
@@ -0,0 +1,304 @@
+"""Per-request profiling: Server-Timing, per-route histograms, slow-request log.
+
+``ProfilingMiddleware`` times every request into per-route histograms. A
+PROFILING_SAMPLE_RATE fraction of requests is also broken down:
+
+* SQL statements and their time, from an execute wrapper that signals.py
+  installs on every new database connection;
+* template rendering time, from the ``ProfiledTemplates`` backend;
+* cache hits and misses, as counted by ``caching.increment()``.
+
+Sampled requests of staff users, or every sampled request under DEBUG, get a
+``Server-Timing`` header; other clients never see how long SQL took. The
+ones slower than PROFILING_SLOW_MS are logged to the ``stream.profiling``
+logger together with their slowest statements.
+
+The breakdown lives in a context variable, so it follows the request into
+the threads that run ORM calls for async views. Histograms are kept per
+thread and only summed when ``/metrics`` (views.metrics) is scraped, so recording takes no
+lock. Like every other in-process counter, they are per worker process:
+Prometheus should scrape each worker, or run a single one per instance.
+"""
+import bisect
+import heapq
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds, as in the Prometheus client libraries.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOWEST_STATEMENTS = 5
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+HISTOGRAMS = {
+    'http_request_duration_seconds': "Time spent in the middleware stack and view, per route.",
+    'http_request_sql_seconds': "Time spent running SQL, per route (sampled requests).",
+    'http_request_template_seconds': "Time spent rendering templates, per route (sampled requests).",
+}
+COUNTERS = {
+    'http_requests_total': "Requests by route, method and status.",
+    'http_request_sql_queries_total': "SQL statements run, per route (sampled requests).",
+    'http_request_cache_hits_total': "Cache hits, per route (sampled requests).",
+    'http_request_cache_misses_total': "Cache misses, per route (sampled requests).",
+}
+
+_current = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    __slots__ = ('sql_count', 'sql_time', 'slowest', 'template_time', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_time = self.template_time = 0.0
+        self.slowest = []
+        self.cache_hits = self.cache_misses = 0
+
+    def add_sql(self, sql, elapsed):
+        self.sql_count += 1
+        self.sql_time += elapsed
+        entry = (elapsed, self.sql_count, sql)
+        if len(self.slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(self.slowest, entry)
+        else:
+            heapq.heappushpop(self.slowest, entry)
+
+    def server_timing(self, total):
+        return ', '.join((
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.sql_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits / {self.cache_misses} misses"',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+
+def sql_wrapper(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_sql(sql, time.perf_counter() - started)
+
+
+def count_cache(key):
+    """Tally a ``caching.increment()`` key ending in ``hit`` or ``miss``."""
+    profile = _current.get()
+    if profile is None:
+        return
+    if key.endswith('hit'):
+        profile.cache_hits += 1
+    elif key.endswith('miss'):
+        profile.cache_misses += 1
+
+
+class ProfiledTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+
+
+class ProfiledTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name))
+
+
+class Shard:
+    """One thread's metrics: ``{(name, labels): value}`` and
+    ``{(name, labels): [bucket counts..., +Inf count, sum]}``."""
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, amount=1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        series = self.histograms.get(key)
+        if series is None:
+            series = self.histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+        series[bisect.bisect_left(BUCKETS, value)] += 1
+        series[-1] += value
+
+
+_local = threading.local()
+_shards = []
+
+
+def shard():
+    current = getattr(_local, 'shard', None)
+    if current is None:
+        current = _local.shard = Shard()
+        _shards.append(current)
+    return current
+
+
+def reset():
+    for part in list(_shards):
+        part.counters.clear()
+        part.histograms.clear()
+
+
+def route_of(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else '<unmatched>'
+
+
+def is_staff(request):
+    """Whether the request's user, if the view loaded it, is staff; never
+    queries the database for it."""
+    user = getattr(request, '_cached_user', None) or getattr(request, '_acached_user', None)
+    return user is not None and user.is_staff
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+        started, profile, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            if token is not None:
+                _current.reset(token)
+        return self.finish(request, response, started, profile)
+
+    async def __acall__(self, request):
+        if not settings.PROFILING_ENABLED:
+            return await self.get_response(request)
+        started, profile, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if token is not None:
+                _current.reset(token)
+        return self.finish(request, response, started, profile)
+
+    def start(self):
+        profile = token = None
+        if random.random() < settings.PROFILING_SAMPLE_RATE:
+            profile = RequestProfile()
+            token = _current.set(profile)
+        return time.perf_counter(), profile, token
+
+    def finish(self, request, response, started, profile):
+        elapsed = time.perf_counter() - started
+        route = route_of(request)
+        metrics = shard()
+        metrics.observe('http_request_duration_seconds', (('route', route),), elapsed)
+        metrics.inc('http_requests_total', (
+            ('route', route), ('method', request.method), ('status', str(response.status_code)),
+        ))
+        if profile is None:
+            return response
+
+        labels = (('route', route),)
+        metrics.observe('http_request_sql_seconds', labels, profile.sql_time)
+        metrics.observe('http_request_template_seconds', labels, profile.template_time)
+        metrics.inc('http_request_sql_queries_total', labels, profile.sql_count)
+        metrics.inc('http_request_cache_hits_total', labels, profile.cache_hits)
+        metrics.inc('http_request_cache_misses_total', labels, profile.cache_misses)
+        if settings.DEBUG or is_staff(request):
+            response['Server-Timing'] = profile.server_timing(elapsed)
+        if elapsed * 1000 >= settings.PROFILING_SLOW_MS:
+            log_slow_request(request, route, elapsed, profile)
+        return response
+
+
+def log_slow_request(request, route, elapsed, profile):
+    statements = ''.join(
+        f'\n  {seconds * 1000:8.1f} ms  {sql[:1000]}'
+        for seconds, _, sql in sorted(profile.slowest, reverse=True)
+    )
+    logger.warning(
+        "Slow request %s %s (%s): %.1f ms, %d queries in %.1f ms, templates %.1f ms%s",
+        request.method, request.get_full_path(), route, elapsed * 1000,
+        profile.sql_count, profile.sql_time * 1000, profile.template_time * 1000, statements,
+    )
+
+
+def escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}' if labels else ''
+
+
+def exposition(events=None):
+    """All shards summed, in the Prometheus text format, followed by the
+    ``{event: count}`` mapping ``events`` (e.g. ``caching.cache_stats()``)."""
+    counters, histograms = {}, {}
+    for part in list(_shards):
+        for key, value in list(part.counters.items()):
+            counters[key] = counters.get(key, 0) + value
+        for key, series in list(part.histograms.items()):
+            total = histograms.setdefault(key, [0] * (len(BUCKETS) + 1) + [0.0])
+            for index, value in enumerate(series):
+                total[index] += value
+
+    lines = []
+    for name, help_text in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (series_name, labels), series in sorted(histograms.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ('+Inf',), series):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{name}_sum{format_labels(labels)} {series[-1]:.6f}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+    for name, help_text in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        lines += [
+            f'{name}{format_labels(labels)} {value}'
+            for (series_name, labels), value in sorted(counters.items()) if series_name == name
+        ]
+    if events is not None:
+        lines += ['# HELP app_events_total In-process event counters (cache hits, gateway errors...).',
+                  '# TYPE app_events_total counter']
+        lines += [f'app_events_total{format_labels((("event", event),))} {count}'
+                  for event, count in sorted(events.items())]
+    return '\n'.join(lines) + '\n'
+
@@ -0,0 +1,211 @@
+"""Watch progress from player heartbeats, coalesced in the cache.
+
+The player reports its position every PROGRESS_HEARTBEAT_SECONDS. A
+heartbeat only touches the cache: the position per (user, movie) overwrites
+the previous one - the last write wins - and the first heartbeat of a pair
+in each flush slot (PROGRESS_FLUSH_SECONDS of wall time) appends the pair to
+that slot's log. ``flush()`` turns every closed slot's log into batched
+upserts into WatchProgress, so a viewer costs one row write per flush
+interval instead of one per heartbeat.
+
+Slots are flushed one interval late, so heartbeats from a worker whose clock
+lags a little still land in an open slot. The log relies on ``cache.add()``
+and ``cache.incr()`` being atomic, as they are with the locmem and redis
+backends. Resume positions and the continue-watching shelf prefer the cached
+position, which is never older than the table.
+"""
+import datetime
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+
+from .models import Movie, WatchProgress
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'progress:v1:'
+FLUSHED_KEY = PREFIX + 'flushed'
+LOCK_KEY = PREFIX + 'flushing'
+# Titles watched this far count as finished and leave the shelf.
+COMPLETED_FRACTION = 0.95
+BATCH_SIZE = 500
+
+
+def slot_of(now):
+    return int(now // settings.PROGRESS_FLUSH_SECONDS)
+
+
+def value_key(user_id, movie_id):
+    return f'{PREFIX}{user_id}:{movie_id}'
+
+
+def is_completed(position, duration):
+    return bool(duration) and position >= duration * COMPLETED_FRACTION
+
+
+def movie_exists(movie_id):
+    """Whether ``movie_id`` is a title; known ones are remembered for a while
+    so a heartbeat normally costs no query."""
+    key = f'{PREFIX}movie:{movie_id}'
+    if cache.get(key):
+        return True
+    exists = Movie.objects.filter(pk=movie_id).exists()
+    if exists:
+        cache.set(key, True, settings.PROGRESS_CACHE_TTL)
+    return exists
+
+
+def record(user_id, movie_id, position, duration=None, now=None):
+    """Buffer one heartbeat; returns True if it opened a new flush slot."""
+    now = time.time() if now is None else now
+    ttl = settings.PROGRESS_CACHE_TTL
+    cache.set(value_key(user_id, movie_id), (position, duration, now), ttl)
+    slot = slot_of(now)
+    # Only needed while the slot is open; the log entry below outlives it.
+    if not cache.add(f'{PREFIX}seen:{slot}:{user_id}:{movie_id}', 1, 3 * settings.PROGRESS_FLUSH_SECONDS):
+        return False
+    log = f'{PREFIX}log:{slot}'
+    opened = cache.add(log, 0, ttl)
+    try:
+        index = cache.incr(log)
+    except ValueError:
+        # Evicted since the add() above: start the log again.
+        if cache.add(log, 1, ttl):
+            opened, index = True, 1
+        else:
+            index = cache.incr(log)
+    cache.set(f'{log}:{index}', (user_id, movie_id), ttl)
+    return opened
+
+
+def chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def upsert(rows):
+    """Write ``(user_id, movie_id, position, duration, timestamp)`` rows;
+    rows for deleted users or titles are dropped."""
+    written = 0
+    for batch in chunks(rows):
+        with transaction.atomic():
+            movies = set(Movie.objects.filter(id__in={row[1] for row in batch}).values_list('id', flat=True))
+            users = set(User.objects.filter(id__in={row[0] for row in batch}).values_list('id', flat=True))
+            objects = [
+                WatchProgress(
+                    user_id=user_id, movie_id=movie_id, position=position, duration=duration,
+                    completed=is_completed(position, duration),
+                    updated_at=datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc),
+                )
+                for user_id, movie_id, position, duration, timestamp in batch
+                if movie_id in movies and user_id in users
+            ]
+            WatchProgress.objects.bulk_create(
+                objects, update_conflicts=True, unique_fields=['user', 'movie'],
+                update_fields=['position', 'duration', 'completed', 'updated_at'],
+            )
+        written += len(objects)
+    return written
+
+
+def flush_slot(slot):
+    log = f'{PREFIX}log:{slot}'
+    count = cache.get(log) or 0
+    entry_keys = [f'{log}:{index}' for index in range(1, count + 1)]
+    rows = []
+    for keys in chunks(entry_keys):
+        pairs = set(cache.get_many(keys).values())
+        values = cache.get_many([value_key(*pair) for pair in pairs])
+        rows.extend(
+            (user_id, movie_id, *values[value_key(user_id, movie_id)])
+            for user_id, movie_id in pairs if value_key(user_id, movie_id) in values
+        )
+    written = upsert(rows)
+    cache.delete_many(entry_keys + [log])
+    return written
+
+
+def flush(now=None):
+    """Upsert every closed slot not flushed yet; returns the rows written.
+
+    Only one worker flushes at a time; the others return 0 straight away.
+    """
+    now = time.time() if now is None else now
+    if not cache.add(LOCK_KEY, 1, settings.PROGRESS_FLUSH_SECONDS):
+        return 0
+    try:
+        last_closed = slot_of(now) - 2
+        # After a cache restart, go back as far as buffered positions live.
+        oldest = last_closed - settings.PROGRESS_CACHE_TTL // settings.PROGRESS_FLUSH_SECONDS
+        flushed = cache.get(FLUSHED_KEY)
+        first = oldest if flushed is None else max(oldest, flushed + 1)
+        written = 0
+        for slot in range(first, last_closed + 1):
+            written += flush_slot(slot)
+            cache.set(FLUSHED_KEY, slot, None)
+        return written
+    finally:
+        cache.delete(LOCK_KEY)
+
+
+def latest(user_id, rows):
+    """Overlay buffered positions on WatchProgress ``rows`` of one user."""
+    buffered = cache.get_many([value_key(user_id, row.movie_id) for row in rows])
+    for row in rows:
+        value = buffered.get(value_key(user_id, row.movie_id))
+        if value is not None:
+            row.position, row.duration, _ = value
+    return rows
+
+
+def resume_position(user, movie_id):
+    """Seconds to resume ``movie_id`` from; 0 when unwatched or finished."""
+    value = cache.get(value_key(user.pk, movie_id))
+    if value is None:
+        value = WatchProgress.objects.filter(user=user, movie_id=movie_id).values_list('position', 'duration').first()
+    if value is None:
+        return 0
+    position, duration = value[:2]
+    return 0 if is_completed(position, duration) else position
+
+
+def continue_watching(user, limit):
+    """Unfinished titles, most recently watched first, with ``percent`` set."""
+    rows = list(
+        WatchProgress.objects.filter(user=user, completed=False)
+        .select_related('movie').order_by('-updated_at')[:limit]
+    )
+    return [row for row in latest(user.pk, rows) if not is_completed(row.position, row.duration)]
+
+
+_lock = threading.Lock()
+_running = False
+
+
+def flush_in_background():
+    """Flush from a background thread unless one is already running."""
+    global _running
+    with _lock:
+        if _running:
+            return
+        _running = True
+
+    def run():
+        global _running
+        try:
+            flush()
+        except Exception:
+            # Positions stay buffered; the next slot or the command retries them.
+            logger.exception("Flushing watch progress failed")
+        finally:
+            with _lock:
+                _running = False
+            close_old_connections()
+
+    threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,90 @@
+"""Query-plan audit: ``EXPLAIN QUERY PLAN`` every statement a request ran.
+
+SQLite reports a walk over a whole table as ``SCAN <table>`` and an extra
+sort or grouping pass as ``USE TEMP B-TREE``; both are flagged, except:
+
+* a ``SCAN`` of a statement with a LIMIT and no WHERE - an ordered walk
+  that stops after LIMIT rows, e.g. the first keyset page;
+* ``SCAN``/``SEARCH`` of virtual tables (FTS5 lookups) and of subqueries;
+* a ``SCAN ... USING INDEX`` of a partial index, which only holds the rows
+  its condition selects;
+* temp B-trees that sort a CO-ROUTINE's output, i.e. an already bounded
+  derived result such as the per-genre window in the shelf prefetch;
+* tables and views listed below, with the reason they are exempt: only
+  the scans of an allowed table, and temp B-trees of a statement that only
+  scans allowed tables, are skipped; a scan of another table joined to one
+  is still flagged.
+
+Statements come from ``CaptureQueriesContext``, whose SQL already has the
+parameters quoted in.
+"""
+import re
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+ALLOWED_TABLES = {
+    'stream_genre': "a few dozen rows, always listed in full",
+    'stream_movie_fts': "bm25 ranking has to sort the matches",
+}
+ALLOWED_VIEWS = {
+    'get_suggestions': "a cold cache rebuilds the suggestion index from the whole catalog",
+}
+
+EXPLAINABLE = re.compile(r'^\s*(SELECT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+ACCESS = re.compile(r'^(SCAN|SEARCH) (?:TABLE )?(\w+)(?: USING (?:COVERING )?INDEX (\w+))?')
+
+
+def explain(sql):
+    """``EXPLAIN QUERY PLAN`` detail lines for one statement."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def partial_indexes():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND sql LIKE '% WHERE %'")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def problems(sql, plan, tables, partial=frozenset()):
+    """Plan lines that suggest a missing index.
+
+    ``tables`` are the real table names, ``partial`` the partial index names.
+    """
+    bounded_walk = ' LIMIT ' in sql and ' WHERE ' not in sql
+    derived = any(detail.startswith('CO-ROUTINE') for detail in plan)
+    accesses = [(ACCESS.match(detail), detail) for detail in plan]
+    scanned = {match.group(2) for match, _ in accesses if match and match.group(1) == 'SCAN'}
+    allowed_sort = bool(scanned) and scanned <= ALLOWED_TABLES.keys()
+    found = []
+    for match, detail in accesses:
+        if match:
+            if (match.group(1) == 'SCAN' and match.group(2) in tables and match.group(2) not in ALLOWED_TABLES
+                    and match.group(3) not in partial and 'VIRTUAL TABLE' not in detail and not bounded_walk):
+                found.append(detail)
+        elif 'TEMP B-TREE' in detail and not (derived or allowed_sort):
+            found.append(detail)
+    return found
+
+
+def audit_queries(queries):
+    """``[(sql, plan, problems), ...]`` for each explainable captured query."""
+    tables = set(connection.introspection.table_names())
+    partial = partial_indexes()
+    results = []
+    for query in queries:
+        sql = query['sql']
+        if not EXPLAINABLE.match(sql):
+            continue
+        plan = explain(sql)
+        results.append((sql, plan, problems(sql, plan, tables, partial)))
+    return results
+
+
+def audit_call(func, *args, **kwargs):
+    """Run ``func`` and audit the queries it issued."""
+    with CaptureQueriesContext(connection) as captured:
+        func(*args, **kwargs)
+    return audit_queries(captured.captured_queries)
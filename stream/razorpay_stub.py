@@ -0,0 +1,172 @@
+"""A local stand-in for the Razorpay API, for tests and load testing.
+
+Serves the order endpoints the app uses plus ``POST /v1/checkout/<order>/pay``,
+which plays the part of the Checkout widget: it "captures" a payment and
+returns the signed ids the browser would pass to ``payment_verify``. Point
+RAZORPAY_BASE_URL at ``stub.url`` to use it::
+
+    with RazorpayStub(secret='secret') as stub:
+        stub.delay = 0.5       # slow every response down
+        stub.fail_next = 3     # answer the next three requests with a 500
+        stub.fail_html = True  # ... as an HTML 502 page, as a proxy would
+        stub.fail_code = 'GATEWAY_ERROR'  # ... or with this error code
+"""
+import hashlib
+import hmac
+import itertools
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ORDER_PATH = re.compile(r'^/v1/orders(?:/(?P<order_id>[\w-]+))?$')
+PAYMENT_PATH = re.compile(r'^/v1/payments/(?P<payment_id>[\w-]+)$')
+CHECKOUT_PATH = re.compile(r'^/v1/checkout/(?P<order_id>[\w-]+)/pay$')
+
+
+def sign(secret, order_id, payment_id):
+    message = f'{order_id}|{payment_id}'.encode()
+    return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this Nagle's
+    # algorithm adds ~40ms to every keep-alive response.
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except ConnectionError:
+            pass  # The client gave up waiting, e.g. a read timeout test.
+
+    def send_html(self, status, text):
+        body = f'<html><body><h1>{text}</h1></body></html>'.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_json(self, status, code, description):
+        self.send_json(status, {'error': {'code': code, 'description': description}})
+
+    def read_json(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length) or b'{}')
+
+    def handle_request(self, method):
+        stub = self.server.stub
+        body = self.read_json() if method == 'POST' else {}
+        stub.record(method, self.path, self.client_address)
+        if stub.delay:
+            time.sleep(stub.delay)
+        if stub.take_failure():
+            if stub.fail_html:
+                return self.send_html(502, 'Bad Gateway')
+            return self.send_error_json(500, stub.fail_code, 'Stubbed failure')
+
+        path = self.path.split('?', 1)[0]
+        if match := ORDER_PATH.match(path):
+            if method == 'POST' and not match['order_id']:
+                return self.send_json(200, stub.create_order(body))
+            if method == 'GET' and match['order_id'] in stub.orders:
+                return self.send_json(200, stub.orders[match['order_id']])
+        elif (match := PAYMENT_PATH.match(path)) and method == 'GET':
+            if match['payment_id'] in stub.payments:
+                return self.send_json(200, stub.payments[match['payment_id']])
+        elif (match := CHECKOUT_PATH.match(path)) and method == 'POST':
+            if match['order_id'] in stub.orders:
+                return self.send_json(200, stub.pay(match['order_id']))
+        self.send_error_json(400, 'BAD_REQUEST_ERROR', 'The id provided does not exist')
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+
+class RazorpayStub:
+    def __init__(self, secret='secret', host='127.0.0.1'):
+        self.secret = secret
+        self.server = ThreadingHTTPServer((host, 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.stub = self
+        self.url = f'http://{host}:{self.server.server_port}'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.orders = {}
+        self.payments = {}
+        self.requests = []
+        self.connections = set()
+        self.delay = 0
+        self.fail_next = 0
+        self.fail_html = False
+        self.fail_code = 'SERVER_ERROR'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def record(self, method, path, client_address):
+        with self.lock:
+            self.requests.append((method, path))
+            self.connections.add(client_address)
+
+    def take_failure(self):
+        with self.lock:
+            if self.fail_next:
+                self.fail_next -= 1
+                return True
+            return False
+
+    def create_order(self, data):
+        with self.lock:
+            order_id = f'order_stub{next(self.ids)}'
+            self.orders[order_id] = order = {
+                'id': order_id, 'entity': 'order', 'status': 'created', 'attempts': 0,
+                'amount': data.get('amount'), 'currency': data.get('currency', 'INR'),
+                'receipt': data.get('receipt'), 'notes': data.get('notes', []),
+                'created_at': int(time.time()),
+            }
+        return order
+
+    def pay(self, order_id):
+        with self.lock:
+            order = self.orders[order_id]
+            payment_id = f'pay_stub{next(self.ids)}'
+            order.update(status='paid', attempts=order['attempts'] + 1)
+            self.payments[payment_id] = {
+                'id': payment_id, 'entity': 'payment', 'status': 'captured', 'order_id': order_id,
+                'amount': order['amount'], 'currency': order['currency'],
+            }
+        return {
+            'razorpay_payment_id': payment_id,
+            'razorpay_order_id': order_id,
+            'razorpay_signature': sign(self.secret, order_id, payment_id),
+        }
+
+    def reset(self):
+        with self.lock:
+            self.requests.clear()
+            self.connections.clear()
+            self.delay = 0
+            self.fail_next = 0
+            self.fail_html = False
+            self.fail_code = 'SERVER_ERROR'
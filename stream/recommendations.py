@@ -0,0 +1,353 @@
+"""Precomputed "more like this" neighbours for movie_detail.
+
+Every title is described by its genre, director, cast members (through
+MovieCast), year and rating, and scored against every other title with
+NumPy, a block of rows at a time:
+
+    score(i, j) = GENRE    * [same genre]
+                + DIRECTOR * [same director]
+                + CAST     * shared cast / sqrt(cast_i * cast_j)
+                + YEAR     * exp(-|year_i - year_j| / YEAR_SCALE)
+                + RATING   * (1 - |rating_i - rating_j| / 10)
+                + QUALITY  * rating_j / 10
+
+The best RECOMMENDATIONS_K neighbours of each title are stored in
+SimilarMovie, so a detail page reads them in one lookup on the
+(movie, rank) index. ``rebuild()`` is the offline batch job
+(``manage.py build_recommendations``); ``refresh(ids)`` recomputes only
+the titles a change to ``ids`` can affect, and signals.py runs it in the
+background after a title or its cast is saved.
+
+Two titles sharing no genre, director or cast member score at most
+UNRELATED_MAX, below the last neighbour of nearly every title in a real
+catalog. So a refresh only loads the features of the titles related to the
+ones it recomputes, and falls back to the whole catalog for the few lists
+an unrelated title could still enter.
+"""
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower, Trim
+
+from .models import Movie, MovieCast, SimilarMovie
+
+logger = logging.getLogger(__name__)
+
+GENRE = 1.0
+DIRECTOR = 1.5
+CAST = 2.0
+YEAR = 0.5
+YEAR_SCALE = 10.0
+RATING = 0.5
+QUALITY = 0.3
+
+# The best score of a title sharing no genre, director or cast member, and
+# the last neighbour's score below which such titles have to be considered.
+UNRELATED_MAX = YEAR + RATING + QUALITY
+LOW_BAR = UNRELATED_MAX + 1e-3
+
+# Upper bound on the cells of one block of the score matrix (float32), which
+# bounds the build's working memory independently of the catalog size.
+BLOCK_CELLS = 4_000_000
+WRITE_BATCH = 5000
+
+
+class Features:
+    """Per-title columns in id order, prepared for block scoring.
+
+    The year and rating terms become lookups in small pair tables (ratings
+    bucketed to 0.1), and the sparse director and cast matches are kept as
+    CSR-style (offsets, rows) lists in both directions, so scoring a block
+    only makes a few passes over its dense cells.
+    """
+
+    def __init__(self, ids, genres, directors, years, ratings, cast_pairs):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.genre = np.asarray(genres, dtype=np.int64)
+
+        # Key 0 is "no year", which scores 0 against everything.
+        years = np.asarray([0 if y is None else y for y in years], dtype=np.int64)
+        known, self.year_key = np.unique(years, return_inverse=True)
+        gap = np.abs(known[:, None] - known).astype(np.float32)
+        self.year_table = (YEAR * np.exp(-gap / YEAR_SCALE)).astype(np.float32)
+        self.year_table[known == 0, :] = self.year_table[:, known == 0] = 0
+
+        self.rating_key = np.clip(np.rint(np.asarray(ratings, dtype=np.float64) * 10), 0, 100).astype(np.int64)
+        buckets = np.arange(101, dtype=np.float32)
+        self.rating_table = RATING * (1 - np.abs(buckets[:, None] - buckets) / 100) + QUALITY * buckets / 100
+
+        codes = {}
+        names = ((d or '').strip().lower() for d in directors)
+        director = np.fromiter((codes.setdefault(name, len(codes)) if name else -1 for name in names), dtype=np.int64)
+        credited = np.flatnonzero(director >= 0)
+        self.director_ptr, self.director_movies = csr(director[credited], credited, len(codes))
+        self.director = director
+
+        pairs = np.unique(np.asarray(cast_pairs, dtype=np.int64).reshape(-1, 2), axis=0)
+        rows = np.searchsorted(self.ids, pairs[:, 0])
+        _, cast = np.unique(pairs[:, 1], return_inverse=True)
+        self.movie_ptr, self.movie_cast = csr(rows, cast, len(self.ids))
+        self.cast_ptr, self.cast_movies = csr(cast, rows, int(cast.max()) + 1 if len(cast) else 0)
+        self.cast_count = np.diff(self.movie_ptr).astype(np.float32)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def rows(self, ids):
+        """Row numbers of those ``ids`` that exist."""
+        ids = np.unique(np.fromiter(ids, dtype=np.int64))
+        rows = np.searchsorted(self.ids, ids)
+        found = rows < len(self.ids)
+        found[found] = self.ids[rows[found]] == ids[found]
+        return rows[found]
+
+
+def csr(keys, values, size):
+    order = np.argsort(keys, kind='stable')
+    offsets = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=size), out=offsets[1:])
+    return offsets, values[order]
+
+
+def ranges(starts, lengths):
+    """Concatenation of ``arange(start, start + length)`` for each pair."""
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+
+def expand(ptr, values, keys):
+    """``(positions, values)``: each ``values`` entry listed under ``keys[i]``,
+    with the position ``i`` it came from."""
+    starts = ptr[keys]
+    lengths = ptr[keys + 1] - starts
+    return np.repeat(np.arange(len(keys)), lengths), values[ranges(starts, lengths)]
+
+
+def load_features(movies=None):
+    """Features of the ``movies`` queryset, by default the whole catalog."""
+    movies = Movie.objects.all() if movies is None else movies
+    columns = list(movies.order_by('id').values_list('id', 'genre_id', 'director', 'year', 'rating'))
+    cast_pairs = list(MovieCast.objects.filter(movie__in=movies.values('pk')).values_list('movie_id', 'cast_id'))
+    return Features(*(zip(*columns) if columns else ([],) * 5), cast_pairs)
+
+
+def related(movie_ids):
+    """The titles ``movie_ids`` and every title sharing a genre, director or
+    cast member with one of them."""
+    movies = Movie.objects.filter(pk__in=movie_ids)
+    directors = (
+        movies.annotate(key=Lower(Trim('director'))).exclude(key='').exclude(key=None).values('key')
+    )
+    cast = MovieCast.objects.filter(movie__in=movies.values('pk')).values('cast')
+    return Movie.objects.annotate(director_key=Lower(Trim('director'))).filter(
+        Q(pk__in=movies.values('pk'))
+        | Q(genre__in=movies.values('genre'))
+        | Q(director_key__in=directors)
+        | Q(pk__in=MovieCast.objects.filter(cast__in=cast).values('movie'))
+    )
+
+
+def score_rows(features, rows):
+    """``len(rows) x N`` float32 scores; a title never scores against itself."""
+    f, n = features, len(features)
+    scores = np.take(f.year_table[f.year_key[rows]], f.year_key, axis=1)
+    scores += np.take(f.rating_table[f.rating_key[rows]], f.rating_key, axis=1)
+    np.add(scores, GENRE, out=scores, where=f.genre[rows, None] == f.genre)
+    flat = scores.reshape(-1)
+
+    # Same director: only the titles sharing one are touched.
+    credited = np.flatnonzero(f.director[rows] >= 0)
+    block_rows, others = expand(f.director_ptr, f.director_movies, f.director[rows][credited])
+    flat[credited[block_rows] * n + others] += DIRECTOR
+
+    # Shared cast, cosine-normalised by both cast sizes.
+    block_rows, cast = expand(f.movie_ptr, f.movie_cast, rows)
+    positions, others = expand(f.cast_ptr, f.cast_movies, cast)
+    cells = block_rows[positions] * n + others
+    if len(cells) * 8 < scores.size:
+        cells, shared = np.unique(cells, return_counts=True)
+    else:
+        # Popular cast members: counting densely beats sorting the pairs.
+        shared = np.bincount(cells, minlength=scores.size)
+        cells = np.flatnonzero(shared)
+        shared = shared[cells]
+    norm = np.sqrt(f.cast_count[rows[cells // n]] * f.cast_count[cells % n])
+    flat[cells] += CAST * shared / norm
+
+    scores[np.arange(len(rows)), rows] = -np.inf
+    return scores
+
+
+def top_k(features, scores, k):
+    """``(neighbour_rows, scores)``, best first, ties broken by lower id."""
+    k = min(k, len(features) - 1)
+    if k <= 0:
+        return np.empty((len(scores), 0), np.int64), np.empty((len(scores), 0), np.float32)
+    best = np.argpartition(scores, -k, axis=1)[:, -k:]
+    best_scores = np.take_along_axis(scores, best, axis=1)
+    # argpartition splits ties at the k-th score arbitrarily; settle those
+    # rows by id so a rebuild is reproducible.
+    cutoff = best_scores.min(axis=1, keepdims=True)
+    for i in np.flatnonzero((scores >= cutoff).sum(axis=1) > k):
+        tied = np.flatnonzero(scores[i] >= cutoff[i])
+        tied = tied[np.lexsort((features.ids[tied], -scores[i, tied]))][:k]
+        best[i], best_scores[i] = tied, scores[i, tied]
+    order = np.lexsort((features.ids[best], -best_scores), axis=-1)
+    return np.take_along_axis(best, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def blocks(rows, n):
+    size = max(1, BLOCK_CELLS // max(n, 1))
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def neighbours(features, rows, k):
+    """``(movie_ids, similar_ids, ranks, scores)`` arrays for ``rows``."""
+    parts = []
+    for block in blocks(rows, len(features)):
+        best, best_scores = top_k(features, score_rows(features, block), k)
+        ranks = np.broadcast_to(np.arange(best.shape[1]), best.shape)
+        keep = np.isfinite(best_scores)
+        parts.append((
+            np.broadcast_to(features.ids[block, None], best.shape)[keep],
+            features.ids[best][keep], ranks[keep], best_scores[keep],
+        ))
+    if not parts:
+        return (np.empty(0, np.int64),) * 3 + (np.empty(0, np.float32),)
+    return tuple(np.concatenate(column) for column in zip(*parts))
+
+
+def write(arrays):
+    """Insert neighbour arrays, building model objects one batch at a time."""
+    movie_ids, similar_ids, ranks, scores = arrays
+    for start in range(0, len(movie_ids), WRITE_BATCH):
+        end = start + WRITE_BATCH
+        SimilarMovie.objects.bulk_create([
+            SimilarMovie(movie_id=movie_id, similar_id=similar_id, rank=rank, score=score)
+            for movie_id, similar_id, rank, score in zip(
+                movie_ids[start:end].tolist(), similar_ids[start:end].tolist(),
+                ranks[start:end].tolist(), scores[start:end].tolist(),
+            )
+        ])
+    return len(movie_ids)
+
+
+def rebuild(k=None):
+    """Recompute every title's neighbours; returns the number of rows written."""
+    features = load_features()
+    arrays = neighbours(features, np.arange(len(features)), k or settings.RECOMMENDATIONS_K)
+    with transaction.atomic():
+        SimilarMovie.objects.all().delete()
+        return write(arrays)
+
+
+def refresh(movie_ids, k=None):
+    """Recompute the neighbours a change to ``movie_ids`` can affect.
+
+    That is the changed titles themselves, the titles currently listing one
+    of them, and the titles one of them now outscores the last neighbour of.
+    Ids that no longer exist only count through the titles listing them.
+    Returns the ids whose neighbours were rewritten.
+    """
+    k = k or settings.RECOMMENDATIONS_K
+    movie_ids = set(movie_ids)
+    last_rank = min(k, Movie.objects.count() - 1) - 1
+    affected = set(SimilarMovie.objects.filter(similar_id__in=movie_ids).values_list('movie_id', flat=True))
+
+    # A changed title can only enter the lists of the titles related to it,
+    # and of those whose last score an unrelated title reaches.
+    low_bar = SimilarMovie.objects.filter(rank=last_rank, score__lt=LOW_BAR).values('movie')
+    candidates = Movie.objects.filter(Q(pk__in=related(movie_ids).values('pk')) | Q(pk__in=low_bar))
+    features = load_features(candidates)
+    changed = features.rows(movie_ids)
+    affected.update(int(i) for i in features.ids[changed])
+
+    # Each candidate's current last score. Titles without a full list have
+    # not been built yet; that is left to rebuild().
+    threshold = np.full(len(features), np.inf, dtype=np.float32)
+    last = np.asarray(
+        list(
+            SimilarMovie.objects.filter(rank=last_rank, movie__in=candidates.values('pk')).values_list('movie_id', 'score')
+        ),
+        dtype=np.float64,
+    ).reshape(-1, 2)
+    if len(last):
+        threshold[np.searchsorted(features.ids, last[:, 0].astype(np.int64))] = last[:, 1]
+    for block in blocks(changed, len(features)):
+        # score(j, m) from score(m, j): only the QUALITY term is asymmetric.
+        scores = score_rows(features, block)
+        scores += QUALITY * (features.rating_key[block, None] - features.rating_key).astype(np.float32) / 100
+        # Ties can qualify (lower id wins), and float32 rounding differs from
+        # the stored scores, so include near misses; they only cost a recompute.
+        qualifies = (scores >= threshold - 1e-4).any(axis=0)
+        affected.update(int(i) for i in features.ids[qualifies])
+
+    # Recomputed among their related titles, which settles every list whose
+    # last score stays above what an unrelated title can reach; the rest are
+    # scored against the whole catalog.
+    features = load_features(related(affected))
+    arrays = neighbours(features, features.rows(affected), k)
+    movie_col, _, ranks, scores = arrays
+    settled = np.unique(movie_col[(ranks == last_rank) & (scores >= LOW_BAR)])
+    if len(settled) < len(affected):
+        keep = np.isin(movie_col, settled)
+        features = load_features()
+        rest = features.rows(set(affected).difference(settled.tolist()))
+        arrays = tuple(np.concatenate(pair) for pair in zip(
+            (column[keep] for column in arrays), neighbours(features, rest, k),
+        ))
+    with transaction.atomic():
+        SimilarMovie.objects.filter(movie_id__in=affected).delete()
+        write(arrays)
+    return affected
+
+
+def similar_to(movie, limit):
+    """Up to ``limit`` precomputed neighbours of ``movie``, best first."""
+    return Movie.objects.filter(similar_to__movie=movie).order_by('similar_to__rank')[:limit]
+
+
+_lock = threading.Lock()
+_pending = set()
+_running = False
+
+
+def refresh_in_background(movie_ids):
+    """Queue ``movie_ids`` for a single background thread that drains the
+    queue. It waits RECOMMENDATIONS_REFRESH_DELAY before each batch, so the
+    saves of one admin form, or a burst of them, are refreshed together."""
+    global _running
+    with _lock:
+        _pending.update(movie_ids)
+        if _running:
+            return
+        _running = True
+
+    def run():
+        global _running
+        try:
+            while True:
+                time.sleep(settings.RECOMMENDATIONS_REFRESH_DELAY)
+                # Cleared only here, under the lock that saw the queue empty:
+                # once released, another call may already have started a thread.
+                with _lock:
+                    if not _pending:
+                        _running = False
+                        return
+                    batch = set(_pending)
+                    _pending.clear()
+                try:
+                    refresh(batch)
+                except Exception:
+                    # The next change or `manage.py build_recommendations` catches up.
+                    logger.exception("Refreshing recommendations for %d titles failed", len(batch))
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=run, daemon=True).start()
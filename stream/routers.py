@@ -0,0 +1,116 @@
+"""Read/write splitting between the primary SQLite file and a read alias.
+
+With ``DATABASE_READ_ALIAS`` configured, ORM reads go to that alias and
+writes to ``default``. Reads move back to the primary:
+
+* for the rest of a request once it has written anything, and inside any
+  transaction on the primary, so a request always sees its own writes;
+* for every unsafe (POST, ...) request;
+* for ``DATABASE_STICKY_SECONDS`` after a write, through a cookie, so the
+  page a browser loads right after a POST is not served from a replica that
+  has not caught up yet.
+
+The routing state lives in a context variable that StickyPrimaryMiddleware
+resets per request; outside a request (commands, background threads) reads
+follow the same rules without the cookie.
+"""
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_state = ContextVar('db_routing', default=None)
+
+
+class RoutingState:
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.wrote = False
+
+
+def state():
+    current = _state.get()
+    if current is None:
+        current = RoutingState()
+        _state.set(current)
+    return current
+
+
+def pin_primary():
+    """Send the remaining reads of this request (or thread) to the primary."""
+    state().pinned = True
+
+
+class ReadReplicaRouter:
+    def db_for_read(self, model, **hints):
+        alias = settings.DATABASE_READ_ALIAS
+        if not alias or state().pinned or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        current = state()
+        current.pinned = current.wrote = True
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The read alias is a copy of the primary, never migrated itself.
+        return False if db == settings.DATABASE_READ_ALIAS else None
+
+
+class StickyPrimaryMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DATABASE_READ_ALIAS:
+            return self.get_response(request)
+
+        current, token = self.enter(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(current, response)
+
+    async def __acall__(self, request):
+        if not settings.DATABASE_READ_ALIAS:
+            return await self.get_response(request)
+
+        current, token = self.enter(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(current, response)
+
+    def enter(self, request):
+        current = RoutingState(
+            pinned=request.method not in SAFE_METHODS or STICKY_COOKIE in request.COOKIES,
+        )
+        return current, _state.set(current)
+
+    def finish(self, current, response):
+        if current.wrote:
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.DATABASE_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
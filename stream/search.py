@@ -0,0 +1,137 @@
+import functools
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+
+from .aio import interruptible
+
+FTS_TABLE = 'stream_movie_fts'
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+BATCH_SIZE = 500
+
+# Columns of the FTS table, in order, and their bm25() weights.
+FIELD_WEIGHTS = {
+    'title': 10.0,
+    'director': 4.0,
+    'cast_names': 3.0,
+    'genre': 2.0,
+}
+
+INDEX_SELECT = """
+    SELECT m.id, m.title, COALESCE(m.director, ''),
+           COALESCE((SELECT group_concat(c.real_name, ' ')
+                     FROM stream_moviecast mc
+                     JOIN stream_cast c ON c.id = mc.cast_id
+                     WHERE mc.movie_id = m.id), ''),
+           g.name
+    FROM stream_movie m
+    JOIN stream_genre g ON g.id = m.genre_id
+"""
+
+
+def batched(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+class ORMSearchBackend:
+    """Unindexed fallback: icontains across the same fields, no ranking."""
+
+    def search(self, query, limit):
+        from .models import Movie
+        return list(
+            Movie.objects.filter(
+                Q(title__icontains=query) |
+                Q(director__icontains=query) |
+                Q(genre__name__icontains=query) |
+                Q(cast_members__real_name__icontains=query)
+            ).distinct().values_list('id', flat=True)[:limit]
+        )
+
+    async def asearch(self, query, limit):
+        # A single statement in both backends; run it where a disconnect can interrupt it.
+        return await interruptible(self.search, query, limit)
+
+    def index_movies(self, movie_ids):
+        pass
+
+    def remove_movies(self, movie_ids):
+        pass
+
+    def rebuild(self):
+        return 0
+
+
+class SqliteFTSBackend(ORMSearchBackend):
+    """SQLite FTS5 index with bm25 ranking, prefix matching and field weights.
+
+    The virtual table is created by migration 0006; its rowid is the movie id.
+    """
+
+    def match_expression(self, query):
+        tokens = TOKEN_RE.findall(query.lower())
+        # Every token must match; the last one is treated as a prefix since
+        # the navbar searches while the user is still typing.
+        terms = [f'"{token}"' for token in tokens[:-1]]
+        if tokens:
+            terms.append(f'"{tokens[-1]}"*')
+        return ' '.join(terms)
+
+    def search(self, query, limit):
+        expression = self.match_expression(query)
+        if not expression:
+            return []
+        weights = ', '.join(str(weight) for weight in FIELD_WEIGHTS.values())
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, {weights}) LIMIT %s",
+                [expression, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_movies(self, movie_ids):
+        for batch in batched(movie_ids):
+            placeholders = ', '.join(['%s'] * len(batch))
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", batch)
+                cursor.execute(
+                    f"INSERT INTO {FTS_TABLE} (rowid, title, director, cast_names, genre) "
+                    f"{INDEX_SELECT} WHERE m.id IN ({placeholders})",
+                    batch,
+                )
+
+    def remove_movies(self, movie_ids):
+        for batch in batched(movie_ids):
+            placeholders = ', '.join(['%s'] * len(batch))
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", batch)
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(f"INSERT INTO {FTS_TABLE} (rowid, title, director, cast_names, genre) {INDEX_SELECT}")
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+            cursor.execute(f"SELECT count(*) FROM {FTS_TABLE}")
+            return cursor.fetchone()[0]
+
+
+@functools.cache
+def get_backend():
+    backend = settings.SEARCH_BACKEND
+    if backend is None:
+        backend = SqliteFTSBackend if connection.vendor == 'sqlite' else ORMSearchBackend
+        return backend()
+    return import_string(backend)()
+
+
+def search_movie_ids(query, limit=15):
+    return get_backend().search(query, limit)
+
+
+async def asearch_movie_ids(query, limit=15):
+    return await get_backend().asearch(query, limit)
@@ -1,7 +1,21 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.contrib.auth.models import User
 from django.dispatch import receiver
-from .models import Profile
+from django.test.signals import setting_changed
+from .models import Profile, Movie, Genre, Cast, MovieCast, MyList, SimilarMovie, Subscription
+from .packaging import clear_package, package_in_background
+from .search import get_backend as get_search_backend
+from . import suggestions
+from .caching import bump_catalog_version
+from .images import generate_derivatives, image_fields
+from . import entitlements
+from . import payments
+from . import mylist
+from . import recommendations
+from . import profiling
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -12,4 +26,199 @@ def create_user_profile(sender, instance, created, **kwargs):
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
     """Ensures the Profile is saved whenever the User object is saved."""
-    instance.profile.save()
\ No newline at end of file
+    instance.profile.save()
+
+@receiver(pre_save, sender=Movie)
+def track_video_change(sender, instance, **kwargs):
+    """Flags a new or replaced video upload so it gets re-packaged."""
+    previous = ''
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values_list('video', flat=True).first() or ''
+    instance._video_changed = bool(instance.video) and instance.video.name != previous
+    if instance._video_changed:
+        instance.packaging_status = 'pending'
+        instance.packaging_progress = 0
+
+@receiver(post_save, sender=Movie)
+def package_uploaded_video(sender, instance, raw=False, **kwargs):
+    """Starts HLS packaging once the upload has been committed."""
+    if raw or not getattr(instance, '_video_changed', False) or not settings.PACKAGING_ON_UPLOAD:
+        return
+    instance._video_changed = False
+    clear_package(instance)
+    transaction.on_commit(lambda: package_in_background(instance))
+
+
+# Search index maintenance. bulk_create/update() bypass these, so bulk loaders
+# should finish with `manage.py rebuild_search_index`.
+
+@receiver(post_save, sender=Movie)
+def index_movie(sender, instance, **kwargs):
+    get_search_backend().index_movies([instance.pk])
+
+@receiver(post_delete, sender=Movie)
+def unindex_movie(sender, instance, **kwargs):
+    get_search_backend().remove_movies([instance.pk])
+
+@receiver(post_save, sender=Genre)
+def reindex_genre_movies(sender, instance, created, **kwargs):
+    if not created:
+        get_search_backend().index_movies(instance.movie_set.values_list('pk', flat=True))
+
+@receiver(post_save, sender=Cast)
+def reindex_cast_movies(sender, instance, created, **kwargs):
+    if not created:
+        get_search_backend().index_movies(instance.movie_set.values_list('pk', flat=True))
+
+@receiver(post_save, sender=MovieCast)
+@receiver(post_delete, sender=MovieCast)
+def reindex_movie_cast(sender, instance, **kwargs):
+    get_search_backend().index_movies([instance.movie_id])
+
+@receiver(m2m_changed, sender=Movie.cast_members.through)
+def reindex_cast_members(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            get_search_backend().index_movies([instance.pk])
+    elif action == 'pre_clear':
+        instance._cleared_movie_ids = list(instance.movie_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        get_search_backend().index_movies(getattr(instance, '_cleared_movie_ids', []))
+    elif action in ('post_add', 'post_remove'):
+        get_search_backend().index_movies(pk_set)
+
+
+# Similar titles. bulk_create/update() bypass these, so bulk loaders should
+# finish with `manage.py build_recommendations`.
+
+def refresh_similar(movie_ids):
+    if settings.RECOMMENDATIONS_ON_SAVE and movie_ids:
+        transaction.on_commit(lambda: recommendations.refresh_in_background(movie_ids))
+
+@receiver(post_save, sender=Movie)
+def refresh_similar_movie(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_similar([instance.pk])
+
+@receiver(pre_delete, sender=Movie)
+def remember_similar_referrers(sender, instance, **kwargs):
+    # The cascade removes the rows pointing at this title before post_delete.
+    instance._similar_referrers = list(
+        SimilarMovie.objects.filter(similar=instance).values_list('movie_id', flat=True)
+    )
+
+@receiver(post_delete, sender=Movie)
+def refresh_similar_referrers(sender, instance, **kwargs):
+    refresh_similar(getattr(instance, '_similar_referrers', []))
+
+@receiver(post_save, sender=MovieCast)
+@receiver(post_delete, sender=MovieCast)
+def refresh_similar_cast(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_similar([instance.movie_id])
+
+@receiver(m2m_changed, sender=Movie.cast_members.through)
+def refresh_similar_cast_members(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_similar([instance.pk])
+    elif action == 'post_clear':
+        # Collected by reindex_cast_members on pre_clear.
+        refresh_similar(getattr(instance, '_cleared_movie_ids', []))
+    else:
+        refresh_similar(list(pk_set))
+
+
+@receiver([post_save, post_delete], sender=Movie)
+@receiver([post_save, post_delete], sender=Cast)
+@receiver([post_save, post_delete], sender=Genre)
+@receiver([post_save, post_delete], sender=MovieCast)
+@receiver(m2m_changed, sender=Movie.cast_members.through)
+def bump_catalog(sender, **kwargs):
+    """Invalidates cached shelves, pages and the suggestion index in every process."""
+    bump_catalog_version()
+    suggestions.invalidate()
+
+
+@receiver(pre_save, sender=Movie)
+@receiver(pre_save, sender=Cast)
+@receiver(pre_save, sender=Genre)
+def track_image_changes(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Notes which image fields got a new file, so other saves skip them."""
+    names = [fieldfile.field.name for fieldfile in image_fields(instance, update_fields)]
+    previous = {}
+    if names and instance.pk and not raw:
+        previous = sender.objects.filter(pk=instance.pk).values(*names).first() or {}
+    instance._changed_images = {
+        name for name in names
+        # Not yet committed: a fresh upload, even under the old name.
+        if not getattr(instance, name)._committed or getattr(instance, name).name != previous.get(name)
+    }
+
+
+@receiver(post_save, sender=Movie)
+@receiver(post_save, sender=Cast)
+@receiver(post_save, sender=Genre)
+def generate_image_variants(sender, instance, raw=False, **kwargs):
+    """Creates srcset variants for newly uploaded images."""
+    if raw:
+        return
+    changed, instance._changed_images = getattr(instance, '_changed_images', set()), set()
+    for fieldfile in image_fields(instance, changed):
+        try:
+            generate_derivatives(fieldfile)
+        except (OSError, ValueError):
+            pass  # Retried lazily the first time a template renders it.
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def invalidate_entitlement(sender, instance, **kwargs):
+    # After commit, or a concurrent read could re-cache the old subscription.
+    user_id = instance.user_id
+    transaction.on_commit(lambda: entitlements.invalidate(user_id))
+
+
+@receiver(setting_changed)
+def reset_payment_gateway(setting, **kwargs):
+    """Rebuilds the shared Razorpay client when its settings are overridden."""
+    if setting.startswith('RAZORPAY_'):
+        payments.reset()
+
+
+@receiver(setting_changed)
+def reset_search_backend(setting, **kwargs):
+    """Picks the search backend again when SEARCH_BACKEND is overridden."""
+    if setting == 'SEARCH_BACKEND':
+        get_search_backend.cache_clear()
+
+
+@receiver(post_save, sender=MyList)
+@receiver(post_delete, sender=MyList)
+def invalidate_my_list(sender, instance, **kwargs):
+    # Also covers cascades from User/Movie deletes and the admin.
+    user_id = instance.user_id
+    transaction.on_commit(lambda: mylist.invalidate(user_id))
+
+
+@receiver(connection_created)
+def tune_sqlite_connection(sender, connection, **kwargs):
+    """Applies SQLITE_PRAGMAS to each new SQLite connection; the read alias is query-only."""
+    if connection.vendor != 'sqlite':
+        return
+    read_only = connection.alias == settings.DATABASE_READ_ALIAS
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            # A replica's journal mode belongs to whatever keeps it in sync.
+            if not (read_only and name == 'journal_mode'):
+                cursor.execute(f'PRAGMA {name} = {value}')
+        if read_only:
+            cursor.execute('PRAGMA query_only = 1')
+
+
+@receiver(connection_created)
+def profile_connection(sender, connection, **kwargs):
+    """Times every statement for the request being profiled (stream/profiling.py)."""
+    if profiling.sql_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profiling.sql_wrapper)
@@ -0,0 +1,132 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class RangeFile:
+    """Read-only view of ``length`` bytes of an open file, starting at its current offset.
+
+    ``fileno`` is exposed so ``wsgi.file_wrapper`` implementations (gunicorn)
+    can use ``sendfile``; ``tell``/``seek`` are not, so ``FileResponse`` keeps
+    the Content-Length we set instead of measuring to EOF.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def parse_range(header, size):
+    """Return ``(start, end)`` (inclusive) for a single byte range, ``None`` to
+    serve the whole file, or ``False`` if the range cannot be satisfied."""
+    match = RANGE_RE.match(header.strip()) if header else None
+    if not match:
+        # Missing, malformed or multi-range requests get the full body.
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if size == 0:
+        # No byte of an empty file can be addressed, not even by a suffix.
+        return False
+    if not first:
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request, etag, mtime):
+    value = request.META.get('HTTP_IF_RANGE')
+    if not value:
+        return True
+    if value.startswith('"') or value.startswith('W/'):
+        # If-Range only accepts strong validators.
+        return value == etag
+    since = parse_http_date_safe(value)
+    return since is not None and since == int(mtime)
+
+
+def offload_response(path, content_type):
+    """Hand the file to the front-end server (nginx/Apache/lighttpd)."""
+    header = settings.STREAM_SENDFILE_HEADER
+    response = HttpResponse(content_type=content_type)
+    if header == 'X-Accel-Redirect':
+        relative = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        response[header] = settings.STREAM_ACCEL_PREFIX.rstrip('/') + '/' + relative
+    else:
+        response[header] = path
+    return response
+
+
+def serve_file(request, path, content_type=None):
+    """Serve ``path`` with Range, If-Range and conditional GET support."""
+    content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if settings.STREAM_SENDFILE_HEADER:
+        return offload_response(path, content_type)
+
+    stat = os.stat(path)
+    size = stat.st_size
+    etag = file_etag(stat)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=stat.st_mtime)
+    if not_modified is not None:
+        return not_modified
+
+    byte_range = None
+    if request.method in ('GET', 'HEAD') and if_range_matches(request, etag, stat.st_mtime):
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416, content_type=content_type)
+        response['Content-Range'] = f'bytes */{size}'
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    file = open(path, 'rb')
+    if byte_range:
+        start, end = byte_range
+        length = end - start + 1
+        file.seek(start)
+        response = FileResponse(RangeFile(file, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    else:
+        length = size
+        response = FileResponse(RangeFile(file, length), content_type=content_type)
+
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
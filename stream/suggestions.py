@@ -0,0 +1,205 @@
+"""In-process autocomplete index over director, cast and genre names.
+
+Built lazily from three aggregate queries and rebuilt whenever the catalog
+version changes, so ``get_suggestions`` answers from memory without touching
+the database.
+"""
+import asyncio
+import bisect
+import heapq
+import threading
+import weakref
+from array import array
+from collections import Counter, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count
+
+from .caching import acatalog_version, catalog_version
+
+# Prefixes matching more suffixes than this get a precomputed top-k list;
+# anything narrower is answered by scanning the sorted suffix array.
+HEAVY_PREFIX = 64
+# Trigram posting lists keep only their most popular entries.
+MAX_POSTINGS = 128
+FUZZY_CANDIDATES = 20
+MIN_FUZZY_SCORE = 0.4
+
+
+def trigrams(text):
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SuggestionIndex:
+    def __init__(self, entries, limit=6):
+        """``entries`` is an iterable of ``(name, kind, popularity)``."""
+        merged = {}
+        for name, kind, popularity in entries:
+            if not name:
+                continue
+            name = name.strip()
+            key = name.lower()
+            if key in merged:
+                previous = merged[key]
+                merged[key] = (previous[0], previous[1], previous[2] + popularity)
+            else:
+                merged[key] = (name, kind, popularity)
+
+        # Entry ids are assigned in popularity order, so a lower id always ranks higher.
+        ordered = sorted(merged.items(), key=lambda item: (-item[1][2], item[0]))
+        self.keys = [key for key, _ in ordered]
+        self.names = [value[0] for _, value in ordered]
+        self.kinds = [value[1] for _, value in ordered]
+        self.limit = limit
+
+        # Sorted array of every word-suffix ("christopher nolan", "nolan") for prefix search.
+        suffixes = []
+        for entry_id, key in enumerate(self.keys):
+            start = 0
+            for word in key.split(' '):
+                if word:
+                    suffixes.append((key[start:], entry_id))
+                start += len(word) + 1
+        suffixes.sort()
+        self.suffixes = [suffix for suffix, _ in suffixes]
+        self.suffix_ids = array('I', (entry_id for _, entry_id in suffixes))
+
+        self.heavy_prefixes = self._heavy_prefixes(limit)
+
+        postings = defaultdict(lambda: array('I'))
+        for entry_id, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                posting = postings[gram]
+                if len(posting) < MAX_POSTINGS:
+                    posting.append(entry_id)
+        self.trigrams = dict(postings)
+
+    def _heavy_prefixes(self, limit):
+        heavy = {}
+        suffixes, ids = self.suffixes, self.suffix_ids
+        stack = [(0, len(suffixes), 0)]
+        while stack:
+            lo, hi, depth = stack.pop()
+            if depth:
+                prefix = suffixes[lo][:depth]
+                heavy[prefix] = array('I', sorted(set(heapq.nsmallest(limit * 4, ids[lo:hi])))[:limit])
+            # Suffixes equal to the prefix sort first; split the rest by their next character.
+            position = bisect.bisect_right(suffixes, suffixes[lo][:depth], lo, hi) if depth else lo
+            while position < hi:
+                child = suffixes[position][:depth + 1]
+                end = bisect.bisect_left(suffixes, child + '\U0010ffff', position, hi)
+                if end - position > HEAVY_PREFIX:
+                    stack.append((position, end, depth + 1))
+                position = end
+        return heavy
+
+    def __len__(self):
+        return len(self.keys)
+
+    def prefix_matches(self, query):
+        if query in self.heavy_prefixes:
+            return list(self.heavy_prefixes[query])
+        start = bisect.bisect_left(self.suffixes, query)
+        found = set()
+        for position in range(start, min(start + HEAVY_PREFIX, len(self.suffixes))):
+            if not self.suffixes[position].startswith(query):
+                break
+            found.add(self.suffix_ids[position])
+        return sorted(found)[:self.limit]
+
+    def fuzzy_matches(self, query):
+        grams = trigrams(query)
+        counts = Counter()
+        for gram in grams:
+            if gram in self.trigrams:
+                counts.update(self.trigrams[gram])
+        scored = []
+        for entry_id, _ in counts.most_common(FUZZY_CANDIDATES):
+            candidate = trigrams(self.keys[entry_id])
+            score = len(grams & candidate) / len(grams | candidate)
+            if score >= MIN_FUZZY_SCORE:
+                scored.append((-score, entry_id))
+        scored.sort()
+        return [entry_id for _, entry_id in scored[:self.limit]]
+
+    def suggest(self, query, limit=None):
+        limit = limit or self.limit
+        query = ' '.join(query.lower().split())
+        if not query:
+            return []
+        # Fall back to trigram similarity only when nothing starts with the query.
+        matches = self.prefix_matches(query)[:limit] or self.fuzzy_matches(query)[:limit]
+        return [self.names[entry_id] for entry_id in matches]
+
+
+def lookups():
+    """``(kind, queryset of (name, popularity))`` for each kind of suggestion."""
+    from .models import Cast, Genre, Movie
+
+    return [
+        ('director', Movie.objects.exclude(director__isnull=True).exclude(director='')
+         .values_list('director').annotate(popularity=Count('id'))),
+        ('cast', Cast.objects.annotate(popularity=Count('moviecast')).values_list('real_name', 'popularity')),
+        ('genre', Genre.objects.annotate(popularity=Count('movie')).values_list('name', 'popularity')),
+    ]
+
+
+def load_entries():
+    for kind, rows in lookups():
+        for name, popularity in rows:
+            yield name, kind, popularity
+
+
+async def aload_entries():
+    """The three lookups of ``load_entries()``, awaited together; a cancelled
+    request stops before the next one starts."""
+    async def fetch(rows):
+        # Not aiterator(): for plain values_list() rows it runs its first
+        # query in the async context (Django 5.2).
+        return [row async for row in rows]
+
+    kinds, querysets = zip(*lookups())
+    results = await asyncio.gather(*map(fetch, querysets))
+    return [(name, kind, popularity) for kind, rows in zip(kinds, results) for name, popularity in rows]
+
+
+_index = None
+_index_version = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """Return the index, rebuilding it if the catalog version moved on."""
+    global _index, _index_version
+    version = catalog_version()
+    if _index is None or _index_version != version:
+        with _lock:
+            if _index is None or _index_version != version:
+                _index = SuggestionIndex(load_entries())
+                _index_version = version
+    return _index
+
+
+_async_locks = weakref.WeakKeyDictionary()  # One per event loop.
+
+
+async def aget_index():
+    """``get_index()`` for async views. Concurrent cold requests wait for one
+    rebuild, whose index is built in a worker thread, off the event loop."""
+    global _index, _index_version
+    version = await acatalog_version()
+    if _index is not None and _index_version == version:
+        return _index
+    lock = _async_locks.setdefault(asyncio.get_running_loop(), asyncio.Lock())
+    async with lock:
+        if _index is None or _index_version != version:
+            index = await sync_to_async(SuggestionIndex, thread_sensitive=False)(await aload_entries())
+            with _lock:
+                _index, _index_version = index, version
+        return _index
+
+
+def invalidate():
+    global _index
+    _index = None
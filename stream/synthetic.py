@@ -0,0 +1,158 @@
+"""Deterministic synthetic catalog and audience data for load testing.
+
+Rows are produced and inserted in fixed-size batches, so memory stays flat no
+matter how many movies are requested. Popularity is skewed the way real
+catalogs are: a few genres, actors and titles account for most of the rows.
+"""
+import datetime
+import itertools
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .models import Cast, Genre, Movie, MovieCast, MyList, Profile, Subscription
+
+WORDS = (
+    'dark night last city king shadow river star fire silent lost storm '
+    'empire secret blood winter golden broken iron wild ghost ocean dream '
+    'red house road moon garden war heart machine hunter queen stone'
+).split()
+FIRST_NAMES = 'arun priya vijay meera rahul anita karthik divya suresh lakshmi tom emma james olivia noah'.split()
+LAST_NAMES = 'kumar sharma raj iyer nair menon reddy das smith jones brown wilson taylor clark'.split()
+SYLLABLES = 'ka ra mi to an ve lo shi du pa ne ri zo ta mu el or in vi sa'.split()
+GENRE_ICONS = 'bx-film bx-run bx-ghost bx-heart bx-laugh bx-rocket bx-world bx-music bx-shield bx-tv'.split()
+PLANS = [('basic', 40), ('standard', 35), ('premium', 20), ('pro', 5)]
+
+
+def make_word(rng):
+    # Mostly invented words so the vocabulary grows with the catalog.
+    if rng.random() < 0.3:
+        return rng.choice(WORDS)
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+
+
+def make_person(rng):
+    return f'{rng.choice(FIRST_NAMES).title()} {rng.choice(LAST_NAMES).title()}'
+
+
+def zipf_weights(count, exponent=1.1):
+    """Cumulative Zipf weights for ``rng.choices(..., cum_weights=...)``."""
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, count + 1)))
+
+
+def batches(total, size):
+    for start in range(0, total, size):
+        yield start, min(start + size, total)
+
+
+class CatalogGenerator:
+    def __init__(self, seed=0, batch_size=5000, log=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+
+    def genres(self, count):
+        names = [f'{make_word(self.rng).title()} {i}' for i in range(count)]
+        # bulk_create skips Genre.save(), which would fill in the slug.
+        genres = Genre.objects.bulk_create([
+            Genre(
+                name=name,
+                slug=slugify(name),
+                image='genres/seed.png',
+                icon_class=GENRE_ICONS[i % len(GENRE_ICONS)],
+            )
+            for i, name in enumerate(names)
+        ])
+        self.log(f'genres: {count}')
+        return [genre.pk for genre in genres]
+
+    def cast(self, count):
+        ids = []
+        for start, end in batches(count, self.batch_size):
+            with transaction.atomic():
+                created = Cast.objects.bulk_create([
+                    Cast(real_name=f'{make_person(self.rng)} {i}', image='cast/seed.png')
+                    for i in range(start, end)
+                ])
+            ids.extend(member.pk for member in created)
+        self.log(f'cast: {count}')
+        return ids
+
+    def movies(self, count, genre_ids, cast_ids, cast_per_movie=4, featured=1):
+        """Insert movies with their cast links; returns the movie id range."""
+        rng = self.rng
+        genre_weights = zipf_weights(len(genre_ids))
+        cast_weights = zipf_weights(len(cast_ids), exponent=0.8) if cast_ids else None
+        first_id = last_id = None
+        for start, end in batches(count, self.batch_size):
+            with transaction.atomic():
+                created = Movie.objects.bulk_create([
+                    Movie(
+                        title=' '.join(make_word(rng) for _ in range(rng.randint(1, 4))).title(),
+                        poster='posters/seed.png',
+                        image='genres/seed.png',
+                        genre_id=rng.choices(genre_ids, cum_weights=genre_weights)[0],
+                        director=make_person(rng),
+                        year=rng.randint(1960, 2026),
+                        duration=f'{rng.randint(80, 180)} min',
+                        rating=round(min(max(rng.gauss(6.5, 1.5), 1.0), 10.0), 1),
+                        category='tv' if rng.random() < 0.3 else 'movie',
+                        is_featured=(i < featured),
+                    )
+                    for i in range(start, end)
+                ])
+                if cast_ids:
+                    links = []
+                    for movie in created:
+                        members = set(rng.choices(cast_ids, cum_weights=cast_weights, k=cast_per_movie))
+                        links.extend(MovieCast(movie_id=movie.pk, cast_id=member) for member in members)
+                    MovieCast.objects.bulk_create(links)
+            first_id = created[0].pk if first_id is None else first_id
+            last_id = created[-1].pk
+            self.log(f'movies: {end}/{count}')
+        return first_id, last_id
+
+    def users(self, count, movie_range, list_size=12, subscribed=0.4):
+        """Insert users with profiles, skewed My List rows and subscriptions.
+
+        ``bulk_create`` does not send ``post_save``, so the per-user Profile
+        handlers in signals.py never run here; profiles are inserted directly.
+        """
+        rng = self.rng
+        password = make_password('password')
+        now = timezone.now()
+        plans, plan_weights = zip(*PLANS)
+        first_movie, last_movie = movie_range
+        movie_count = last_movie - first_movie + 1
+        popularity = zipf_weights(min(movie_count, 50_000))
+        for start, end in batches(count, self.batch_size):
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(username=f'user{i}@example.com', email=f'user{i}@example.com',
+                         first_name=rng.choice(FIRST_NAMES).title(), password=password)
+                    for i in range(start, end)
+                ])
+                subscriptions, profiles, lists = [], [], []
+                for user in users:
+                    is_subscribed = rng.random() < subscribed
+                    if is_subscribed:
+                        expiry = now + datetime.timedelta(days=rng.randint(-60, 365))
+                        subscriptions.append(Subscription(
+                            user_id=user.pk, plan_name=rng.choices(plans, weights=plan_weights)[0],
+                            order_id=f'order_{user.pk}', payment_id=f'pay_{user.pk}',
+                            active=True, expiry_date=expiry,
+                        ))
+                        is_subscribed = expiry > now
+                    profiles.append(Profile(user_id=user.pk, is_subscribed=is_subscribed,
+                                            mobile=f'9{rng.randrange(10 ** 9):09d}'))
+                    size = min(int(rng.expovariate(1 / list_size)), len(popularity))
+                    picks = set(rng.choices(range(len(popularity)), cum_weights=popularity, k=size))
+                    lists.extend(MyList(user_id=user.pk, movie_id=first_movie + pick) for pick in picks)
+                Profile.objects.bulk_create(profiles)
+                Subscription.objects.bulk_create(subscriptions)
+                MyList.objects.bulk_create(lists, ignore_conflicts=True)
+            self.log(f'users: {end}/{count}')
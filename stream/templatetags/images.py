@@ -0,0 +1,18 @@
+from django import template
+from django.utils.html import format_html
+
+from stream.images import srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_src(fieldfile, sizes='100vw'):
+    """Renders ``src``, ``srcset`` and ``sizes`` attributes for an ``<img>``."""
+    if not fieldfile:
+        return ''
+    attrs = format_html('src="{}"', fieldfile.url)
+    candidates = srcset(fieldfile)
+    if candidates:
+        attrs += format_html(' srcset="{}" sizes="{}"', candidates, sizes)
+    return attrs
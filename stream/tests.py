@@ -1,3 +1,1528 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import hashlib
+import hmac
+import io
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from unittest import mock, skipUnless
+
+import requests
+from PIL import Image
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+from . import (
+    aio, caching, checks, entitlements, expiry, images, media, mylist, packaging, payment_events, payments, profiling,
+    progress, recommendations, routers, search, suggestions, views,
+)
+from .benchmark import seed_catalog, seed_view_fixtures, view_scenarios
+from .models import (
+    Cast, Genre, Movie, MovieCast, MyList, PaymentEvent, PaymentOrder, Profile, SimilarMovie, Subscription,
+    WatchProgress,
+)
+from .packaging import SEGMENT_MAX_AGE, PassthroughTranscoder, package_movie, package_root
+from .pagination import encode_cursor
+from .playback import signed_url
+from .query_audit import ALLOWED_VIEWS, audit_call
+from .razorpay_stub import RazorpayStub
+from .streaming import serve_file
+from .synthetic import CatalogGenerator
+from .views import LIST_PAGE_SIZE, SHELF_SIZE, SIMILAR_SIZE
 
 # Create your tests here.
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+# Saving titles would otherwise start recommendation refreshes in background
+# threads that outlive the tests; RecommendationTests calls refresh() itself.
+no_background_refresh = override_settings(RECOMMENDATIONS_ON_SAVE=False)
+
+
+def setUpModule():
+    no_background_refresh.enable()
+
+
+def tearDownModule():
+    no_background_refresh.disable()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    PACKAGING_ON_UPLOAD=False,
+    PACKAGING_SEGMENT_SECONDS=2,
+    PACKAGING_RENDITIONS=[
+        {'name': '720p', 'width': 1280, 'height': 720, 'bitrate': 2800},
+        {'name': '360p', 'width': 640, 'height': 360, 'bitrate': 800},
+    ],
+)
+class PackagingTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.transcoder = PassthroughTranscoder()
+        self.transcoder.bytes_per_second = 1000
+        genre = Genre.objects.create(name='Drama', image='genres/drama.png')
+        self.movie = Movie.objects.create(title='Clip', genre=genre, poster='posters/clip.png')
+        self.movie.video.save('clip.mp4', ContentFile(b'x' * 5000))
+        self.movie.refresh_from_db()
+
+    def test_writes_playlists_and_segments(self):
+        package_movie(self.movie, transcoder=self.transcoder)
+
+        self.movie.refresh_from_db()
+        self.assertEqual(self.movie.packaging_status, 'ready')
+        self.assertEqual(self.movie.packaging_progress, 100)
+        root = package_root(self.movie)
+        with open(os.path.join(root, 'master.m3u8')) as fh:
+            self.assertIn('720p/index.m3u8', fh.read())
+        self.assertEqual(sorted(os.listdir(os.path.join(root, '360p'))), [
+            'index.m3u8', 'seg_00000.ts', 'seg_00001.ts', 'seg_00002.ts',
+        ])
+
+    def test_resumes_from_existing_segments(self):
+        package_movie(self.movie, transcoder=self.transcoder)
+        os.remove(os.path.join(package_root(self.movie), '360p', 'seg_00001.ts'))
+
+        written = []
+        original = self.transcoder.write_segment
+        self.transcoder.write_segment = lambda *args: written.append(args[4]) or original(*args)
+        package_movie(self.movie, transcoder=self.transcoder)
+
+        self.assertEqual(len(written), 1)
+        self.assertTrue(written[0].endswith('seg_00001.ts.part'))
+
+    def test_background_packaging_logs_failures(self):
+        with mock.patch.object(packaging.threading, 'Thread') as thread, \
+                mock.patch('django.db.close_old_connections'), \
+                mock.patch.object(packaging, 'package_movie', side_effect=RuntimeError('boom')):
+            packaging.package_in_background(self.movie)
+            with self.assertLogs('stream.packaging', 'ERROR') as logs:
+                thread.call_args.kwargs['target']()
+            self.assertIn('RuntimeError: boom', logs.output[0])
+
+
+@skipUnless(connection.vendor == 'sqlite', "FTS5 index is SQLite only")
+class SearchTests(TestCase):
+    def setUp(self):
+        self.drama = Genre.objects.create(name='Drama', image='genres/drama.png')
+
+    def movie(self, title, genre=None, **fields):
+        return Movie.objects.create(title=title, genre=genre or self.drama, poster='posters/p.png', **fields)
+
+    def search(self, query):
+        return search.search_movie_ids(query)
+
+    def test_title_outranks_director_cast_and_genre(self):
+        harbor = Genre.objects.create(name='Harbor', image='genres/harbor.png')
+        by_genre = self.movie('Quiet Nights', genre=harbor)
+        by_cast = self.movie('Long Roads')
+        by_cast.cast_members.add(Cast.objects.create(real_name='Ann Harbor', image='cast/ann.png'))
+        by_director = self.movie('Cold Rivers', director='Joe Harbor')
+        by_title = self.movie('Harbor Lights')
+        self.assertEqual(self.search('harbor'), [by_title.pk, by_director.pk, by_cast.pk, by_genre.pk])
+
+    def test_only_the_last_token_is_a_prefix(self):
+        movie = self.movie('Harbor Lights')
+        self.assertEqual(self.search('harb'), [movie.pk])
+        self.assertEqual(self.search('lights harb'), [movie.pk])
+        self.assertEqual(self.search('harb lights'), [])
+        self.assertEqual(self.search('!!'), [])
+
+    def test_index_follows_saves_deletes_and_cast_changes(self):
+        movie = self.movie('Harbor Lights')
+        movie.title = 'Winter Lights'
+        movie.save()
+        self.assertEqual(self.search('harbor'), [])
+        self.assertEqual(self.search('winter'), [movie.pk])
+
+        self.drama.name = 'Melodrama'
+        self.drama.save()
+        self.assertEqual(self.search('melodrama'), [movie.pk])
+
+        ann = Cast.objects.create(real_name='Ann Keller', image='cast/ann.png')
+        credit = MovieCast.objects.create(movie=movie, cast=ann)
+        self.assertEqual(self.search('keller'), [movie.pk])
+        ann.real_name = 'Ann Moreau'
+        ann.save()
+        self.assertEqual(self.search('keller'), [])
+        self.assertEqual(self.search('moreau'), [movie.pk])
+        credit.delete()
+        self.assertEqual(self.search('moreau'), [])
+
+        movie.cast_members.add(ann)
+        self.assertEqual(self.search('moreau'), [movie.pk])
+        movie.cast_members.remove(ann)
+        self.assertEqual(self.search('moreau'), [])
+        ann.movie_set.add(movie)
+        self.assertEqual(self.search('moreau'), [movie.pk])
+        ann.movie_set.clear()
+        self.assertEqual(self.search('moreau'), [])
+        movie.cast_members.add(ann)
+        movie.cast_members.clear()
+        self.assertEqual(self.search('moreau'), [])
+
+        movie.delete()
+        self.assertEqual(self.search('winter'), [])
+
+    def test_backend_follows_overridden_setting(self):
+        self.assertIsInstance(search.get_backend(), search.SqliteFTSBackend)
+        with override_settings(SEARCH_BACKEND='stream.search.ORMSearchBackend'):
+            self.assertNotIsInstance(search.get_backend(), search.SqliteFTSBackend)
+        self.assertIsInstance(search.get_backend(), search.SqliteFTSBackend)
+
+
+class SuggestionTests(TestCase):
+    def test_heavy_prefix_lists_the_most_popular_names_first(self):
+        entries = [(f'Anna {i:03}', 'cast', i) for i in range(200)] + [('Bob Annan', 'director', 500)]
+        index = suggestions.SuggestionIndex(entries, limit=6)
+        self.assertIn('an', index.heavy_prefixes)
+        self.assertEqual(index.suggest('An'), ['Bob Annan'] + [f'Anna {i:03}' for i in range(199, 194, -1)])
+        self.assertEqual(index.suggest('anna 01', limit=3), ['Anna 019', 'Anna 018', 'Anna 017'])
+
+    def test_typos_fall_back_to_trigram_similarity(self):
+        index = suggestions.SuggestionIndex([
+            ('Christopher Nolan', 'director', 3), ('Christian Bale', 'cast', 5), ('Comedy', 'genre', 9),
+        ])
+        self.assertEqual(index.suggest('christpher nolan'), ['Christopher Nolan'])
+        self.assertEqual(index.suggest('zzzz'), [])
+
+    def test_warm_index_answers_without_queries(self):
+        drama = Genre.objects.create(name='Drama', image='genres/drama.png')
+        for title, director in (('One', 'Greta Gerwig'), ('Two', 'Greta Gerwig'), ('Three', 'Greg Mottola')):
+            Movie.objects.create(title=title, genre=drama, director=director, poster='posters/p.png')
+        suggestions.invalidate()
+        suggestions.get_index()
+        with self.assertNumQueries(0):
+            self.assertEqual(suggestions.get_index().suggest('gre'), ['Greta Gerwig', 'Greg Mottola'])
+
+
+class GenreShelfTests(TestCase):
+    # Budgets: query counts are exact, page size may not grow with the catalog.
+    MOVIES_PAGE_QUERIES = 2
+    SHELF_PAGE_QUERIES = 1
+    MOVIES_PAGE_BYTES = 60_000
+
+    def setUp(self):
+        cache.clear()
+        self.genres = [Genre.objects.create(name=f'Genre {i}', image='genres/g.png') for i in range(3)]
+
+    def add_movies(self, per_genre):
+        Movie.objects.bulk_create([
+            Movie(title=f'{genre.name} title {i}', genre=genre, poster='posters/p.png', rating=i % 10)
+            for genre in self.genres
+            for i in range(per_genre)
+        ])
+        cache.clear()
+
+    def test_movies_page_is_bounded(self):
+        self.add_movies(SHELF_SIZE * 3)
+        with self.assertNumQueries(self.MOVIES_PAGE_QUERIES):
+            small = self.client.get(reverse('movies'))
+        self.assertEqual(small.content.count(b'class="movie-card'), (SHELF_SIZE + 1) * len(self.genres))
+        self.assertLess(len(small.content), self.MOVIES_PAGE_BYTES)
+
+        self.add_movies(SHELF_SIZE * 10)
+        with self.assertNumQueries(self.MOVIES_PAGE_QUERIES):
+            large = self.client.get(reverse('movies'))
+        # The extra card per genre is the "load more" button.
+        self.assertEqual(large.content.count(b'class="movie-card'), (SHELF_SIZE + 1) * len(self.genres))
+        self.assertLess(abs(len(large.content) - len(small.content)), 500)
+
+    def test_load_more_pages_through_a_genre(self):
+        self.add_movies(SHELF_SIZE + 5)
+        genre = self.genres[0]
+        url = reverse('genre_shelf', args=[genre.id])
+        with self.assertNumQueries(self.SHELF_PAGE_QUERIES):
+            response = self.client.get(url, {'offset': SHELF_SIZE})
+        self.assertEqual(response.content.count(b'href="/movies/'), 5)
+        self.assertNotIn(b'Load more', response.content)
+
+        first = self.client.get(url, {'offset': 0})
+        self.assertEqual(first.content.count(b'href="/movies/'), SHELF_SIZE)
+        self.assertIn(f'offset={SHELF_SIZE}'.encode(), first.content)
+
+    def test_catalog_version_does_not_repeat_after_the_cache_is_lost(self):
+        before = caching.catalog_version()
+        caching.bump_catalog_version()
+        cache.clear()
+        self.assertGreater(caching.catalog_version(), before + 1)
+
+    def test_shelves_expire_even_without_a_catalog_change(self):
+        with override_settings(CATALOG_CACHE_TTL=60), mock.patch.object(caching.cache, 'set') as cache_set:
+            caching.cached_shelf('test', list)
+        self.assertEqual(cache_set.call_args.args[2], 60)
+
+    def test_per_process_cache_with_several_workers_is_flagged(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem), mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+            self.assertEqual([w.id for w in checks.check_shared_cache(None)], ['stream.W001'])
+        with override_settings(CACHES=locmem), mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '1'}):
+            self.assertEqual(checks.check_shared_cache(None), [])
+
+
+class HomeShelfTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.genre = Genre.objects.create(name='Drama', image='genres/g.png')
+        self.user = User.objects.create_user('viewer@example.com', password='secret-pass-123')
+
+    def add_titles(self, count, category):
+        Movie.objects.bulk_create([
+            Movie(title=f'{category} title {i}', genre=self.genre, category=category, poster='posters/p.png', rating=i % 10)
+            for i in range(count)
+        ])
+        cache.clear()
+
+    def test_home_renders_only_the_first_shelf(self):
+        self.add_titles(SHELF_SIZE * 3, 'movie')
+        self.add_titles(SHELF_SIZE * 3, 'tv')
+        MyList.objects.create(user=self.user, movie=Movie.objects.filter(category='tv').first())
+        self.client.force_login(self.user)
+        small = self.client.get(reverse('home'))
+        self.assertEqual(small.content.count(b'class="movie-card'), SHELF_SIZE)
+        self.assertNotIn(b'tv title', small.content)
+        for url in (reverse('home_shelf', args=['tv']), reverse('my_list_shelf'), reverse('home_shelf', args=['genres'])):
+            self.assertIn(f'data-shelf-url="{url}"'.encode(), small.content)
+
+        self.add_titles(SHELF_SIZE * 10, 'movie')
+        self.add_titles(SHELF_SIZE * 10, 'tv')
+        large = self.client.get(reverse('home'))
+        self.assertLess(abs(len(large.content) - len(small.content)), 500)
+
+    def test_catalog_shelves_are_shared_and_bounded(self):
+        self.add_titles(SHELF_SIZE + 5, 'tv')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('home_shelf', args=['tv']))
+        self.assertEqual(response.content.count(b'data-movie-id='), SHELF_SIZE)
+        self.assertIn(b'See All', response.content)
+        self.assertIn('public', response['Cache-Control'])
+        again = self.client.get(reverse('home_shelf', args=['tv']), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+
+        Genre.objects.create(name='Action', image='genres/g.png')
+        genres = self.client.get(reverse('home_shelf', args=['genres'])).content
+        self.assertLess(genres.index(b'Action'), genres.index(b'Drama'))
+        self.assertEqual(self.client.get(reverse('home_shelf', args=['nope'])).status_code, 404)
+
+    def test_my_list_shelf_is_private_and_newest_first(self):
+        self.assertEqual(self.client.get(reverse('my_list_shelf')).status_code, 401)
+        self.add_titles(SHELF_SIZE + 2, 'movie')
+        movies = list(Movie.objects.order_by('id'))
+        for movie in movies:
+            MyList.objects.create(user=self.user, movie=movie)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('my_list_shelf'))
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(response.content.count(b'class="movie-card'), SHELF_SIZE)
+        self.assertLess(
+            response.content.index(movies[-1].title.encode()), response.content.index(movies[-2].title.encode()),
+        )
+        self.assertNotIn(f'>{movies[0].title}<'.encode(), response.content)
+
+
+@override_settings(STREAM_SENDFILE_HEADER=None)
+class RangeRequestTests(SimpleTestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.mp4')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(b'0123456789')
+        self.addCleanup(os.remove, self.path)
+
+    def get(self, **headers):
+        response = serve_file(RequestFactory().get('/', headers=headers), self.path)
+        self.addCleanup(response.close)
+        return response
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_ranges(self):
+        for header, content_range, body in (
+            ('bytes=2-5', 'bytes 2-5/10', b'2345'),
+            ('bytes=7-', 'bytes 7-9/10', b'789'),
+            ('bytes=8-99', 'bytes 8-9/10', b'89'),
+            ('bytes=-3', 'bytes 7-9/10', b'789'),
+            ('bytes=-50', 'bytes 0-9/10', b'0123456789'),
+        ):
+            with self.subTest(header):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response['Content-Range'], content_range)
+                self.assertEqual(response['Content-Length'], str(len(body)))
+                self.assertEqual(self.body(response), body)
+
+        # Malformed and multi-range requests get the whole file.
+        for header in ('bytes=-', 'items=0-1', 'bytes=0-1,4-5'):
+            response = self.get(Range=header)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.body(response), b'0123456789')
+
+    def test_unsatisfiable_ranges(self):
+        for header in ('bytes=10-', 'bytes=5-2', 'bytes=-0'):
+            with self.subTest(header):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */10')
+
+        open(self.path, 'wb').close()
+        for header in ('bytes=-5', 'bytes=0-'):
+            with self.subTest(header, size=0):
+                response = self.get(Range=header)
+                self.assertEqual(response.status_code, 416)
+                self.assertEqual(response['Content-Range'], 'bytes */0')
+
+    def test_if_range(self):
+        full = self.get()
+        etag, last_modified = full['ETag'], full['Last-Modified']
+        self.assertEqual(self.get(Range='bytes=0-1', If_Range=etag).status_code, 206)
+        self.assertEqual(self.get(Range='bytes=0-1', If_Range=last_modified).status_code, 206)
+        # A changed file, or a weak validator, gets the whole body instead.
+        for stale in ('"other"', f'W/{etag}', 'Thu, 01 Jan 1970 00:00:00 GMT', 'not a date'):
+            with self.subTest(stale):
+                response = self.get(Range='bytes=0-1', If_Range=stale)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.body(response), b'0123456789')
+
+    def test_conditional_get(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(If_None_Match=etag).status_code, 304)
+        self.assertEqual(self.get(If_None_Match=etag, Range='bytes=0-1').status_code, 304)
+        self.assertEqual(self.get(If_None_Match='"other"').status_code, 200)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, PACKAGING_ON_UPLOAD=False)
+class SignedPlaybackTests(TestCase):
+    def setUp(self):
+        os.makedirs(os.path.join(MEDIA_ROOT, 'videos'), exist_ok=True)
+        os.makedirs(os.path.join(MEDIA_ROOT, 'hls', '7'), exist_ok=True)
+        with open(os.path.join(MEDIA_ROOT, 'videos', 'clip.mp4'), 'wb') as fh:
+            fh.write(b'0123456789' * 100)
+        with open(os.path.join(MEDIA_ROOT, 'hls', '7', 'master.m3u8'), 'w') as fh:
+            fh.write('#EXTM3U\n')
+
+    def test_valid_link_is_served_without_queries(self):
+        url = signed_url(1, 3, 'videos/clip.mp4')
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+    def test_hls_link_covers_the_package_directory(self):
+        url = signed_url(1, 7, 'hls/7/master.m3u8')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        sibling = url.replace('master.m3u8', '720p/index.m3u8')
+        self.assertEqual(self.client.get(sibling).status_code, 404)
+
+    def test_segments_are_revalidated_after_a_repackage(self):
+        os.makedirs(os.path.join(MEDIA_ROOT, 'hls', '7', '720p'), exist_ok=True)
+        segment = os.path.join(MEDIA_ROOT, 'hls', '7', '720p', 'seg_00000.ts')
+        with open(segment, 'wb') as fh:
+            fh.write(b'old')
+        url = signed_url(1, 7, 'hls/7/720p/seg_00000.ts')
+        response = self.client.get(url)
+        self.assertIn(f'max-age={SEGMENT_MAX_AGE}', response['Cache-Control'])
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+        with open(segment, 'wb') as fh:
+            fh.write(b'repackaged')
+        revalidated = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertEqual(b''.join(revalidated.streaming_content), b'repackaged')
+
+    def test_tampered_or_expired_links_are_rejected(self):
+        url = signed_url(1, 3, 'videos/clip.mp4')
+        self.assertEqual(self.client.get(url.replace('/1-3-', '/2-3-')).status_code, 403)
+        self.assertEqual(self.client.get(url.replace('clip.mp4', 'other.mp4')).status_code, 403)
+        self.assertEqual(self.client.get(url.replace('videos/clip.mp4', 'videos/../clip.mp4')).status_code, 403)
+        self.assertEqual(self.client.get(signed_url(1, 3, 'hls/7/master.m3u8')).status_code, 403)
+        self.assertEqual(self.client.get(signed_url(1, 3, 'videos/clip.mp4', ttl=-1)).status_code, 403)
+
+
+class ContentAddressedMediaTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media_root, PACKAGING_ON_UPLOAD=False)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def png(self, color, width=400):
+        buffer = io.BytesIO()
+        Image.new('RGB', (width, width * 3 // 2), color).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def write(self, name, data):
+        path = os.path.join(self.media_root, *name.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as fh:
+            fh.write(data)
+
+    def stored_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media_root).replace(os.sep, '/')
+            for root, _, names in os.walk(self.media_root) for name in names
+        )
+
+    def test_identical_uploads_are_stored_once(self):
+        data = self.png('red')
+        genre = Genre.objects.create(name='Drama', image=SimpleUploadedFile('Screenshot_2026-02-23.PNG', data))
+        movie = Movie.objects.create(
+            title='Clip', genre=genre, poster=SimpleUploadedFile('Screenshot_2026-02-23 (1).png', data),
+        )
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        self.assertEqual(genre.image.name, f'content/{digest[:2]}/{digest}.png')
+        self.assertEqual(movie.poster.name, genre.image.name)
+        originals = [name for name in self.stored_files() if not images.is_derivative(name)]
+        self.assertEqual(originals, [genre.image.name])
+        # Variants sit next to the hashed original.
+        self.assertIn(images.derivative_name(genre.image.name, 320), self.stored_files())
+
+        other = Cast.objects.create(real_name='Someone', image=SimpleUploadedFile('a.png', self.png('blue')))
+        self.assertNotEqual(other.image.name, genre.image.name)
+
+    def test_variants_are_only_made_for_new_images(self):
+        genre = Genre.objects.create(name='Drama', image=SimpleUploadedFile('g.png', self.png('red')))
+        with mock.patch.object(images, 'encode', wraps=images.encode) as encode, \
+                mock.patch('stream.signals.generate_derivatives', wraps=images.generate_derivatives) as generate:
+            genre.name = 'Thriller'
+            genre.save()
+            generate.assert_not_called()
+            # Existing variants are reused without decoding the original.
+            self.assertEqual([width for width, _ in images.generate_derivatives(genre.image)], [160, 320])
+            encode.assert_not_called()
+
+            genre.image = SimpleUploadedFile('h.png', self.png('blue'))
+            genre.save()
+            self.assertEqual(generate.call_count, 1)
+            self.assertEqual(encode.call_count, 2)
+
+    def test_content_urls_are_immutable(self):
+        genre = Genre.objects.create(name='Drama', image=SimpleUploadedFile('g.png', self.png('red')))
+        with self.assertNumQueries(0):
+            response = self.client.get(genre.image.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), genre.image.read())
+        for directive in ('public', 'max-age=31536000', 'immutable'):
+            self.assertIn(directive, response['Cache-Control'])
+        # Variant names do not change when they are re-encoded.
+        variant = self.client.get(genre.image.storage.url(images.derivative_name(genre.image.name, 320)))
+        self.assertEqual(variant.status_code, 200)
+        self.assertNotIn('immutable', variant['Cache-Control'])
+        self.assertIn(f'max-age={media.DERIVATIVE_MAX_AGE}', variant['Cache-Control'])
+        self.assertEqual(self.client.get('/media/content/00/missing.png').status_code, 404)
+        self.assertEqual(self.client.get('/media/content/../content/x.png').status_code, 404)
+
+    def test_rehash_moves_and_deduplicates_existing_uploads(self):
+        shared, own = self.png('red'), self.png('green')
+        self.write('posters/Screenshot_1.png', shared)
+        self.write('posters/Screenshot_1.w160.webp', b'variant')
+        self.write('genres/Screenshot_1.png', shared)
+        self.write('cast/Screenshot_2.png', own)
+        # Rows as they were saved before: bulk_create skips the upload path.
+        genre = Genre.objects.bulk_create([Genre(name='Drama', slug='drama', image='genres/Screenshot_1.png')])[0]
+        Movie.objects.bulk_create([Movie(title='Clip', genre=genre, poster='posters/Screenshot_1.png')])
+        Cast.objects.bulk_create([Cast(real_name='Someone', image='cast/Screenshot_2.png')])
+
+        out = io.StringIO()
+        call_command('rehash_media', '--dry-run', stdout=out)
+        self.assertIn('Would rehash 3 files', out.getvalue())
+        self.assertEqual(Movie.objects.get().poster.name, 'posters/Screenshot_1.png')
+
+        out = io.StringIO()
+        call_command('rehash_media', stdout=out)
+        poster, image = Movie.objects.get().poster.name, Genre.objects.get().image.name
+        self.assertEqual(poster, image)
+        self.assertTrue(images.is_derivative(images.derivative_name(poster, 160)))
+        self.assertEqual(self.stored_files(), sorted([poster, Cast.objects.get().image.name]))
+        self.assertIn('into 2 content-addressed files', out.getvalue())
+        self.assertIn(f'{len(shared) / 1024:.0f}KiB saved', out.getvalue())
+        self.assertIn('1 variants of the old names', out.getvalue())
+
+        out = io.StringIO()
+        call_command('rehash_media', stdout=out)
+        self.assertIn('Nothing to rehash', out.getvalue())
+
+
+class StubGatewayMixin:
+    """Points the shared Razorpay client at a local ``RazorpayStub``."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.gateway = cls.enterClassContext(RazorpayStub(secret='secret'))
+        cls.enterClassContext(override_settings(
+            RAZORPAY_BASE_URL=cls.gateway.url, RAZORPAY_KEY_ID='rzp_test', RAZORPAY_KEY_SECRET='secret',
+        ))
+        super().setUpClass()
+
+    def setUp(self):
+        self.gateway.reset()
+        payments.reset()
+
+
+@override_settings(RAZORPAY_READ_TIMEOUT=0.2, RAZORPAY_RETRY_BACKOFF=0, RAZORPAY_BREAKER_THRESHOLD=3)
+class PaymentGatewayTests(StubGatewayMixin, TestCase):
+    def test_calls_share_one_pooled_connection(self):
+        order_ids = {payments.create_order(59900, f'receipt_{i}')['id'] for i in range(3)}
+        self.assertEqual(len(order_ids), 3)
+        self.assertEqual(len(self.gateway.connections), 1)
+        self.assertEqual(payments.latency_histograms()['order.create']['count'], 3)
+
+    def test_slow_gateway_is_cut_off_by_the_read_timeout(self):
+        self.gateway.delay = 1
+        started = time.perf_counter()
+        with self.assertRaises(payments.GatewayError):
+            payments.create_order(59900, 'receipt_slow')
+        self.assertLess(time.perf_counter() - started, 0.9)
+
+    def test_only_idempotent_calls_are_retried(self):
+        order_id = payments.create_order(59900, 'receipt_1')['id']
+        self.gateway.reset()
+        self.gateway.fail_next = 2
+        self.assertEqual(payments.fetch_order(order_id)['id'], order_id)
+        self.assertEqual(len(self.gateway.requests), 3)
+
+        self.gateway.reset()
+        self.gateway.fail_next = 1
+        with self.assertRaises(payments.GatewayError):
+            payments.create_order(59900, 'receipt_2')
+        self.assertEqual(len(self.gateway.requests), 1)
+
+    def test_breaker_fails_fast_once_open(self):
+        self.gateway.fail_next = 100
+        for _ in range(3):
+            with self.assertRaises(payments.GatewayError):
+                payments.create_order(59900, 'receipt_1')
+        with self.assertRaises(payments.GatewayUnavailable):
+            payments.create_order(59900, 'receipt_1')
+        self.assertEqual(len(self.gateway.requests), 3)
+
+    def test_non_json_error_pages_count_as_gateway_failures(self):
+        self.gateway.fail_next, self.gateway.fail_html = 100, True
+        for _ in range(3):
+            with self.assertRaises(payments.GatewayError):
+                payments.create_order(59900, 'receipt_1')
+        with self.assertRaises(payments.GatewayUnavailable):
+            payments.create_order(59900, 'receipt_1')
+
+    def test_failed_half_open_trial_with_a_gateway_error_reopens_the_breaker(self):
+        self.gateway.fail_next = 3
+        for _ in range(3):
+            with self.assertRaises(payments.GatewayError):
+                payments.create_order(59900, 'receipt_1')
+        breaker = payments.get_breaker()
+        breaker.opened_at -= breaker.cooldown
+        self.gateway.fail_next, self.gateway.fail_code = 1, 'GATEWAY_ERROR'
+        with self.assertRaises(payments.GatewayError):
+            payments.create_order(59900, 'receipt_1')
+        self.assertEqual(breaker.state, breaker.OPEN)
+        # The trial is over: after the next cooldown another one goes out.
+        breaker.opened_at -= breaker.cooldown
+        self.assertTrue(payments.create_order(59900, 'receipt_1')['id'])
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    def test_breaker_lets_one_trial_through_after_cooldown(self):
+        now = [0.0]
+        breaker = payments.CircuitBreaker(threshold=2, cooldown=10, clock=lambda: now[0])
+        breaker.failure()
+        breaker.failure()
+        self.assertFalse(breaker.allow())
+        now[0] = 10
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.failure()
+        self.assertEqual(breaker.state, breaker.OPEN)
+        now[0] = 20
+        self.assertTrue(breaker.allow())
+        breaker.success()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    def test_checkout_round_trip(self):
+        user = User.objects.create_user('payer@example.com', password='secret-pass-123')
+        self.client.force_login(user)
+        response = self.client.get(reverse('payment_page', args=['premium']))
+        order_id = response.context['order_id']
+        self.assertEqual(self.gateway.orders[order_id]['amount'], 199900)
+
+        paid = requests.post(f'{self.gateway.url}/v1/checkout/{order_id}/pay', timeout=5).json()
+        params = {
+            'order_id': paid['razorpay_order_id'],
+            'payment_id': paid['razorpay_payment_id'],
+            'signature': paid['razorpay_signature'],
+        }
+        response = self.client.get(reverse('payment_verify'), params)
+        self.assertTemplateUsed(response, 'payment_pending.html')
+        self.assertEqual(self.client.get(reverse('payment_status', args=[order_id])).json()['status'], 'created')
+
+        payment_events.process_pending()
+        self.assertEqual(self.client.get(reverse('payment_status', args=[order_id])).json()['status'], 'paid')
+        response = self.client.get(reverse('payment_verify'), params)
+        self.assertTemplateUsed(response, 'payment_success.html')
+        self.assertTrue(Subscription.objects.filter(user=user, plan_name='premium', active=True).exists())
+
+        response = self.client.get(reverse('payment_verify'), dict(params, signature='forged'))
+        self.assertTemplateUsed(response, 'payment_failed.html')
+
+    def test_views_degrade_when_the_gateway_is_down(self):
+        user = User.objects.create_user('payer@example.com', password='secret-pass-123')
+        self.client.force_login(user)
+        self.gateway.fail_next = 100
+        response = self.client.get(reverse('payment_page', args=['basic']))
+        self.assertEqual(response.status_code, 503)
+        self.assertTemplateUsed(response, 'payment_failed.html')
+
+
+WEBHOOK_SECRET = 'whsec_test'
+
+
+@override_settings(RAZORPAY_WEBHOOK_SECRET=WEBHOOK_SECRET, PAYMENT_EVENTS_INLINE=False)
+class PaymentEventTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create(username=f'payer{i}@example.com') for i in range(20)]
+        PaymentOrder.objects.bulk_create([
+            PaymentOrder(user=user, order_id=f'order_{i}', plan_name='pro' if i % 2 else 'basic', amount=59900)
+            for i, user in enumerate(self.users)
+        ])
+
+    def deliver(self, event, order_id, payment_id, event_id=None, secret=WEBHOOK_SECRET):
+        body = json.dumps({
+            'event': event,
+            'payload': {'payment': {'entity': {'id': payment_id, 'order_id': order_id}}},
+        }).encode()
+        headers = {'HTTP_X_RAZORPAY_SIGNATURE': hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()}
+        if event_id:
+            headers['HTTP_X_RAZORPAY_EVENT_ID'] = event_id
+        return self.client.post(reverse('payment_webhook'), body, content_type='application/json', **headers)
+
+    def test_webhook_only_records_the_event(self):
+        with self.assertNumQueries(1):
+            response = self.deliver('payment.captured', 'order_0', 'pay_0', event_id='evt_0')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Subscription.objects.exists())
+        self.assertEqual(self.deliver('payment.captured', 'order_0', 'pay_0', secret='wrong').status_code, 403)
+
+    def test_duplicate_and_replayed_events_are_no_ops(self):
+        for _ in range(3):
+            self.assertEqual(self.deliver('payment.captured', 'order_1', 'pay_1', event_id='evt_1').status_code, 200)
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+        self.assertEqual(payment_events.process_pending(), 1)
+        expiry = Subscription.objects.get(user=self.users[1]).expiry_date
+
+        # A different event for an already paid order changes nothing.
+        self.deliver('order.paid', 'order_1', 'pay_1', event_id='evt_2')
+        self.deliver('payment.captured', 'order_1', 'pay_1', event_id='evt_1')
+        self.assertEqual(payment_events.process_pending(), 1)
+        self.assertEqual(Subscription.objects.get(user=self.users[1]).expiry_date, expiry)
+
+    def test_batches_apply_in_constant_queries(self):
+        for i in range(len(self.users)):
+            self.deliver('payment.captured', f'order_{i}', f'pay_{i}', event_id=f'evt_{i}')
+        self.deliver('payment.failed', 'order_0', 'pay_x', event_id='evt_failed')
+        self.deliver('payment.captured', 'order_unknown', 'pay_y', event_id='evt_unknown')
+
+        with self.assertNumQueries(8):
+            self.assertEqual(payment_events.apply_batch(100), 22)
+        self.assertFalse(PaymentEvent.objects.filter(processed_at__isnull=True).exists())
+        self.assertEqual(PaymentOrder.objects.filter(status='paid').count(), 20)
+        self.assertEqual(Subscription.objects.filter(active=True).count(), 20)
+        self.assertEqual(Profile.objects.filter(is_subscribed=True).count(), 20)
+        pro = Subscription.objects.get(user=self.users[1])
+        self.assertGreater(pro.expiry_date, timezone.now() + datetime.timedelta(days=360))
+
+    def test_failed_order_can_still_be_paid(self):
+        self.deliver('payment.failed', 'order_2', 'pay_a', event_id='evt_a')
+        payment_events.process_pending()
+        self.assertEqual(PaymentOrder.objects.get(order_id='order_2').status, 'failed')
+        self.deliver('payment.captured', 'order_2', 'pay_b', event_id='evt_b')
+        payment_events.process_pending()
+        self.assertEqual(PaymentOrder.objects.get(order_id='order_2').payment_id, 'pay_b')
+        self.assertTrue(entitlements.has_active_subscription(self.users[2]))
+
+    def test_background_worker_logs_failures(self):
+        with mock.patch.object(payment_events.threading, 'Thread') as thread, \
+                mock.patch.object(payment_events, 'close_old_connections'), \
+                mock.patch.object(payment_events, 'process_pending', side_effect=RuntimeError('boom')):
+            payment_events.consume_in_background()
+            with self.assertLogs('stream.payment_events', 'ERROR') as logs:
+                thread.call_args.kwargs['target']()
+            self.assertIn('RuntimeError: boom', logs.output[0])
+
+
+class SubscriptionSweepTests(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        day = datetime.timedelta(days=1)
+        # Five expired, two current, one already swept.
+        expiries = [-5, -4, -3, -2, -1, 1, 2, -6]
+        self.users = [User.objects.create(username=f'member{i}@example.com') for i in range(len(expiries))]
+        Subscription.objects.bulk_create([
+            Subscription(user=user, plan_name='basic', order_id=f'order_{i}', payment_id=f'pay_{i}',
+                         active=i < 7, expiry_date=now + days * day)
+            for i, (user, days) in enumerate(zip(self.users, expiries))
+        ])
+        Profile.objects.filter(user__in=self.users[:7]).update(is_subscribed=True)
+
+    def test_sweep_deactivates_expired_subscriptions_in_batches(self):
+        user = self.users[0]
+        self.assertIsNotNone(entitlements.get_entitlement(user))
+        # Per batch: savepoint, SELECT, two UPDATEs, release; then one empty SELECT.
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(5 * 3 + 3):
+            counts = expiry.sweep(batch_size=2)
+        self.assertEqual(counts, {'subscriptions': 5, 'profiles': 5, 'batches': 3})
+        self.assertEqual(
+            set(Subscription.objects.filter(active=True).values_list('user_id', flat=True)),
+            {u.pk for u in self.users[5:7]},
+        )
+        self.assertEqual(Profile.objects.filter(is_subscribed=True).count(), 2)
+        self.assertIsNone(entitlements.get_entitlement(user))
+        self.assertEqual(expiry.sweep()['subscriptions'], 0)
+
+    def test_subscription_changes_invalidate_after_commit(self):
+        user = self.users[5]
+        self.assertIsNotNone(entitlements.get_entitlement(user))
+        with self.captureOnCommitCallbacks() as callbacks:
+            Subscription.objects.get(user=user).delete()
+            # Until commit, the cached entitlement is still the committed one.
+            self.assertIsNotNone(entitlements.get_entitlement(user))
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(entitlements.get_entitlement(user))
+
+    def test_sweep_uses_the_expiry_index(self):
+        for sql, plan, problems in audit_call(expiry.sweep):
+            self.assertEqual(problems, [], sql)
+        plans = [' '.join(plan) for sql, plan, _ in audit_call(expiry.sweep_batch, timezone.now(), 10)]
+        self.assertIn('stream_subscription_expiry', plans[0])
+
+
+class CategoryListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(150, genres=3, seed=1)
+        cls.genre = Genre.objects.order_by('id').first()
+
+    def walk(self, url, params, queries=1):
+        seen, pages = [], 0
+        while url:
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, params)
+            seen.extend(movie.id for movie in response.context['items'])
+            url, params, pages = response.context['next_url'], {}, pages + 1
+        return seen, pages
+
+    def test_cursor_pages_cover_the_category_once_in_order(self):
+        seen, pages = self.walk(reverse('category_list', args=['movies']), {})
+        expected = list(Movie.objects.filter(category='movie').order_by('-rating', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, -(-len(expected) // LIST_PAGE_SIZE))
+
+    def test_genre_by_id_slug_or_name(self):
+        expected = set(Movie.objects.filter(category='movie', genre=self.genre).values_list('id', flat=True))
+        url = reverse('category_list', args=['movies'])
+        for value in (str(self.genre.pk), self.genre.slug):
+            seen, _ = self.walk(url, {'genre': value}, queries=2)
+            self.assertEqual(set(seen), expected)
+        # Old links by name still resolve; the next-page links switch to the slug.
+        response = self.client.get(url, {'genre': self.genre.name})
+        self.assertIn(f'genre={self.genre.slug}', response.context['next_url'])
+        self.assertFalse(self.client.get(url, {'genre': 'no-such-genre'}).context['items'])
+
+    def test_partial_mode_returns_only_cards(self):
+        url = reverse('category_list', args=['movies'])
+        next_url = self.client.get(url).context['next_url']
+        response = self.client.get(next_url, {'partial': 1})
+        self.assertTemplateUsed(response, 'list_items.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(self.client.get(url, {'after': '!!'}).status_code, 400)
+
+    def test_malformed_cursors_are_rejected(self):
+        urls = (reverse('category_list', args=['movies']), reverse('api_movies'))
+        for values in ([None, None], ['abc', 1], [1, {'a': 1}], [True, 1], [1], 'x'):
+            for url in urls:
+                with self.subTest(values=values, url=url):
+                    self.assertEqual(self.client.get(url, {'after': encode_cursor(values)}).status_code, 400)
+
+
+class CatalogApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(120, genres=4, seed=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_field_selection_and_paging(self):
+        url = reverse('api_movies')
+        response = self.client.get(url, {'fields': 'id,title,poster', 'limit': 50, 'category': 'movie'})
+        data = response.json()
+        self.assertEqual(set(data['results'][0]), {'id', 'title', 'poster'})
+        self.assertTrue(data['results'][0]['poster'].startswith(settings.MEDIA_URL))
+
+        seen, next_url = [row['id'] for row in data['results']], data['next']
+        while next_url:
+            data = self.client.get(next_url).json()
+            seen.extend(row['id'] for row in data['results'])
+            next_url = data['next']
+        expected = Movie.objects.filter(category='movie').order_by('-rating', '-id').values_list('id', flat=True)
+        self.assertEqual(seen, list(expected))
+
+        self.assertEqual(self.client.get(url, {'fields': 'id,password'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'after': 'x'}).status_code, 400)
+
+    def test_detail_nests_cast(self):
+        movie = Movie.objects.filter(moviecast__isnull=False).first()
+        data = self.client.get(reverse('api_movie', args=[movie.pk]), {'fields': 'title,genre_slug,cast'}).json()
+        self.assertEqual(data['title'], movie.title)
+        self.assertEqual(data['genre_slug'], movie.genre.slug)
+        self.assertEqual(len(data['cast']), movie.moviecast_set.count())
+        self.assertEqual(self.client.get(reverse('api_movie', args=[0])).status_code, 404)
+
+    def test_conditional_get_answers_304_without_queries(self):
+        url = reverse('api_genres')
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('public', response['Cache-Control'])
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], etag)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).content, response.content)
+
+        genre = Genre.objects.first()
+        genre.name = 'Renamed'
+        genre.save()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+        self.assertIn('Renamed', changed.content.decode())
+
+        # A lost version counter does not bring back tags from before.
+        cache.clear()
+        self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    def test_unknown_query_parameters_are_not_cached(self):
+        url = reverse('api_genres')
+        with mock.patch.object(caching.cache, 'set', wraps=caching.cache.set) as cache_set:
+            for value in range(3):
+                response = self.client.get(url, {'fields': 'id,name', 'x': value})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.has_header('ETag'))
+            self.client.get(url, {'fields': ['id', 'name']})
+            self.client.get(url, {'fields': 'id,name'})
+        stored = [call.args[0] for call in cache_set.call_args_list if call.args[0].startswith('api:')]
+        self.assertEqual(len(stored), 1)
+
+
+class MyListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(30, genres=2, seed=3)
+        cls.movies = list(Movie.objects.order_by('id').values_list('id', flat=True))
+        cls.user = User.objects.create_user('lister@example.com', password='secret-pass-123')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def post(self, payload):
+        return self.client.post(reverse('my_list_api'), json.dumps(payload), content_type='application/json')
+
+    def test_membership_is_cached_and_invalidated(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(mylist.movie_ids(user), frozenset())
+        with self.assertNumQueries(0):
+            mylist.movie_ids(user)
+        # Invalidated once the write commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            MyList.objects.create(user=self.user, movie_id=self.movies[0])
+        with self.assertNumQueries(1):
+            self.assertEqual(mylist.movie_ids(User(pk=self.user.pk)), {self.movies[0]})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('toggle_my_list', args=[self.movies[0]]))
+        self.assertEqual(self.client.get(reverse('my_list_api')).json()['ids'], [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('toggle_my_list', args=[self.movies[1]]), HTTP_ACCEPT='application/json')
+        self.assertEqual(self.client.get(reverse('my_list_api')).json()['ids'], [self.movies[1]])
+
+    def test_toggle_and_deletes_ignore_a_stale_cached_set(self):
+        url = reverse('toggle_my_list', args=[self.movies[3]])
+        # Another process cached the list while the title was in it.
+        cache.set(mylist.CACHE_PREFIX + str(self.user.pk), mylist.pack({self.movies[3]}))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, HTTP_ACCEPT='application/json')
+        self.assertTrue(response.json()['in_list'])
+        self.assertTrue(MyList.objects.filter(user=self.user, movie_id=self.movies[3]).exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertFalse(self.client.post(url, HTTP_ACCEPT='application/json').json()['in_list'])
+        self.assertFalse(MyList.objects.filter(user=self.user).exists())
+
+        MyList.objects.create(user=self.user, movie_id=self.movies[4])
+        self.assertEqual(mylist.movie_ids(User.objects.get(pk=self.user.pk)), {self.movies[4]})
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.filter(pk=self.movies[4]).delete()
+        self.assertEqual(mylist.movie_ids(User.objects.get(pk=self.user.pk)), frozenset())
+
+    def test_detail_badge_needs_no_query_once_cached(self):
+        url = reverse('movie_detail', args=[self.movies[2]])
+        self.post({'add': [self.movies[2]]})
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertTrue(response.context['is_in_list'])
+        self.assertFalse([q for q in captured if 'stream_mylist' in q['sql']])
+
+    def test_bulk_add_and_remove(self):
+        data = self.post({'add': self.movies[:10] + [0], 'remove': []}).json()
+        self.assertEqual(data['added'], self.movies[:10])
+        self.assertEqual(data['unknown'], [0])
+        data = self.post({'add': self.movies[5:12], 'remove': self.movies[:5]}).json()
+        self.assertEqual(data['removed'], self.movies[:5])
+        self.assertEqual(self.client.get(reverse('my_list_api')).json()['ids'], self.movies[5:12])
+        self.assertEqual(MyList.objects.filter(user=self.user).count(), 7)
+
+        self.assertEqual(self.post({'add': ['x']}).status_code, 400)
+        with override_settings(MYLIST_BULK_LIMIT=3):
+            self.assertEqual(self.post({'add': self.movies[:4]}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.post({'add': self.movies[:1]}).status_code, 401)
+
+
+class SyntheticCatalogTests(TestCase):
+    def generate(self, seed, batch_size=5000):
+        generator = CatalogGenerator(seed=seed, batch_size=batch_size)
+        genre_ids = generator.genres(5)
+        generator.movies(40, genre_ids, generator.cast(15))
+        return list(Movie.objects.order_by('id').values_list(
+            'title', 'genre__name', 'director', 'year', 'rating', 'category', 'is_featured',
+        )), sorted(MovieCast.objects.values_list('movie__title', 'cast__real_name'))
+
+    def test_same_seed_same_rows(self):
+        first = self.generate(seed=7)
+        Genre.objects.all().delete()
+        Cast.objects.all().delete()
+        self.assertEqual(self.generate(seed=7), first)
+        Genre.objects.all().delete()
+        self.assertNotEqual(self.generate(seed=8), first)
+
+    def test_inserts_in_bounded_batches(self):
+        with mock.patch.object(Movie.objects, 'bulk_create', wraps=Movie.objects.bulk_create) as bulk_create:
+            self.generate(seed=0, batch_size=16)
+        self.assertEqual([len(call.args[0]) for call in bulk_create.call_args_list], [16, 16, 8])
+
+    def test_command_validates_counts_and_finishes_the_derived_tables(self):
+        for args in (['--genres', '0'], ['--movies', '0'], ['--batch-size', '0'], ['--users', '-1']):
+            with self.subTest(args), self.assertRaises(CommandError):
+                call_command('generate_catalog', *args, stdout=io.StringIO())
+        self.assertFalse(Movie.objects.exists())
+
+        call_command('generate_catalog', '--movies', '30', '--genres', '3', '--users', '5', stdout=io.StringIO())
+        self.assertEqual(Movie.objects.count(), 30)
+        self.assertEqual(SimilarMovie.objects.filter(rank=0).count(), 30)
+        movie = Movie.objects.order_by('id').first()
+        self.assertIn(movie.pk, search.search_movie_ids(movie.title, limit=30))
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(300)
+        recommendations.rebuild()
+
+    def snapshot(self):
+        return list(SimilarMovie.objects.order_by('movie_id', 'rank').values_list('movie_id', 'similar_id', 'rank'))
+
+    def test_shared_director_and_cast_rank_first(self):
+        movie = Movie.objects.order_by('id').first()
+        twin = Movie.objects.exclude(genre=movie.genre).order_by('id').first()
+        Movie.objects.filter(pk=twin.pk).update(director=movie.director, year=movie.year, rating=movie.rating)
+        MovieCast.objects.bulk_create([
+            MovieCast(movie=twin, cast_id=cast_id)
+            for cast_id in movie.moviecast_set.values_list('cast_id', flat=True)
+        ])
+        self.assertIn(movie.pk, recommendations.refresh([twin.pk]))
+        self.assertEqual(list(recommendations.similar_to(movie, 1))[0], twin)
+
+    def test_refresh_matches_a_full_rebuild(self):
+        movie, source = Movie.objects.order_by('id')[10:12]
+        Movie.objects.filter(pk=movie.pk).update(
+            genre=source.genre, director=source.director, year=source.year, rating=source.rating,
+        )
+        recommendations.refresh([movie.pk])
+        refreshed = self.snapshot()
+        recommendations.rebuild()
+        self.assertEqual(refreshed, self.snapshot())
+
+        # Deleting a title refreshes the lists that pointed at it.
+        referrers = list(SimilarMovie.objects.filter(similar=movie).values_list('movie_id', flat=True))
+        movie.delete()
+        recommendations.refresh(referrers)
+        refreshed = self.snapshot()
+        recommendations.rebuild()
+        self.assertEqual(refreshed, self.snapshot())
+
+    def test_refresh_loads_only_related_titles(self):
+        movie = Movie.objects.order_by('id')[20]
+        Movie.objects.filter(pk=movie.pk).update(year=movie.year + 3)
+        with mock.patch.object(recommendations, 'load_features', wraps=recommendations.load_features) as load:
+            recommendations.refresh([movie.pk])
+        self.assertTrue(load.call_args_list)
+        for call in load.call_args_list:
+            self.assertLess(call.args[0].count(), Movie.objects.count())
+        refreshed = self.snapshot()
+        recommendations.rebuild()
+        self.assertEqual(refreshed, self.snapshot())
+
+    def test_detail_reads_precomputed_neighbours(self):
+        movie = Movie.objects.order_by('id').first()
+        expected = list(
+            SimilarMovie.objects.filter(movie=movie).order_by('rank').values_list('similar_id', flat=True)[:SIMILAR_SIZE]
+        )
+        response = self.client.get(reverse('movie_detail', args=[movie.pk]))
+        self.assertEqual([m.pk for m in response.context['similar_movies']], expected)
+
+        # Before the first build: the best rated titles of the genre.
+        SimilarMovie.objects.all().delete()
+        response = self.client.get(reverse('movie_detail', args=[movie.pk]))
+        similar = list(response.context['similar_movies'])
+        self.assertEqual(len(similar), SIMILAR_SIZE)
+        self.assertTrue(all(m.genre_id == movie.genre_id for m in similar))
+        self.assertEqual([m.rating for m in similar], sorted((m.rating for m in similar), reverse=True))
+
+    @override_settings(RECOMMENDATIONS_REFRESH_DELAY=0.5)
+    def test_background_refresh_logs_failures_and_frees_the_worker(self):
+        with mock.patch.object(recommendations.threading, 'Thread') as thread, \
+                mock.patch.object(recommendations, 'close_old_connections'), \
+                mock.patch.object(recommendations.time, 'sleep') as sleep, \
+                mock.patch.object(recommendations, 'refresh', side_effect=RuntimeError('boom')) as refresh:
+            recommendations.refresh_in_background([1])
+            recommendations.refresh_in_background([2])  # Picked up by the worker already started.
+            self.assertEqual(thread.call_count, 1)
+            with self.assertLogs('stream.recommendations', 'ERROR') as logs:
+                thread.call_args.kwargs['target']()
+            self.assertEqual(refresh.call_args.args[0], {1, 2})
+            sleep.assert_called_with(0.5)
+            self.assertIn('RuntimeError: boom', logs.output[0])
+            recommendations.refresh_in_background([3])
+            self.assertEqual(thread.call_count, 2)
+            with self.assertLogs('stream.recommendations', 'ERROR'):
+                thread.call_args.kwargs['target']()
+
+
+@override_settings(PROGRESS_FLUSH_INLINE=False, PROGRESS_FLUSH_SECONDS=60)
+class WatchProgressTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(10, genres=2, seed=5)
+        cls.movies = list(Movie.objects.order_by('id').values_list('id', flat=True))
+        cls.user = User.objects.create_user('viewer@example.com', password='secret-pass-123')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_heartbeats_coalesce_into_one_upsert_per_slot(self):
+        start = 600_000.0  # The start of a slot.
+        for second in range(0, 60, 10):
+            progress.record(self.user.pk, self.movies[0], second, 5400, now=start + second)
+        progress.record(self.user.pk, self.movies[1], 30, 5400, now=start + 30)
+        # The slot is still open, and the next one is flushed a slot later.
+        self.assertEqual(progress.flush(now=start + 90), 0)
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(progress.flush(now=start + 120), 2)
+        self.assertEqual(len([q for q in captured if q['sql'].startswith('INSERT')]), 1)
+        self.assertEqual(
+            dict(WatchProgress.objects.values_list('movie_id', 'position')),
+            {self.movies[0]: 50, self.movies[1]: 30},
+        )
+        # Flushed slots are not written again; the last write wins.
+        self.assertEqual(progress.flush(now=start + 120), 0)
+        progress.record(self.user.pk, self.movies[0], 40, 5400, now=start + 130)
+        self.assertEqual(progress.flush(now=start + 240), 1)
+        self.assertEqual(WatchProgress.objects.get(movie_id=self.movies[0]).position, 40)
+
+    def test_endpoint_buffers_the_position(self):
+        url = reverse('watch_progress', args=[self.movies[0]])
+        self.assertEqual(self.client.post(url, {'position': 60}).status_code, 401)
+        self.client.force_login(self.user)
+        with self.assertNumQueries(3):  # Session, user and whether the title exists.
+            self.assertEqual(self.client.post(url, {'position': 60, 'duration': 5400}).status_code, 204)
+        with self.assertNumQueries(2):  # Session and user only.
+            self.assertEqual(self.client.post(url, {'position': 75.5, 'duration': 5400}).status_code, 204)
+        self.assertEqual(self.client.post(url, {'position': 'nan'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {}).status_code, 400)
+        self.assertEqual(progress.resume_position(self.user, self.movies[0]), 75.5)
+
+        unknown = reverse('watch_progress', args=[max(self.movies) + 1])
+        self.assertEqual(self.client.post(unknown, {'position': 60}).status_code, 404)
+        self.assertIsNone(cache.get(progress.value_key(self.user.pk, max(self.movies) + 1)))
+
+    def test_evicted_slot_log_is_started_again(self):
+        start = 600_000.0
+        incr, calls = progress.cache.incr, []
+
+        def evict_first(key, *args):
+            calls.append(key)
+            if len(calls) == 1:
+                progress.cache.delete(key)
+            return incr(key, *args)
+
+        with mock.patch.object(progress.cache, 'incr', side_effect=evict_first):
+            self.assertTrue(progress.record(self.user.pk, self.movies[0], 10, 5400, now=start))
+        progress.record(self.user.pk, self.movies[1], 20, 5400, now=start)
+        self.assertEqual(progress.flush(now=start + 120), 2)
+
+    def test_continue_watching_skips_finished_titles(self):
+        now = time.time()
+        progress.record(self.user.pk, self.movies[0], 100, 5400, now=now - 600)
+        progress.record(self.user.pk, self.movies[1], 5300, 5400, now=now - 600)
+        progress.record(self.user.pk, self.movies[2], 200, 5400, now=now - 300)
+        progress.flush(now=now)
+        self.assertEqual(WatchProgress.objects.filter(completed=True).count(), 1)
+        # A buffered heartbeat finishing a title hides it before the next flush.
+        progress.record(self.user.pk, self.movies[0], 5400, 5400, now=now)
+
+        shelf = progress.continue_watching(self.user, SHELF_SIZE)
+        self.assertEqual([row.movie_id for row in shelf], [self.movies[2]])
+        self.assertEqual(shelf[0].percent, 4)
+        self.assertEqual(progress.resume_position(self.user, self.movies[1]), 0)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('home'))
+        self.assertEqual([row.movie_id for row in response.context['continue_watching']], [self.movies[2]])
+
+    def test_background_flush_logs_failures(self):
+        with mock.patch.object(progress.threading, 'Thread') as thread, \
+                mock.patch.object(progress, 'close_old_connections'), \
+                mock.patch.object(progress, 'flush', side_effect=RuntimeError('boom')):
+            progress.flush_in_background()
+            with self.assertLogs('stream.progress', 'ERROR') as logs:
+                thread.call_args.kwargs['target']()
+            self.assertIn('RuntimeError: boom', logs.output[0])
+
+
+@override_settings(ROOT_URLCONF='myapp.asgi_urls')
+class AsyncViewTests(TestCase):
+    # Counts far enough that SQLite keeps at it for a long while.
+    SLOW_SQL = (
+        "WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c) "
+        "SELECT count(*) FROM (SELECT x FROM c LIMIT 1000000000)"
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(200, seed=4)
+
+    def setUp(self):
+        cache.clear()
+
+    async def test_async_views_match_the_sync_ones(self):
+        client = AsyncClient()
+        for view, query in ((views.search_api, 'dark'), (views.search_api, 'x'), (views.get_suggestions, 'ar')):
+            url = reverse(view.__name__)
+            with self.subTest(url=url, query=query):
+                response = await client.get(url, {'q': query})
+                self.assertEqual(response.status_code, 200)
+                expected = await sync_to_async(view)(RequestFactory().get(url, {'q': query}))
+                self.assertEqual(response.json(), json.loads(expected.content))
+
+    async def test_concurrent_cold_requests_build_the_suggestion_index_once(self):
+        suggestions.invalidate()
+        with mock.patch.object(suggestions, 'SuggestionIndex', wraps=suggestions.SuggestionIndex) as build:
+            indexes = await asyncio.gather(*(suggestions.aget_index() for _ in range(5)))
+        self.assertEqual(build.call_count, 1)
+        self.assertTrue(all(index is indexes[0] for index in indexes))
+
+    async def test_cancelling_interrupts_the_running_statement(self):
+        def slow():
+            with connection.cursor() as cursor:
+                cursor.execute(self.SLOW_SQL)
+                return cursor.fetchone()
+
+        task = asyncio.ensure_future(aio.interruptible(slow))
+        await asyncio.sleep(0.2)
+        started = time.perf_counter()
+        task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(await Movie.objects.acount(), 200)
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1, PROFILING_SLOW_MS=60_000, METRICS_TOKEN='scrape-token')
+class ProfilingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(50, seed=6)
+        cls.user = User.objects.create_user('viewer@example.com', password='secret-pass-123')
+        cls.staff = User.objects.create_user('ops@example.com', password='secret-pass-123', is_staff=True)
+
+    def setUp(self):
+        cache.clear()
+        profiling.reset()
+
+    def timings(self, response):
+        return dict(
+            (part.split(';', 1) + [''])[:2] for part in response['Server-Timing'].split(', ')
+        )
+
+    def test_sampled_request_gets_a_breakdown(self):
+        self.client.force_login(self.staff)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('home'))
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {'sql', 'tpl', 'cache', 'total'})
+        self.assertIn(f'desc="{len(captured)} queries"', timings['sql'])
+        self.assertRegex(timings['cache'], r'desc="\d+ hits / [1-9]\d* misses"')
+        self.assertGreater(float(timings['tpl'].removeprefix('dur=')), 0)
+
+        with override_settings(PROFILING_SAMPLE_RATE=0):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('home')))
+
+    def test_breakdown_is_only_shown_to_staff(self):
+        self.assertNotIn('Server-Timing', self.client.get(reverse('home')))
+        self.client.force_login(self.user)
+        self.assertNotIn('Server-Timing', self.client.get(reverse('home')))
+        with override_settings(DEBUG=True):
+            self.assertIn('Server-Timing', self.client.get(reverse('home')))
+        # The breakdown is still recorded for /metrics.
+        text = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token').content.decode()
+        self.assertIn('http_request_sql_seconds_count{route="home"} 3', text)
+
+    @override_settings(ROOT_URLCONF='myapp.asgi_urls', DEBUG=True)
+    async def test_async_views_count_queries_from_their_threads(self):
+        response = await AsyncClient().get(reverse('search_api'), {'q': 'dark'})
+        self.assertRegex(self.timings(response)['sql'], r'desc="[1-9]\d* queries"')
+
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with override_settings(PROFILING_SLOW_MS=0), self.assertLogs('stream.profiling', 'WARNING') as logs:
+            self.client.get(reverse('movies'))
+        self.assertIn('Slow request GET /movies/ (movies)', logs.output[0])
+        self.assertIn('SELECT', logs.output[0])
+
+    def test_metrics_exposes_route_histograms(self):
+        with override_settings(PROFILING_SAMPLE_RATE=0):
+            self.client.get(reverse('movies'))
+            self.client.get(reverse('movies'))
+        self.client.get('/no-such-page/')
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        text = response.content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{route="movies",le="+Inf"} 2', text)
+        self.assertIn('http_request_duration_seconds_count{route="movies"} 2', text)
+        self.assertIn('http_requests_total{route="movies",method="GET",status="200"} 2', text)
+        self.assertIn('http_requests_total{route="<unmatched>",method="GET",status="404"} 1', text)
+        # Only the sampled 404 was broken down.
+        self.assertNotIn('http_request_sql_seconds_count{route="movies"}', text)
+        self.assertIn('http_request_sql_seconds_count{route="<unmatched>"} 1', text)
+        self.assertIn('app_events_total{event="', text)
+
+    def test_metrics_are_not_public(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer scrape-token').status_code, 200)
+        with override_settings(METRICS_TOKEN=None):
+            # Not even to loopback clients: behind a proxy, that is everyone.
+            self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 403)
+            self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+
+class DatabaseRoutingTests(SimpleTestCase):
+    # Outside TestCase's transaction, which pins every read to the primary.
+    databases = {'default'}
+
+    def setUp(self):
+        routers._state.set(None)
+        self.router = routers.ReadReplicaRouter()
+
+    def respond(self, request, writes=False):
+        def view(request):
+            self.routed = self.router.db_for_read(Movie)
+            if writes:
+                self.router.db_for_write(Movie)
+            return HttpResponse()
+        return routers.StickyPrimaryMiddleware(view)(request)
+
+    @override_settings(DATABASE_READ_ALIAS=None)
+    def test_without_read_alias_everything_uses_default(self):
+        self.assertIsNone(self.router.db_for_read(Movie))
+        response = self.respond(RequestFactory().get('/'), writes=True)
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+    @override_settings(DATABASE_READ_ALIAS='replica')
+    def test_reads_stick_to_primary_after_a_write(self):
+        self.assertEqual(self.router.db_for_read(Movie), 'replica')
+        self.router.db_for_write(Movie)
+        self.assertIsNone(self.router.db_for_read(Movie))
+
+    @override_settings(DATABASE_READ_ALIAS='replica', DATABASE_STICKY_SECONDS=5)
+    def test_sticky_cookie_pins_the_next_requests(self):
+        factory = RequestFactory()
+        response = self.respond(factory.get('/'))
+        self.assertEqual(self.routed, 'replica')
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+        response = self.respond(factory.get('/my-list/'), writes=True)
+        self.assertEqual(response.cookies[routers.STICKY_COOKIE]['max-age'], 5)
+
+        request = factory.get('/')
+        request.COOKIES[routers.STICKY_COOKIE] = '1'
+        self.respond(request)
+        self.assertIsNone(self.routed)
+
+        self.respond(factory.post('/'))
+        self.assertIsNone(self.routed)
+        # The request's state does not leak into the thread afterwards.
+        self.assertEqual(self.router.db_for_read(Movie), 'replica')
+
+    @skipUnless(settings.SQLITE_PRAGMAS and connection.vendor == 'sqlite', "SQLite tuning disabled")
+    def test_connection_pragmas(self):
+        with connection.cursor() as cursor:
+            for name in ('busy_timeout', 'cache_size'):
+                cursor.execute(f'PRAGMA {name}')
+                self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS[name])
+
+
+PERF_BUDGETS = os.path.join(os.path.dirname(__file__), 'perf_budgets.json')
+PERF_REPORT = os.getenv('PERF_REPORT')
+PERF_CATALOG_SIZE = int(os.getenv('PERF_CATALOG_SIZE', '2000'))
+# Wall time is noisy on shared runners, so it gets a much looser bound than
+# query counts (exact) and response size.
+PERF_TIME_TOLERANCE = float(os.getenv('PERF_TIME_TOLERANCE', '5'))
+PERF_TIME_FLOOR_MS = 25
+PERF_BYTES_TOLERANCE = 1.10
+PERF_RUNS = 3
+
+
+class ViewBudgetTests(StubGatewayMixin, TestCase):
+    """Hits every route in stream/urls.py against a synthetic catalog and
+    compares SQL queries, wall time and response bytes with perf_budgets.json.
+
+    Run with PERF_UPDATE_BUDGETS=1 to accept new query counts and sizes as
+    budgets, or PERF_UPDATE_BUDGETS=all to also re-record timings. Set
+    PERF_REPORT to a path to also get the measurements as JSON.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.movie, cls.user = seed_view_fixtures(PERF_CATALOG_SIZE)
+
+    def scenarios(self):
+        return view_scenarios(self.movie)
+
+    def measure(self, method, url, data, logged_in):
+        samples, queries, size, status = [], 0, 0, None
+        for _ in range(PERF_RUNS):
+            cache.clear()
+            entitlements.local.clear()
+            self.client.logout()
+            if logged_in:
+                self.client.force_login(self.user)
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = getattr(self.client, method)(url, data)
+                if response.streaming:
+                    size = sum(len(chunk) for chunk in response.streaming_content)
+                else:
+                    size = len(response.content)
+                samples.append((time.perf_counter() - started) * 1000)
+            queries, status = len(captured), response.status_code
+        return {
+            'status': status,
+            'queries': queries,
+            'ms': round(statistics.median(samples), 2),
+            'bytes': size,
+        }
+
+    def test_every_route_has_a_scenario(self):
+        routes = {
+            pattern.name for pattern in get_resolver('stream.urls').url_patterns if pattern.name
+        }
+        self.assertEqual(routes, {name for name, *_ in self.scenarios()})
+
+    def test_query_plans_use_indexes(self):
+        flagged = []
+        for name, method, url, data, logged_in in self.scenarios():
+            if name in ALLOWED_VIEWS:
+                continue
+            cache.clear()
+            entitlements.local.clear()
+            self.client.logout()
+            if logged_in:
+                self.client.force_login(self.user)
+            for sql, plan, problems in audit_call(getattr(self.client, method), url, data):
+                if problems:
+                    flagged.append(f"{name}: {'; '.join(problems)} <- {sql[:200]}")
+        self.assertEqual(flagged, [])
+
+    def test_allowed_tables_do_not_exempt_what_they_are_joined_to(self):
+        def scan():
+            return list(Movie.objects.filter(title__contains='x').select_related('genre'))
+
+        [(sql, plan, problems)] = audit_call(scan)
+        self.assertIn('stream_genre', sql)
+        self.assertTrue(any(problem.startswith('SCAN stream_movie') for problem in problems), plan)
+        [(_, plan, problems)] = audit_call(lambda: list(Genre.objects.order_by('name')))
+        self.assertEqual(problems, [], plan)
+
+    def test_views_within_budget(self):
+        with open(PERF_BUDGETS) as fh:
+            budgets = json.load(fh)
+
+        report, failures = {}, []
+        for name, method, url, data, logged_in in self.scenarios():
+            result = self.measure(method, url, data, logged_in)
+            budget = budgets.get(name)
+            report[name] = dict(result, budget=budget)
+            if budget is None:
+                failures.append(f'{name}: no budget')
+                continue
+            if result['status'] != budget['status']:
+                failures.append(f"{name}: status {result['status']} != {budget['status']}")
+            if result['queries'] > budget['queries']:
+                failures.append(f"{name}: {result['queries']} queries > budget {budget['queries']}")
+            if result['bytes'] > budget['bytes'] * PERF_BYTES_TOLERANCE:
+                failures.append(f"{name}: {result['bytes']} bytes > budget {budget['bytes']}")
+            time_limit = max(budget['ms'] * PERF_TIME_TOLERANCE, budget['ms'] + PERF_TIME_FLOOR_MS)
+            if result['ms'] > time_limit:
+                failures.append(f"{name}: {result['ms']}ms > budget {budget['ms']}ms x{PERF_TIME_TOLERANCE}")
+
+        if PERF_REPORT:
+            with open(PERF_REPORT, 'w') as fh:
+                json.dump({'catalog_size': PERF_CATALOG_SIZE, 'views': report}, fh, indent=2, sort_keys=True)
+        update = os.getenv('PERF_UPDATE_BUDGETS')
+        if update:
+            for name, result in report.items():
+                measured = {k: v for k, v in result.items() if k != 'budget'}
+                previous = budgets.get(name)
+                # Timings alone are too noisy to rewrite on every run.
+                if update == 'all' or not previous or any(
+                    measured[key] != previous[key] for key in ('status', 'queries', 'bytes')
+                ):
+                    budgets[name] = measured
+            with open(PERF_BUDGETS, 'w') as fh:
+                json.dump(budgets, fh, indent=2, sort_keys=True)
+                fh.write('\n')
+            return
+        self.assertFalse(failures, '\n'.join(failures))
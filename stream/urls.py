@@ -4,24 +4,38 @@ from .views import (home, register_view,movie_detail,movies_page,
                    login_view,logout_view,profile_view,subscription,
                    create_subscription_order, payment_verify,
                    payment_page,search_api,get_suggestions,
-                   category_list,play_movie,my_list,
-                   toggle_my_list,Tv_shows,genre,
+                   category_list,play_movie,stream_video,hls_file,my_list,
+                   toggle_my_list,watch_progress,Tv_shows,genre,genre_shelf,
+                   home_shelf,my_list_shelf,
+                   payment_status,payment_webhook,
+                   api_movies,api_movie,api_genres,api_cast,my_list_api,
                    )
 
 
 urlpatterns = [
     path("", home, name="home"),
+    path("home/shelves/my-list/", my_list_shelf, name="my_list_shelf"),
+    path("home/shelves/<slug:shelf>/", home_shelf, name="home_shelf"),
     path("movies/", movies_page, name="movies"),
     path("movies/<int:pk>/", movie_detail, name="movie_detail"),
+    path("genres/<int:genre_id>/shelf/", genre_shelf, name="genre_shelf"),
     path("category/<str:category_name>/", category_list, name="category_list"),
     path("tv-shows/", Tv_shows, name="tv_shows"),
     path('api/search/', search_api, name='search_api'),
     path('api/suggestions/', get_suggestions, name='get_suggestions'),
+    path('api/v1/movies/', api_movies, name='api_movies'),
+    path('api/v1/movies/<int:pk>/', api_movie, name='api_movie'),
+    path('api/v1/genres/', api_genres, name='api_genres'),
+    path('api/v1/cast/', api_cast, name='api_cast'),
     path('play/<int:movie_id>/', play_movie, name='play_movie'),
+    path('stream/<int:movie_id>/', stream_video, name='stream_video'),
+    path('stream/<int:movie_id>/hls/<path:path>', hls_file, name='hls_file'),
 
     path("genres/", genre, name="genres"),
     path("my-list/", my_list, name="my_list"),
     path('toggle_my_list/<int:movie_id>/', toggle_my_list, name='toggle_my_list'),
+    path('progress/<int:movie_id>/', watch_progress, name='watch_progress'),
+    path('api/my-list/', my_list_api, name='my_list_api'),
     
     path("register/", register_view, name="register"),
     path("login/", login_view, name="login"),
@@ -32,4 +46,6 @@ urlpatterns = [
     path("payment_page/<str:plan_name>/", payment_page, name="payment_page"),
     path("create_subscription_order/", create_subscription_order, name="create_subscription_order"),
     path("payment-verify/", payment_verify, name="payment_verify"),
+    path("payment-status/<str:order_id>/", payment_status, name="payment_status"),
+    path("payments/webhook/", payment_webhook, name="payment_webhook"),
 ]
\ No newline at end of file
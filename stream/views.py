@@ -5,67 +5,248 @@ from django.contrib import messages
 import requests
 from django.conf import settings
 from django.core.files.base import ContentFile
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import Q, Prefetch
 from django.http import JsonResponse
-from .models import Profile,Movie,Genre,Cast,MyList,Subscription
+from .models import Profile,Movie,Genre,Cast,MyList,Subscription,PaymentOrder
 from django.core.paginator import Paginator
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
-import razorpay
 from django.core.cache import cache
 from .forms import RegisterForm
 from django.views.decorators.http import require_POST
 import datetime
 from django.utils import timezone
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed
+from django.views.decorators.csrf import csrf_exempt
+from .streaming import serve_file
+from .search import asearch_movie_ids, search_movie_ids
+from .suggestions import aget_index as aget_suggestion_index, get_index as get_suggestion_index
+from .caching import cache_anonymous_page, cache_stats, cached_shelf, conditional_catalog_get
+from .entitlements import get_entitlement, has_active_subscription
+from .playback import playback_urls
+from .pagination import InvalidCursor, keyset_page
+from . import catalog_api, mylist, payments, payment_events, profiling, progress, recommendations
+from .packaging import package_root, PLAYLIST_CONTENT_TYPE, SEGMENT_CONTENT_TYPE, SEGMENT_MAX_AGE
+from django.utils.cache import patch_cache_control
+import hmac
+import json
+import os
+import re
+from urllib.parse import urlencode
 
 
 # Create your views here.
 
-def home(request):
-    featured = Movie.objects.filter(is_featured=True).first()
-    is_in_list = False
-    if request.user.is_authenticated and featured:
-        is_in_list = MyList.objects.filter(user=request.user, movie=featured).exists()
+SHELF_SIZE = 20
+SHELF_ORDER = ('-rating', '-id')  # Matches the (genre, rating, id) index.
+CARD_FIELDS = ('id', 'title', 'poster', 'year', 'rating', 'genre_id')
+HOME_CARD_FIELDS = CARD_FIELDS + ('duration', 'category')
+
+
+def build_home_shelves():
+    # One extra row tells the template whether to link to the full list.
+    movies = list(
+        Movie.objects.filter(category='movie').only(*HOME_CARD_FIELDS).order_by(*SHELF_ORDER)[:SHELF_SIZE + 1]
+    )
+    return {
+        'featured': Movie.objects.filter(is_featured=True).first(),
+        'movies': movies[:SHELF_SIZE],
+        'movies_has_more': len(movies) > SHELF_SIZE,
+    }
 
-    movies = Movie.objects.filter(category='movie')
-    tv_shows = Movie.objects.filter(category='tv')
 
-    my_list = []
+@cache_anonymous_page
+def home(request):
+    """The hero and the first shelf; the page fetches the other shelves from
+    home_shelf and my_list_shelf as they scroll into view."""
+    shelves = cached_shelf('home', build_home_shelves)
+    featured = shelves['featured']
+    list_movie_ids = mylist.movie_ids(request.user)
+    is_in_list = featured is not None and featured.id in list_movie_ids
+
+    continue_watching = []
+    lazy_shelves = [('tv', "TV Shows", reverse('home_shelf', args=['tv']))]
     if request.user.is_authenticated:
-        my_list = MyList.objects.filter(user=request.user).select_related('movie')
+        continue_watching = progress.continue_watching(request.user, SHELF_SIZE)
+        lazy_shelves.append(('mylist', "My List", reverse('my_list_shelf')))
+    lazy_shelves.append(('genres', "Genres", reverse('home_shelf', args=['genres'])))
 
     context = {
         'featured': featured,
-        'movies': movies,
-        'tv_shows': tv_shows,
-        "my_list": my_list,
+        'movies': shelves['movies'],
+        'movies_has_more': shelves['movies_has_more'],
+        'continue_watching': continue_watching,
         'is_in_list': is_in_list, # This now refers to the featured movie
-        'genres': Genre.objects.all(),
+        'lazy_shelves': lazy_shelves,
+        # For the badges on lazily loaded shelves.
+        'list_movie_ids': sorted(list_movie_ids),
     }
     return render(request, 'home.html', context)
 
 
+def build_tv_shelf():
+    shows = list(
+        Movie.objects.filter(category='tv').only(*HOME_CARD_FIELDS).order_by(*SHELF_ORDER)[:SHELF_SIZE + 1]
+    )
+    return {'movies': shows[:SHELF_SIZE], 'has_more': len(shows) > SHELF_SIZE}
+
+
+def build_genres_shelf():
+    genres = list(Genre.objects.order_by('name')[:SHELF_SIZE + 1])
+    return {'genres': genres[:SHELF_SIZE], 'has_more': len(genres) > SHELF_SIZE}
+
+
+# Home page shelves that depend only on the catalog: (builder, empty message).
+HOME_SHELVES = {
+    'tv': (build_tv_shelf, "No TV shows yet."),
+    'genres': (build_genres_shelf, "No genres yet."),
+}
+
+
+@conditional_catalog_get(max_age=60)
+def home_shelf(request, shelf):
+    """A catalog-only home page shelf as an HTML fragment, the same for every
+    user; the page adds the My List badges."""
+    if shelf not in HOME_SHELVES:
+        raise Http404("Unknown shelf.")
+    builder, empty_message = HOME_SHELVES[shelf]
+    context = {'shelf': shelf, 'empty_message': empty_message, **cached_shelf(f'home:{shelf}', builder)}
+    return render(request, 'home_shelf.html', context)
+
+
+def my_list_shelf(request):
+    """The home page's My List shelf as an HTML fragment."""
+    if not request.user.is_authenticated:
+        return HttpResponse(status=401)
+    items = list(
+        MyList.objects.filter(user=request.user).select_related('movie')
+        .only('movie', *(f'movie__{field}' for field in HOME_CARD_FIELDS)).order_by('-id')[:SHELF_SIZE + 1]
+    )
+    context = {
+        'shelf': 'mylist',
+        'empty_message': "Your list is empty.",
+        'movies': [item.movie for item in items[:SHELF_SIZE]],
+        'has_more': len(items) > SHELF_SIZE,
+    }
+    response = render(request, 'home_shelf.html', context)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def build_genre_shelves():
+    # One extra row per genre tells the template whether to offer "load more".
+    shelf = Movie.objects.only(*CARD_FIELDS).order_by(*SHELF_ORDER)[:SHELF_SIZE + 1]
+    genres = list(Genre.objects.prefetch_related(Prefetch('movie_set', queryset=shelf, to_attr='shelf')))
+    for genre in genres:
+        genre.has_more = len(genre.shelf) > SHELF_SIZE
+        genre.shelf = genre.shelf[:SHELF_SIZE]
+    return genres
+
+
+@cache_anonymous_page
 def movies_page(request):
-    genres = Genre.objects.prefetch_related('movie_set')
+    genres = cached_shelf('movies_page', build_genre_shelves)
 
     context = {
-        'genres': genres
+        'genres': genres,
+        'next_offset': SHELF_SIZE,
     }
     return render(request, 'movies.html', context)
 
+
+def genre_shelf(request, genre_id):
+    """Next page of cards for one genre shelf, as an HTML fragment."""
+    try:
+        offset = max(int(request.GET.get('offset', SHELF_SIZE)), 0)
+    except ValueError:
+        offset = SHELF_SIZE
+    movies = list(
+        Movie.objects.filter(genre_id=genre_id).only(*CARD_FIELDS)
+        .order_by(*SHELF_ORDER)[offset:offset + SHELF_SIZE + 1]
+    )
+    context = {
+        'genre_id': genre_id,
+        'movies': movies[:SHELF_SIZE],
+        'has_more': len(movies) > SHELF_SIZE,
+        'next_offset': offset + SHELF_SIZE,
+    }
+    return render(request, 'genre_shelf_items.html', context)
+
 @login_required(login_url='login')
 def play_movie(request, movie_id):
     movie = get_object_or_404(Movie, id=movie_id)
-    subscription = Subscription.objects.filter(user=request.user, active=True).first()
-    if not subscription or subscription.expiry_date < timezone.now():
-        user_profile = request.user.profile
-        if user_profile.is_subscribed:
-            user_profile.is_subscribed = False
-            user_profile.save()
-            
+    if not has_active_subscription(request.user):
         messages.warning(request, "Please subscribe to a plan to watch this movie.")
         return redirect('subscription')
 
-    return render(request, 'play_movie.html', {'movie': movie})
+    context = {
+        'movie': movie,
+        'playback': playback_urls(request.user, movie),
+        'resume_at': progress.resume_position(request.user, movie.id),
+        'heartbeat_seconds': settings.PROGRESS_HEARTBEAT_SECONDS,
+    }
+    return render(request, 'play_movie.html', context)
+
+
+@require_POST
+def watch_progress(request, movie_id):
+    """Player heartbeat: ``position`` (and ``duration``) in seconds, as form
+    fields so ``navigator.sendBeacon`` can post them. Only the cache is
+    touched; see stream/progress.py."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': "Login required."}, status=401)
+    try:
+        position = float(request.POST['position'])
+        duration = float(request.POST['duration']) if request.POST.get('duration') else None
+    except (KeyError, ValueError):
+        return JsonResponse({'error': "Expected a numeric position."}, status=400)
+    if not 0 <= position < float('inf') or (duration is not None and not 0 < duration < float('inf')):
+        return JsonResponse({'error': "Expected a numeric position."}, status=400)
+    if not progress.movie_exists(movie_id):
+        return JsonResponse({'error': "Unknown title."}, status=404)
+
+    if progress.record(request.user.pk, movie_id, position, duration) and settings.PROGRESS_FLUSH_INLINE:
+        progress.flush_in_background()
+    return HttpResponse(status=204)
+
+
+@login_required(login_url='login')
+def stream_video(request, movie_id):
+    movie = get_object_or_404(Movie, id=movie_id)
+    if not movie.video:
+        raise Http404("No video for this title.")
+
+    if not has_active_subscription(request.user):
+        return HttpResponseForbidden("An active subscription is required.")
+
+    return serve_file(request, movie.video.path)
+
+
+HLS_PATH_RE = re.compile(r'^(?:master\.m3u8|[\w-]+/index\.m3u8|[\w-]+/seg_\d+\.ts)$')
+
+
+@login_required(login_url='login')
+def hls_file(request, movie_id, path):
+    if not HLS_PATH_RE.match(path):
+        raise Http404("Unknown stream file.")
+    movie = get_object_or_404(Movie, id=movie_id)
+    if not movie.has_hls:
+        raise Http404("This title has not been packaged yet.")
+    if not has_active_subscription(request.user):
+        return HttpResponseForbidden("An active subscription is required.")
+
+    full_path = os.path.join(package_root(movie), *path.split('/'))
+    if not os.path.exists(full_path):
+        raise Http404("Unknown stream file.")
+
+    if path.endswith('.ts'):
+        response = serve_file(request, full_path, SEGMENT_CONTENT_TYPE)
+        patch_cache_control(response, private=True, max_age=SEGMENT_MAX_AGE)
+    else:
+        response = serve_file(request, full_path, PLAYLIST_CONTENT_TYPE)
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 def Tv_shows(request):
     return render(request, 'tv_shows.html',)
@@ -78,17 +259,22 @@ def genre(request):
     return render(request, 'genre.html',context)
 
 
+SIMILAR_SIZE = 6
+
+
 def movie_detail(request, pk):
-    movie = get_object_or_404(Movie, pk=pk)
-    cast_list = movie.moviecast_set.all() 
+    movie = get_object_or_404(Movie.objects.select_related('genre'), pk=pk)
+    cast_list = movie.moviecast_set.select_related('cast')
     
-    similar_movies = Movie.objects.filter(
-        genre=movie.genre
-    ).exclude(id=movie.id)[:6]  
+    similar_movies = list(recommendations.similar_to(movie, SIMILAR_SIZE).only(*CARD_FIELDS))
+    if not similar_movies:
+        # Not built yet: the best rated titles of the same genre.
+        similar_movies = (
+            Movie.objects.filter(genre_id=movie.genre_id).exclude(id=movie.id)
+            .only(*CARD_FIELDS).order_by(*SHELF_ORDER)[:SIMILAR_SIZE]
+        )
 
-    is_in_list = False
-    if request.user.is_authenticated:
-        is_in_list = MyList.objects.filter(user=request.user, movie=movie).exists()
+    is_in_list = movie.id in mylist.movie_ids(request.user)
 
     context = {
         'movie': movie, 
@@ -99,17 +285,47 @@ def movie_detail(request, pk):
     return render(request, 'detail.html', context)
 
 
+LIST_PAGE_SIZE = 48
+LIST_ORDER = ('-rating', '-id')
+
+
+def resolve_genre(value):
+    """Genre for a ``?genre=`` value: an id, a slug, or (old links) a name."""
+    if not value:
+        return None
+    if value.isdigit():
+        return Genre.objects.filter(pk=value).first()
+    return Genre.objects.filter(slug=value).first() or Genre.objects.filter(name=value).first()
+
+
 def category_list(request, category_name):
+    """Keyset-paginated grid; ``?partial=1`` returns just the next page of cards."""
     db_category = 'movie' if category_name == 'movies' else 'tv'
-    genre_name = request.GET.get('genre')
-    items = Movie.objects.filter(category=db_category)
-    if genre_name:
-        items = items.filter(genre__name=genre_name)
-    display_title = "Movies" if db_category == 'movie' else "TV Shows"
-    return render(request, 'list.html', {
+    genre_param = request.GET.get('genre', '')
+    items = Movie.objects.filter(category=db_category).only(*CARD_FIELDS)
+    genre = resolve_genre(genre_param)
+    if genre_param:
+        items = items.filter(genre_id=genre.pk if genre else None)
+    try:
+        items, next_cursor = keyset_page(items, LIST_ORDER, request.GET.get('after'), LIST_PAGE_SIZE)
+    except InvalidCursor:
+        return HttpResponseBadRequest("Invalid cursor.")
+
+    next_url = None
+    if next_cursor:
+        params = {'after': next_cursor}
+        if genre:
+            params['genre'] = genre.slug
+        next_url = f"{request.path}?{urlencode(params)}"
+    context = {
         'items': items,
-        'display_title': display_title,
-    })
+        'genre': genre,
+        'next_url': next_url,
+        'display_title': "Movies" if db_category == 'movie' else "TV Shows",
+    }
+    if request.GET.get('partial'):
+        return render(request, 'list_items.html', context)
+    return render(request, 'list.html', context)
 
 
 @login_required
@@ -123,53 +339,187 @@ def my_list(request):
 @login_required
 @require_POST
 def toggle_my_list(request, movie_id):
-    movie = get_object_or_404(Movie, id=movie_id)
-    obj = MyList.objects.filter(user=request.user, movie=movie)
-
-    if obj.exists():
-        obj.delete()
-        messages.info(request, f"Removed {movie.title} from your list.")
+    title = Movie.objects.filter(id=movie_id).values_list('title', flat=True).first()
+    if title is None:
+        raise Http404("No such movie.")
+    # Decided by the database: the cached set may be stale in this process.
+    with transaction.atomic():
+        removed, _ = MyList.objects.filter(user=request.user, movie_id=movie_id).delete()
+        added = not removed
+        if added:
+            MyList.objects.bulk_create([MyList(user=request.user, movie_id=movie_id)], ignore_conflicts=True)
+        transaction.on_commit(lambda: mylist.forget(request.user))
+
+    if request.accepts('application/json') and not request.accepts('text/html'):
+        return JsonResponse({'movie_id': movie_id, 'in_list': added})
+    if added:
+        messages.success(request, f"Added {title} to your list.")
     else:
-        MyList.objects.create(user=request.user, movie=movie)
-        messages.success(request, f"Added {movie.title} to your list.")
-
+        messages.info(request, f"Removed {title} from your list.")
     return redirect(request.META.get('HTTP_REFERER', 'home'))
 
 
+def my_list_api(request):
+    """GET: ids in the user's list. POST ``{"add": [...], "remove": [...]}``: bulk edit."""
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': "Login required."}, status=401)
+    if request.method == 'GET':
+        return JsonResponse({'ids': sorted(mylist.movie_ids(request.user))})
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['GET', 'POST'])
+
+    try:
+        payload = json.loads(request.body)
+        add = [int(movie_id) for movie_id in payload.get('add', [])]
+        remove = [int(movie_id) for movie_id in payload.get('remove', [])]
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': "Expected {\"add\": [ids], \"remove\": [ids]}."}, status=400)
+    if len(add) + len(remove) > settings.MYLIST_BULK_LIMIT:
+        return JsonResponse({'error': f"At most {settings.MYLIST_BULK_LIMIT} ids per request."}, status=400)
+
+    added, removed, unknown = mylist.bulk_update(request.user, add=add, remove=remove)
+    return JsonResponse({'added': added, 'removed': removed, 'unknown': unknown})
+
+
+def search_results(movie_ids, movies):
+    """search_api's payload: ``movies`` rows by id, in ``movie_ids`` order."""
+    results = []
+    for movie_id in movie_ids:
+        movie = movies.get(movie_id)
+        if movie is None:
+            continue
+        results.append({
+            'Title': movie['title'],
+            'Poster': catalog_api.media_url(movie['poster']) or 'https://via.placeholder.com/300x450',
+            'imdbID': movie['id'],
+            'Year': str(movie['year']) if movie['year'] else ""
+        })
+    return results
+
+
 def search_api(request):
     query = request.GET.get('q', '').strip()
     results = []
     
     if len(query) >= 2:
-        # Fixed: Changed 'genres' to 'genre' based on your model choices
-        movies = Movie.objects.filter(
-            Q(title__icontains=query) | 
-            Q(director__icontains=query) |
-            Q(genre__name__icontains=query) | # Changed from genres__name
-            Q(cast_members__real_name__icontains=query)
-        ).distinct()[:15]
-        
-        for movie in movies:
-            results.append({
-                'Title': movie.title,
-                'Poster': movie.poster.url if movie.poster else 'https://via.placeholder.com/300x450',
-                'imdbID': movie.id,
-                'Year': str(movie.year) if movie.year else ""
-            })
+        movie_ids = search_movie_ids(query, limit=15)
+        movies = {
+            row['id']: row
+            for row in Movie.objects.filter(id__in=movie_ids).values('id', 'title', 'poster', 'year')
+        }
+        results = search_results(movie_ids, movies)
             
     return JsonResponse({'results': results})
 
+
+async def search_api_async(request):
+    """search_api for the ASGI run mode; see stream/aio.py."""
+    query = request.GET.get('q', '').strip()
+    results = []
+
+    if len(query) >= 2:
+        movie_ids = await asearch_movie_ids(query, limit=15)
+        movies = {
+            row['id']: row
+            async for row in Movie.objects.filter(id__in=movie_ids).values('id', 'title', 'poster', 'year').aiterator()
+        }
+        results = search_results(movie_ids, movies)
+
+    return JsonResponse({'results': results})
+
+API_JSON_PARAMS = {'separators': (',', ':')}
+
+
+def api_error(message, status=400):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_page(request, items, next_cursor):
+    next_url = None
+    if next_cursor:
+        params = request.GET.copy()
+        params['after'] = next_cursor
+        next_url = f"{request.path}?{params.urlencode()}"
+    return JsonResponse({'results': items, 'next': next_url}, json_dumps_params=API_JSON_PARAMS)
+
+
+@conditional_catalog_get(params=('category', 'genre', 'fields', 'limit', 'after'))
+def api_movies(request):
+    """GET /api/v1/movies/?category=&genre=&fields=&limit=&after="""
+    category = request.GET.get('category')
+    if category not in (None, 'movie', 'tv'):
+        return api_error("category must be 'movie' or 'tv'.")
+    try:
+        fields = catalog_api.parse_fields(
+            request.GET.get('fields'), catalog_api.MOVIE_FIELDS, catalog_api.MOVIE_LIST_DEFAULT,
+        )
+        items, next_cursor = catalog_api.movies_page(
+            fields, category=category, genre=request.GET.get('genre'),
+            cursor=request.GET.get('after'), limit=catalog_api.parse_limit(request.GET.get('limit')),
+        )
+    except catalog_api.FieldError as exc:
+        return api_error(str(exc))
+    except InvalidCursor:
+        return api_error("Invalid cursor.")
+    return api_page(request, items, next_cursor)
+
+
+@conditional_catalog_get(params=('fields',))
+def api_movie(request, pk):
+    allowed = dict(catalog_api.MOVIE_FIELDS, cast=None)
+    try:
+        fields = catalog_api.parse_fields(request.GET.get('fields'), allowed, catalog_api.MOVIE_DETAIL_DEFAULT)
+    except catalog_api.FieldError as exc:
+        return api_error(str(exc))
+    data = catalog_api.movie_detail(pk, fields)
+    if data is None:
+        return api_error("Movie not found.", status=404)
+    return JsonResponse(data, json_dumps_params=API_JSON_PARAMS)
+
+
+@conditional_catalog_get(params=('fields',))
+def api_genres(request):
+    try:
+        fields = catalog_api.parse_fields(request.GET.get('fields'), catalog_api.GENRE_FIELDS, tuple(catalog_api.GENRE_FIELDS))
+    except catalog_api.FieldError as exc:
+        return api_error(str(exc))
+    return JsonResponse({'results': catalog_api.genre_list(fields)}, json_dumps_params=API_JSON_PARAMS)
+
+
+@conditional_catalog_get(params=('fields', 'after', 'limit'))
+def api_cast(request):
+    try:
+        fields = catalog_api.parse_fields(request.GET.get('fields'), catalog_api.CAST_FIELDS, tuple(catalog_api.CAST_FIELDS))
+        items, next_cursor = catalog_api.cast_page(
+            fields, cursor=request.GET.get('after'), limit=catalog_api.parse_limit(request.GET.get('limit')),
+        )
+    except catalog_api.FieldError as exc:
+        return api_error(str(exc))
+    except InvalidCursor:
+        return api_error("Invalid cursor.")
+    return api_page(request, items, next_cursor)
+
+
 def get_suggestions(request):
     query = request.GET.get('q', '').strip()
-    suggestions = set()
+    suggestions = []
+
+    if len(query) >= 2:
+        # Director, cast and genre names ranked by popularity, served from memory.
+        suggestions = get_suggestion_index().suggest(query, limit=6)
+
+    return JsonResponse({'suggestions': suggestions})
+
+
+async def get_suggestions_async(request):
+    """get_suggestions for the ASGI run mode; see stream/aio.py."""
+    query = request.GET.get('q', '').strip()
+    suggestions = []
 
     if len(query) >= 2:
-        # Get matching metadata for quick selection
-        suggestions.update(Movie.objects.filter(director__icontains=query).values_list('director', flat=True)[:2])
-        suggestions.update(Cast.objects.filter(real_name__icontains=query).values_list('real_name', flat=True)[:2])
-        suggestions.update(Genre.objects.filter(name__icontains=query).values_list('name', flat=True)[:2])
-        
-    return JsonResponse({'suggestions': list(suggestions)[:6]})
+        suggestions = (await aget_suggestion_index()).suggest(query, limit=6)
+
+    return JsonResponse({'suggestions': suggestions})
 
 
 def register_view(request):
@@ -213,11 +563,11 @@ def logout_view(request):
 @login_required
 def profile_view(request):
     user_profile = request.user.profile
-    subscription = Subscription.objects.filter(user=request.user, active=True).first()
+    subscription = get_entitlement(request.user)
     
     context = {
         'user': request.user,
-        'is_subscribed': user_profile.is_subscribed,
+        'is_subscribed': subscription is not None and subscription.is_active,
         'subscription': subscription,
         'mobile': user_profile.mobile,
     }
@@ -228,6 +578,7 @@ def subscription(request):
     return render(request, 'subscription.html')
 
 
+@login_required
 def payment_page(request, plan_name):
     plan_map = {
         'basic': {'name': 'Basic', 'price': 599},
@@ -238,20 +589,17 @@ def payment_page(request, plan_name):
 
     selected_plan = plan_map.get(plan_name.lower(), plan_map['basic'])
     amount_in_paise = selected_plan['price'] * 100
-    
-    request.session['selected_plan_name'] = selected_plan['name']
-    request.session['selected_plan_price'] = f"{selected_plan['price']}.00"
-
-    client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
 
-    data = {
-        "amount": amount_in_paise,
-        "currency": "INR",
-        "receipt": f"receipt_{plan_name}_{request.user.id}",
-        "payment_capture": 1 
-    }
-    
-    order = client.order.create(data=data)
+    try:
+        order = payments.create_order(
+            amount_in_paise, f"receipt_{plan_name}_{request.user.id}", payment_capture=1,
+        )
+    except payments.GatewayError:
+        return render(request, 'payment_failed.html', status=503)
+    PaymentOrder.objects.create(
+        user=request.user, order_id=order['id'],
+        plan_name=selected_plan['name'].lower(), amount=amount_in_paise,
+    )
 
     context = {
         'plan': selected_plan,
@@ -263,16 +611,16 @@ def payment_page(request, plan_name):
     return render(request, 'payment_page.html', context)
 
 
+@login_required
 def create_subscription_order(request):
-    client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-    
     amount = 159900 
-    data = {
-        "amount": amount,
-        "currency": "INR",
-        "receipt": f"receipt_{request.user.id}",
-    }
-    razorpay_order = client.order.create(data=data)
+    try:
+        razorpay_order = payments.create_order(amount, f"receipt_{request.user.id}")
+    except payments.GatewayError:
+        return render(request, 'payment_failed.html', status=503)
+    PaymentOrder.objects.create(
+        user=request.user, order_id=razorpay_order['id'], plan_name='standard', amount=amount,
+    )
     
     context = {
         "order_id": razorpay_order['id'],
@@ -283,53 +631,73 @@ def create_subscription_order(request):
     return render(request, 'payment_page.html', context)
 
 
+@login_required
 def payment_verify(request):
-    client = razorpay.Client(auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET))
-    
-    params_dict = {
-        'razorpay_order_id': request.GET.get('order_id'),
-        'razorpay_payment_id': request.GET.get('payment_id'),
-        'razorpay_signature': request.GET.get('signature')
-    }
-
-    try:
-        client.utility.verify_payment_signature(params_dict)
-        
-        plan_name = request.session.get('selected_plan_name', 'Standard').lower()
-        amount = request.session.get('selected_plan_price', '1599.00')
-        
-        if plan_name == 'pro':
-            expiry = timezone.now() + datetime.timedelta(days=365)
-            billing_type = 'Yearly'
-        else:
-            expiry = timezone.now() + datetime.timedelta(days=30)
-            billing_type = 'Monthly'
-
-        sub, created = Subscription.objects.update_or_create(
-            user=request.user,
-            defaults={
-                'plan_name': plan_name,
-                'order_id': params_dict['razorpay_order_id'],
-                'payment_id': params_dict['razorpay_payment_id'],
-                'active': True,
-                'expiry_date': expiry
-            }
-        )
+    """Landing page after Checkout: records the signed result and shows its status.
+
+    The subscription itself is written by the payment event consumer, so this
+    only appends an event and renders either the receipt or a page that polls
+    ``payment_status`` until the consumer has caught up.
+    """
+    order_id = request.GET.get('order_id')
+    payment_id = request.GET.get('payment_id')
+    if not payments.verify_payment_signature(order_id, payment_id, request.GET.get('signature')):
+        return render(request, 'payment_failed.html')
 
-        user_profile = request.user.profile
-        user_profile.is_subscribed = True
-        user_profile.save()
+    order = PaymentOrder.objects.filter(user=request.user, order_id=order_id).first()
+    if order is None:
+        return render(request, 'payment_failed.html')
+    if order.status != 'paid':
+        payment_events.record(payment_events.checkout_event(order_id, payment_id))
+        return render(request, 'payment_pending.html', {'order': order})
 
-        context = {
-            'payment_id': params_dict['razorpay_payment_id'],
-            'plan_name': plan_name.capitalize() + " plan",
-            'amount': amount,
-            'billing_type': billing_type,
-            'next_payment': expiry.strftime('%b %d, %Y')
-        }
-        
-        return render(request, 'payment_success.html', context)
+    subscription = get_entitlement(request.user)
+    context = {
+        'payment_id': order.payment_id,
+        'plan_name': order.plan_name.capitalize() + " plan",
+        'amount': f"{order.amount / 100:.2f}",
+        'billing_type': 'Yearly' if order.plan_name == 'pro' else 'Monthly',
+        'next_payment': subscription.expiry_date.strftime('%b %d, %Y') if subscription else '',
+    }
+    return render(request, 'payment_success.html', context)
 
-    except razorpay.errors.SignatureVerificationError:
-        return render(request, 'payment_failed.html')
 
+@login_required
+def payment_status(request, order_id):
+    status = (
+        PaymentOrder.objects.filter(user=request.user, order_id=order_id)
+        .values_list('status', flat=True).first()
+    )
+    if status is None:
+        raise Http404("Unknown order.")
+    response = JsonResponse({'order_id': order_id, 'status': status})
+    patch_cache_control(response, private=True, no_store=True)
+    return response
+
+
+@csrf_exempt
+@require_POST
+def payment_webhook(request):
+    """Razorpay webhook: verify, append to the event log and acknowledge at once."""
+    body = request.body
+    if not payment_events.webhook_signature_valid(body, request.headers.get('X-Razorpay-Signature')):
+        return HttpResponseForbidden("Invalid signature.")
+    try:
+        event = payment_events.parse_webhook(body, request.headers.get('X-Razorpay-Event-Id'))
+    except (ValueError, AttributeError):
+        return HttpResponseBadRequest("Malformed event.")
+    payment_events.record(event)
+    return HttpResponse(status=200)
+
+
+def metrics(request):
+    """Prometheus scrape endpoint (see stream/profiling.py)."""
+    # Without a token nothing is allowed: behind a proxy every client is local.
+    allowed = bool(settings.METRICS_TOKEN) and hmac.compare_digest(
+        request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}',
+    )
+    if not allowed:
+        return HttpResponseForbidden("Metrics are not public.")
+    response = HttpResponse(profiling.exposition(cache_stats()), content_type=profiling.METRICS_CONTENT_TYPE)
+    patch_cache_control(response, no_store=True)
+    return response